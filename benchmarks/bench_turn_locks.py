@@ -0,0 +1,88 @@
+"""
+Microbenchmark da tabela de travas do QueuedTurnManager.
+
+Dispara N turnos de peers distintos (padrão: 100k) em lotes concorrentes e compara:
+- legado: trava global + dict de travas que nunca encolhe (uma asyncio.Lock vazada por peer)
+- atual:  QueuedTurnManager.run_turn (RefCountedTable, sem trava global), com e sem as cotas
+  de admissão ligadas, para separar o custo da tabela do custo dos semáforos
+
+Mede o overhead por turno e a memória retida depois que todos os turnos terminam.
+
+Uso:
+    python benchmarks/bench_turn_locks.py [--peers 100000] [--batch 1000]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from queued_turns import QueuedTurnManager
+
+
+class LegacyTurnManager:
+    """Implementação anterior: busca sob trava global e travas nunca removidas."""
+
+    def __init__(self):
+        self._locks = {}
+        self._global_lock = asyncio.Lock()
+
+    async def _get_session_lock(self, key):
+        async with self._global_lock:
+            if key not in self._locks:
+                self._locks[key] = asyncio.Lock()
+            return self._locks[key]
+
+    async def run_turn(self, key, func):
+        lock = await self._get_session_lock(key)
+        async with lock:
+            return await func()
+
+
+async def _noop():
+    return None
+
+
+async def _turns(manager, peers: int, batch: int):
+    for start in range(0, peers, batch):
+        await asyncio.gather(*(manager.run_turn(f"MoltyClaw:bench:{i}", _noop)
+                               for i in range(start, min(start + batch, peers))))
+
+
+async def _run(factory, peers: int, batch: int):
+    # Tempo e memória em passadas separadas: o tracemalloc distorce o tempo
+    t0 = time.perf_counter()
+    await _turns(factory(), peers, batch)
+    elapsed = time.perf_counter() - t0
+
+    manager = factory()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    await _turns(manager, peers, batch)
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peers", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    quotas = {"max_concurrent": args.batch, "per_peer": 2, "max_queue": args.peers}
+    no_quotas = {"max_concurrent": 0, "per_peer": 0, "max_queue": args.peers}
+    for name, factory in (("legado", LegacyTurnManager),
+                          ("atual", lambda: QueuedTurnManager(no_quotas)),
+                          ("atual+cotas", lambda: QueuedTurnManager(quotas))):
+        elapsed, retained = asyncio.run(_run(factory, args.peers, args.batch))
+        print(f"{name:>11}: {args.peers} peers em {elapsed:.2f}s "
+              f"({elapsed / args.peers * 1e6:.1f} µs/turno), memória retida {retained / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
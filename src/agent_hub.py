@@ -12,6 +12,10 @@ Uso:
 
     # Ou async (dentro de um coroutine):
     reply = await hub.ask("Olá!", channel="telegram", peer_id="123456")
+
+    # Ou como stream de eventos tipados (turn_stream.StreamEvent):
+    async for evt in hub.stream("Olá!", channel="webui"):
+        ...
 """
 
 import asyncio
@@ -45,8 +49,66 @@ def get_hub() -> "AgentHub":
     return _hub_instance
 
 
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """
+    Retorna a SessionStore única do processo (backend de sessions.backend).
+    Hub, gateway e o próprio agente compartilham o mesmo cache LRU de históricos.
+    """
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                from sessions import open_session_store
+                from config_loader import get_config
+                # Workers do modo sharded compartilham o estado: só o SQLite (WAL) aguenta vários processos
+                sharded = os.environ.get("MOLTY_HUB_WORKER") or int(get_config().get("hub", {}).get("workers", 1)) > 1
+                _session_store = open_session_store("sqlite" if sharded else None)
+    return _session_store
+
+
 # ── AgentHub ──────────────────────────────────────────────────────────────────
 
+class _InboundBatch:
+    """Mensagens de uma SessionKey aguardando o mesmo turno (coalescência/debounce)."""
+
+    __slots__ = ("messages", "waiters", "kwargs", "first_at", "last_at", "task", "stopped")
+
+    def __init__(self):
+        import time
+        self.messages = []
+        self.waiters = []
+        self.kwargs = {}
+        self.first_at = self.last_at = time.monotonic()
+        self.task = None
+        self.stopped = False          # cancelado por /stop: quem esperava recebe ""
+
+    def add(self, message: str, waiter, kwargs: Dict[str, Any]):
+        import time
+        self.messages.append(message)
+        self.waiters.append(waiter)
+        self.kwargs = kwargs          # callbacks/nome da mensagem mais recente
+        self.last_at = time.monotonic()
+
+    def resolve(self, reply, error: BaseException = None):
+        """Resposta (ou erro) para a última chamada; "" para as mensagens absorvidas por ela."""
+        last = len(self.waiters) - 1
+        for i, w in enumerate(self.waiters):
+            if w.done():
+                continue
+            if i < last:
+                w.set_result("")
+            elif error is None:
+                w.set_result(reply)
+            elif isinstance(error, asyncio.CancelledError):
+                w.cancel()
+            else:
+                w.set_exception(error)
+
+
 class AgentHub:
     """
     Mantém uma única instância do MoltyClaw rodando em uma thread dedicada
@@ -62,6 +124,24 @@ class AgentHub:
         self.loop: Optional[asyncio.AbstractEventLoop] = None
         self.ready = False
         self._thread: Optional[threading.Thread] = None
+        # Um SessionContext por SessionKey (LRU): histórico e callbacks isolados por conversa
+        from collections import OrderedDict
+        from config_loader import get_config
+        hub_cfg = get_config().get("hub", {})
+        self._contexts: "OrderedDict[str, Any]" = OrderedDict()
+        self.max_contexts = int(hub_cfg.get("max_contexts", 256))
+        # Coalescência de mensagens em rajada ("oi" / "tudo bem?" / "me ajuda com X" = um turno só)
+        self.debounce_ms = int(hub_cfg.get("debounce_ms", 0))          # 0 = desligado
+        self.debounce_max_ms = int(hub_cfg.get("debounce_max_ms", 3000))
+        self._inbox: Dict[str, "_InboundBatch"] = {}
+        self.coalesced = 0
+        # Canais onde a mensagem mais nova cancela o turno em andamento do mesmo peer
+        self.supersede_channels = {c.lower() for c in hub_cfg.get("supersede_channels", [])}
+        # Modo sharded (hub.workers > 1): turnos de chat rodam em processos worker (hub_shards.py)
+        self.is_worker = bool(os.environ.get("MOLTY_HUB_WORKER"))
+        self.workers = 1 if self.is_worker else int(hub_cfg.get("workers", 1))
+        self.vnodes = int(hub_cfg.get("vnodes", 64))
+        self.shards = None
 
     # ── Inicialização ─────────────────────────────────────────────────────────
 
@@ -99,11 +179,10 @@ class AgentHub:
 
         console.print("[dim cyan]>> AgentHub: Inicializando instância única do MoltyClaw...[/dim cyan]")
 
-        from sessions import SessionStore, SessionKey
         from queued_turns import QueuedTurnManager
         from channel_supervisor import ChannelSupervisor
 
-        self.session_store = SessionStore()
+        self.session_store = get_session_store()
         self.turn_manager = QueuedTurnManager()
         self.channel_supervisor = ChannelSupervisor(self)
         self.agent = MoltyClaw(name="MoltyClaw")
@@ -115,12 +194,23 @@ class AgentHub:
         if self.agent.mcp_hub:
             await self.agent.mcp_hub.connect_servers()
 
+        if self.is_worker:
+            # Worker de shard: só turnos de chat. Scheduler, heartbeat e conectores ficam na frente
+            self.ready = True
+            return
+
         # Scheduler + Heartbeat
         self.scheduler = SchedulerManager(self.agent)
         self.loop.create_task(self.scheduler.run())
 
         await self.agent.start_background_services()
 
+        if self.workers > 1:
+            from hub_shards import ShardRouter
+            self.shards = ShardRouter(self.workers, self.vnodes)
+            self.shards.on_memory_write = self.agent.memory.indexer.notify
+            await asyncio.to_thread(self.shards.start)
+
         self.ready = True
         console.print("[bold green]✅ AgentHub: Instância única pronta com SessionStore & Control Plane![/bold green]")
 
@@ -140,49 +230,199 @@ class AgentHub:
     ) -> str:
         """
         Envia uma mensagem ao agente compartilhado com isolamento por SessionKey e Fila de Turnos.
+
+        Com hub.debounce_ms > 0, mensagens da mesma SessionKey que chegam dentro da janela (ou
+        enquanto o turno ainda está na fila) viram um único turno. A resposta vai para a chamada
+        da última mensagem; as anteriores recebem "" (os canais não enviam respostas vazias).
+        Chamadas com stream_callback nunca são agrupadas: cada uma tem o próprio stream.
         """
         if not self.ready or self.agent is None:
             return "⚠️ Agente ainda não está pronto. Aguarde alguns segundos."
 
+        if self.shards is not None:
+            # Sharded: o worker dono da SessionKey cuida de fila, coalescência, /stop e supersede
+            async with self.agent.turn_scheduler.interactive():
+                return await self.shards.ask(
+                    self._session_key(channel, peer_id).key_str, message, channel=channel, peer_id=peer_id,
+                    peer_name=peer_name, silent=silent, stream_callback=stream_callback,
+                    tool_callback=tool_callback, reply_callback=reply_callback,
+                )
+
+        # /stop vale em qualquer canal: interrompe o turno do peer sem virar um turno novo
+        if message.strip().lower() in ("/stop", "/parar"):
+            if await self.cancel(channel=channel, peer_id=peer_id, reason="stop"):
+                return "⏹️ Ok, parei o que estava fazendo."
+            return "Não há nada em andamento para parar."
+        if (channel or "cli").lower() in self.supersede_channels:
+            await self.cancel(channel=channel, peer_id=peer_id, reason="superseded", pending=False)
+
+        turn_kwargs = dict(channel=channel, peer_id=peer_id, peer_name=peer_name, silent=silent,
+                           stream_callback=stream_callback, tool_callback=tool_callback,
+                           reply_callback=reply_callback)
+        if self.debounce_ms <= 0 or stream_callback is not None:
+            return await self._ask_turn([message], **turn_kwargs)
+
+        key_str = self._session_key(channel, peer_id).key_str
+        batch = self._inbox.get(key_str)
+        if batch is None:
+            batch = self._inbox[key_str] = _InboundBatch()
+            batch.task = asyncio.create_task(self._run_batch(key_str, batch))
+        else:
+            self.coalesced += 1
+        waiter = asyncio.get_running_loop().create_future()
+        batch.add(message, waiter, turn_kwargs)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Ninguém mais espera pela resposta: cancela o turno (mesmo efeito de antes da coalescência)
+            if all(w.cancelled() for w in batch.waiters) and batch.task is not None:
+                batch.task.cancel()
+            raise
+
+    async def _run_batch(self, key_str: str, batch: "_InboundBatch"):
+        """Espera a janela de debounce fechar e roda o lote como um turno só."""
+        import time
+
+        def _close():
+            # O turno começou (ou o lote morreu): mensagens novas abrem outro lote
+            if self._inbox.get(key_str) is batch:
+                del self._inbox[key_str]
+            # Lote fechado: o turno usa o remetente/callbacks da última mensagem, a que recebe a resposta
+            return batch.kwargs
+
+        try:
+            while True:
+                now = time.monotonic()
+                deadline = min(batch.last_at + self.debounce_ms / 1000,
+                               batch.first_at + self.debounce_max_ms / 1000)
+                if now >= deadline:
+                    break
+                await asyncio.sleep(deadline - now)
+            reply = await self._ask_turn(batch.messages, on_start=_close, **batch.kwargs)
+        except BaseException as e:
+            _close()
+            if batch.stopped:
+                batch.resolve("")
+                return
+            batch.resolve(None, e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            _close()
+            batch.resolve(reply)
+
+    async def cancel(self, *, channel: Optional[str] = None, peer_id: Optional[str] = None,
+                     reason: str = "stop", pending: bool = True) -> bool:
+        """
+        Cancela o turno em andamento da SessionKey (e, com pending=True, as mensagens ainda
+        agrupadas esperando o turno). O histórico parcial é limpo pelo agente. Retorna True se
+        havia algo para cancelar. Em modo sharded o turno roda no worker dono da SessionKey.
+        """
+        if self.agent is None:
+            return False
+        key_str = self._session_key(channel, peer_id).key_str
+        if self.shards is not None:
+            return await self.shards.cancel(key_str, channel=channel, peer_id=peer_id, reason=reason)
+        cancelled = False
+        batch = self._inbox.get(key_str) if pending else None
+        if batch is not None:
+            del self._inbox[key_str]
+            batch.stopped = True
+            batch.task.cancel()
+            cancelled = True
+        return self.agent.cancel_turn(key_str, reason) > 0 or cancelled
+
+    def _session_key(self, channel: Optional[str], peer_id: Optional[str]):
         from sessions import SessionKey
-        s_key = SessionKey(
+        return SessionKey(
             agent_id=self.agent.agent_id or "MoltyClaw",
             channel=channel or "cli",
             peer_id=peer_id or "default"
         )
 
-        # Injeta contexto do canal no prompt para o agente saber de onde veio
-        enriched = message
-        if channel and channel not in ("webui", "cli"):
-            origin_info = f"\n\n[SISTEMA: Esta mensagem chegou pelo canal '{channel.upper()}'"
-            if peer_name:
-                origin_info += f" do usuário '{peer_name}'"
-            if peer_id:
-                origin_info += f" (ID: {peer_id})"
-            origin_info += ".]"
-            enriched = message + origin_info
-
-        requester = None
-        if peer_id or peer_name:
-            requester = {
-                "id": peer_id or "",
-                "name": peer_name or peer_id or "Desconhecido",
-                "platform": channel or "unknown",
-                "session_key": s_key.key_str,
-            }
+    async def _ask_turn(
+        self,
+        messages,
+        *,
+        channel: Optional[str] = None,
+        peer_id: Optional[str] = None,
+        peer_name: Optional[str] = None,
+        silent: bool = False,
+        stream_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+        tool_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+        reply_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_start: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+    ) -> str:
+        """
+        Um turno do agente com uma ou mais mensagens do usuário (juntadas por quebra de linha).
+        on_start roda quando o turno sai da fila e pode devolver kwargs mais novos (peer_name,
+        silent, callbacks) — os da última mensagem que entrou no lote enquanto ele esperava.
+        """
+        s_key = self._session_key(channel, peer_id)
+        session = self.get_context(s_key.key_str)
 
         async def _do_turn():
+            turn = dict(peer_name=peer_name, silent=silent, stream_callback=stream_callback,
+                        tool_callback=tool_callback, reply_callback=reply_callback)
+            if on_start is not None:
+                latest = on_start() or {}
+                turn.update((k, latest[k]) for k in turn if k in latest)
+            name = turn["peer_name"]
+
+            # Injeta contexto do canal no prompt para o agente saber de onde veio
+            origin_info = ""
+            if channel and channel not in ("webui", "cli"):
+                origin_info = f"\n\n[SISTEMA: Esta mensagem chegou pelo canal '{channel.upper()}'"
+                if name:
+                    origin_info += f" do usuário '{name}'"
+                if peer_id:
+                    origin_info += f" (ID: {peer_id})"
+                origin_info += ".]"
+
+            requester = None
+            if peer_id or name:
+                requester = {
+                    "id": peer_id or "",
+                    "name": name or peer_id or "Desconhecido",
+                    "platform": channel or "unknown",
+                    "session_key": s_key.key_str,
+                }
+
+            # Junta só agora: mensagens que chegaram enquanto o turno estava na fila entram juntas
+            enriched = "\n".join(messages) + origin_info
             return await self.agent.ask(
                 enriched,
-                silent=silent,
-                stream_callback=stream_callback,
-                tool_callback=tool_callback,
-                reply_callback=reply_callback,
+                silent=turn["silent"],
+                stream_callback=turn["stream_callback"],
+                tool_callback=turn["tool_callback"],
+                reply_callback=turn["reply_callback"],
                 requester=requester,
+                session=session,
             )
 
-        # Executa o turno isolado na fila de turnos da SessionKey
-        return await self.turn_manager.run_turn(s_key.key_str, _do_turn)
+        # Executa o turno isolado na fila de turnos da SessionKey (sujeito ao controle de admissão)
+        from queued_turns import TurnRejected
+        try:
+            # Conta como interativo já na fila: heartbeat/jobs esperam (ou são preemptados)
+            async with self.agent.turn_scheduler.interactive():
+                return await self.turn_manager.run_turn(s_key.key_str, _do_turn)
+        except TurnRejected as e:
+            return e.message
+
+    def get_context(self, key_str: str):
+        """
+        SessionContext da SessionKey (cria na primeira mensagem). Contextos despejados do LRU
+        são recriados a partir da SessionStore na próxima mensagem do peer.
+        """
+        ctx = self._contexts.get(key_str)
+        if ctx is None:
+            ctx = self.agent.new_session(key_str)
+            self._contexts[key_str] = ctx
+            while len(self._contexts) > self.max_contexts:
+                self._contexts.popitem(last=False)
+        else:
+            self._contexts.move_to_end(key_str)
+        return ctx
 
     def ask_sync(
         self,
@@ -209,53 +449,44 @@ class AgentHub:
         )
         return future.result(timeout=timeout)
 
-    def ask_sync_streaming(
+    def stream(
         self,
         message: str,
-        stream_q,
         *,
         channel: Optional[str] = None,
         peer_id: Optional[str] = None,
         peer_name: Optional[str] = None,
+        tokens: bool = True,
+        reply_callback: Optional[Callable[[str], Awaitable[None]]] = None,
     ):
         """
-        Versão síncrona com streaming via queue thread-safe.
-        Coloca ("token", texto), ("tool", texto) e ("done", None) na queue.
-        Usada pela WebUI Flask para SSE.
+        Turno como iterador assíncrono de eventos tipados (turn_stream.StreamEvent): tokens,
+        tool_start, tool_end, media, done, error. Chamar dentro do loop do hub.
+        Com tokens=False não há stream de texto e a mensagem pode ser coalescida (hub.debounce_ms).
         """
-        if not self.ready or self.loop is None:
-            stream_q.put(("error", "Agente não está pronto."))
-            return
+        from turn_stream import stream_turn
 
-        import re
+        def run(stream_cb, tool_cb):
+            return self.ask(message, channel=channel, peer_id=peer_id, peer_name=peer_name,
+                            stream_callback=stream_cb, tool_callback=tool_cb, reply_callback=reply_callback)
 
-        async def stream_cb(token: str):
-            stream_q.put(("token", token))
+        return stream_turn(run, tokens=tokens, base_dir=getattr(self.agent, "base_dir", None))
 
-        async def tool_cb(msg: str):
-            stream_q.put(("tool", msg))
-
-        async def run():
-            try:
-                res = await self.ask(
-                    message,
-                    channel=channel,
-                    peer_id=peer_id,
-                    peer_name=peer_name,
-                    stream_callback=stream_cb,
-                    tool_callback=tool_cb,
-                )
-                # Repassa marcadores especiais (AUDIO_REPLY, etc.)
-                if res and isinstance(res, str) and "[AUDIO_REPLY:" in res:
-                    match = re.search(r'\[AUDIO_REPLY:\s*([^\]]+)\]', res)
-                    if match:
-                        filename = os.path.basename(match.group(1).strip())
-                        stream_q.put(("token", f"\n\n[AUDIO_REPLY: {filename}]\n\n"))
-                stream_q.put(("done", None))
-            except Exception as e:
-                stream_q.put(("error", str(e)))
-
-        asyncio.run_coroutine_threadsafe(run(), self.loop)
+    def stream_sync(
+        self,
+        message: str,
+        *,
+        channel: Optional[str] = None,
+        peer_id: Optional[str] = None,
+        peer_name: Optional[str] = None,
+    ):
+        """Versão síncrona de stream() para threads externas (WebUI Flask): gerador de StreamEvent."""
+        from turn_stream import StreamEvent, iterate_threadsafe
+        if not self.ready or self.loop is None:
+            return iter([StreamEvent("error", "Agente não está pronto.")])
+        return iterate_threadsafe(
+            lambda: self.stream(message, channel=channel, peer_id=peer_id, peer_name=peer_name), self.loop
+        )
 
     def schedule_coroutine(self, coro):
         """Agenda uma coroutine no loop do AgentHub. Retorna um Future."""
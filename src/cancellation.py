@@ -0,0 +1,49 @@
+"""
+MoltyClaw — Cancelamento de Turnos
+
+Cada turno de usuário roda numa task própria com um CancelToken. Cancelar o token:
+- cancela a task do turno (interrompe o await corrente: stream do LLM, ferramenta, subprocesso);
+- marca o token, que o loop de ferramentas e o stream consultam entre passos/chunks.
+
+Quem cancela informa o motivo: "stop" (/stop do usuário) ou "superseded" (mensagem mais nova
+do mesmo peer substituiu o turno, política hub.supersede_channels).
+"""
+
+import asyncio
+import contextvars
+from typing import Optional
+
+
+class CancelToken:
+    __slots__ = ("session_key", "reason", "_task")
+
+    def __init__(self, session_key: Optional[str] = None):
+        self.session_key = session_key
+        self.reason: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def bind(self, task: asyncio.Task):
+        self._task = task
+        if self.cancelled:
+            task.cancel()
+
+    def cancel(self, reason: str = "stop") -> bool:
+        """Cancela o turno. Retorna False se ele já tinha sido cancelado ou terminado."""
+        if self.cancelled or (self._task is not None and self._task.done()):
+            return False
+        self.reason = reason
+        if self._task is not None:
+            self._task.cancel()
+        return True
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise asyncio.CancelledError(self.reason)
+
+
+# Token do turno corrente (herdado pelas chamadas recursivas do loop de ferramentas)
+current_cancel: contextvars.ContextVar = contextvars.ContextVar("molty_cancel_token", default=None)
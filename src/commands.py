@@ -1,7 +1,7 @@
 """
 MoltyClaw — Universal Slash Commands Engine (CLI & WebUI)
 Fornece execução local e metadados para comandos rápidos:
-/learn, /delegate, /skill, /mcp, /status, /model, /reset, /help
+/learn, /delegate, /skill, /mcp, /status, /model, /reset, /stop, /help
 """
 
 import os
@@ -69,6 +69,13 @@ SLASH_COMMANDS = [
         "icon": "fa-solid fa-rotate-left",
         "category": "Conversa"
     },
+    {
+        "command": "/stop",
+        "params": "",
+        "description": "Interrompe a resposta em andamento (stream, ferramentas e comandos de terminal).",
+        "icon": "fa-solid fa-circle-stop",
+        "category": "Conversa"
+    },
     {
         "command": "/help",
         "params": "",
@@ -87,7 +94,7 @@ def is_slash_command(text: str) -> bool:
     return clean.startswith("/") and len(clean) > 1 and not clean.startswith("//")
 
 
-async def handle_slash_command(text: str, agent=None, agent_id: str = "MoltyClaw") -> Dict[str, Any]:
+async def handle_slash_command(text: str, agent=None, agent_id: str = "MoltyClaw", session_key: Optional[str] = None) -> Dict[str, Any]:
     """
     Processa e executa um comando slash.
     Retorna um dicionário com:
@@ -178,6 +185,24 @@ async def handle_slash_command(text: str, agent=None, agent_id: str = "MoltyClaw
             "reply": "🧹 **Histórico da conversa limpo com sucesso!** O contexto imediato foi resetado."
         }
 
+    # ── /STOP ──────────────────────────────────────────────────────────────
+    if cmd in ["/stop", "/parar"]:
+        # session_key: conversa do AgentHub (None = contexto padrão do agente)
+        import agent_hub
+        hub = agent_hub._hub_instance
+        if session_key and hub is not None and hub.shards is not None:
+            # Sharded: o turno roda no worker dono da SessionKey, não no agente da frente
+            from sessions import SessionKey
+            key = SessionKey.parse(session_key)
+            stopped = await hub.cancel(channel=key.channel, peer_id=key.peer_id, reason="stop")
+        else:
+            stopped = agent.cancel_turn(session_key, reason="stop") if agent and hasattr(agent, "cancel_turn") else 0
+        return {
+            "success": True,
+            "command": "/stop",
+            "reply": "⏹️ **Resposta interrompida.**" if stopped else "Não há nada em andamento para parar."
+        }
+
     # ── /STATUS ────────────────────────────────────────────────────────────
     if cmd == "/status":
         from config_loader import get_config
@@ -195,6 +220,44 @@ async def handle_slash_command(text: str, agent=None, agent_id: str = "MoltyClaw
 - **Diretório Raiz:** `{MOLTY_DIR}`
 - **Status:** 🟢 Operacional e Pronto
 """
+        memory = getattr(agent, "memory", None)
+        if memory is not None and getattr(memory, "indexer", None):
+            st = memory.indexer.stats()
+            reply += (f"- **Indexador de Memória:** {'🟢 Ativo' if st['running'] else '⚪ Parado'} — "
+                      f"fila: `{st['queued_files']}` arquivo(s) / `{st['queued_chunks']}` chunk(s) sem vetor, "
+                      f"atraso: `{st['lag_s']}s` (última passada: `{st['last_lag_s']}s`)\n")
+        try:
+            from agent_hub import get_session_store
+            cs = get_session_store().cache_stats()
+            reply += (f"- **Cache de Sessões:** `{cs['entries']}/{cs['max_entries']}` sessões, "
+                      f"`{cs['bytes'] // 1024} KB`, hit rate `{cs['hit_rate']:.0%}` "
+                      f"({cs['hits']} hits / {cs['misses']} misses), `{cs['evictions']}` evicções\n")
+        except Exception:
+            pass
+        import agent_hub
+        if agent_hub._hub_instance is not None and getattr(agent_hub._hub_instance, "turn_manager", None):
+            ts = agent_hub._hub_instance.turn_manager.stats()
+            reply += (f"- **Turnos:** `{ts['running']}/{ts['max_concurrent']}` rodando, `{ts['waiting']}` na fila, "
+                      f"espera p95 `{ts['wait_ms_p95']} ms`, `{ts['rejected']}` recusados, "
+                      f"`{agent_hub._hub_instance.coalesced}` mensagens agrupadas\n")
+        if agent_hub._hub_instance is not None and getattr(agent_hub._hub_instance, "shards", None):
+            ss = agent_hub._hub_instance.shards.stats()
+            alive = sum(1 for w in ss["workers"] if w["alive"])
+            reply += (f"- **Workers do Hub:** `{alive}/{len(ss['workers'])}` ativos, "
+                      f"`{ss['inflight']}` turnos em andamento, roteados: "
+                      f"`{', '.join(str(w['routed']) for w in ss['workers'])}`\n")
+        if getattr(agent, "turn_scheduler", None) is not None:
+            ps = agent.turn_scheduler.stats()
+            queued = ", ".join(f"{k}: {v}" for k, v in ps["queued"].items()) or "vazia"
+            reply += (f"- **Background:** fila `{queued}`, `{ps['background_running']}` rodando, "
+                      f"`{ps['preemptions']}` preempções, `{ps['forced']}` forçados por inanição\n")
+        from executors import executor_stats
+        pools = executor_stats()
+        if pools:
+            reply += "- **Pools de Integração:** " + ", ".join(
+                f"{name} `{p['active']}/{p['workers']}` (fila `{p['queued']}`, p95 `{p['run_ms_p95']} ms`"
+                + (f", `{p['rejected']}` recusados" if p["rejected"] else "") + ")"
+                for name, p in sorted(pools.items())) + "\n"
         return {
             "success": True,
             "command": "/status",
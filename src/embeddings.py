@@ -0,0 +1,229 @@
+"""
+MoltyClaw — Camada de Provedores de Embeddings (async)
+
+Todos os provedores expõem a mesma API assíncrona:
+    vecs = await provider.embed(["texto 1", "texto 2"])   # lista alinhada (None em falhas)
+    vec  = await provider.embed_one("texto")
+
+- MistralEmbeddings: SDK oficial (create_async quando existe, senão o SDK síncrono roda fora do loop)
+- OllamaEmbeddings: POST /api/embed via sessão aiohttp compartilhada
+- OpenAICompatibleEmbeddings: qualquer endpoint /v1/embeddings (LM Studio, vLLM, OpenAI...)
+- HashingEmbeddings: embedder local determinístico (feature hashing), para uso offline e testes
+
+Cada chamada tem timeout; falhas nunca propagam exceção para o RAG, apenas viram None.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional
+
+from config_loader import get_config
+from executors import run_blocking
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+# ── Pool de sessões HTTP (uma por event loop) ─────────────────────────────────
+_http_sessions = {}
+
+
+def _get_http_session():
+    """Reaproveita a mesma aiohttp.ClientSession por event loop (keep-alive entre lotes)."""
+    loop = asyncio.get_running_loop()
+    session = _http_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession()
+        _http_sessions[loop] = session
+    return session
+
+
+class EmbeddingProvider:
+    """Interface base. Subclasses implementam _embed(texts) -> lista de vetores."""
+    name = "base"
+    batch_size = 16
+    max_chars = 2000
+
+    def __init__(self, model: str = "", timeout: float = 30.0):
+        self.model = model
+        self.timeout = timeout
+        self._warned = False
+
+    @property
+    def namespace(self) -> str:
+        """Identifica o espaço vetorial (vetores de modelos diferentes não são comparáveis)."""
+        return re.sub(r"[^a-zA-Z0-9_.-]+", "_", f"{self.name}-{self.model}").strip("_")
+
+    async def _embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        raise NotImplementedError
+
+    async def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        texts = [t[:self.max_chars] for t in texts]
+        if not texts:
+            return []
+        try:
+            result = await asyncio.wait_for(self._embed(texts), timeout=self.timeout)
+            if result and len(result) == len(texts):
+                return result
+        except asyncio.TimeoutError:
+            self._warn(f"timeout após {self.timeout}s")
+        except Exception as e:
+            self._warn(str(e)[:120])
+        return [None] * len(texts)
+
+    async def embed_one(self, text: str) -> Optional[List[float]]:
+        return (await self.embed([text]))[0]
+
+    def _warn(self, msg: str):
+        # Avisa só uma vez por provedor para não poluir o console a cada lote
+        if not self._warned:
+            self._warned = True
+            print(f"[Embeddings] {self.name} ({self.model}) falhou: {msg}")
+
+
+class MistralEmbeddings(EmbeddingProvider):
+    name = "mistral"
+
+    def __init__(self, client=None, api_key: str = None, model: str = "mistral-embed", timeout: float = 30.0):
+        super().__init__(model, timeout)
+        if client is None and api_key:
+            from mistralai import Mistral
+            client = Mistral(api_key=api_key)
+        self.client = client
+
+    async def _embed(self, texts):
+        if self.client is None:
+            return None
+        api = getattr(self.client, "embeddings", None)
+        if hasattr(api, "create_async"):
+            ret = await api.create_async(model=self.model, inputs=texts)
+        elif hasattr(api, "create"):
+            # SDK síncrono: roda no pool 'embeddings' para não travar os canais
+            ret = await run_blocking("embeddings", api.create, model=self.model, inputs=texts)
+        elif callable(api):
+            # Cliente legado (MistralAsyncClient é async; MistralClient bloqueia e vai para o pool)
+            if inspect.iscoroutinefunction(api):
+                ret = await api(model=self.model, input=texts)
+            else:
+                ret = await run_blocking("embeddings", api, model=self.model, input=texts)
+        else:
+            return None
+        data = sorted(ret.data, key=lambda d: getattr(d, "index", 0) or 0)
+        return [d.embedding for d in data]
+
+
+class OllamaEmbeddings(EmbeddingProvider):
+    name = "ollama"
+
+    def __init__(self, host: str = None, model: str = "nomic-embed-text", timeout: float = 60.0):
+        super().__init__(model, timeout)
+        self.host = (host or os.getenv("OLLAMA_HOST", "http://localhost:11434")).rstrip("/")
+
+    async def _embed(self, texts):
+        session = _get_http_session()
+        async with session.post(f"{self.host}/api/embed", json={"model": self.model, "input": texts}) as resp:
+            if resp.status != 200:
+                raise Exception(f"HTTP {resp.status}: {(await resp.text())[:100]}")
+            data = await resp.json()
+            return data.get("embeddings")
+
+
+class OpenAICompatibleEmbeddings(EmbeddingProvider):
+    name = "openai"
+
+    def __init__(self, base_url: str, api_key: str = None, model: str = "text-embedding-3-small", timeout: float = 30.0):
+        super().__init__(model, timeout)
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key or "not-needed")
+
+    async def _embed(self, texts):
+        ret = await self.client.embeddings.create(model=self.model, input=texts)
+        data = sorted(ret.data, key=lambda d: d.index)
+        return [d.embedding for d in data]
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """
+    Embedder local e determinístico: tokens e trigramas de caracteres são projetados em `dim`
+    posições por hash (com sinal), ponderados por log(1 + tf) e normalizados.
+    Não entende sinônimos, mas funciona offline, sem custo e dá o mesmo vetor em qualquer máquina.
+    """
+    name = "local"
+    batch_size = 256
+
+    def __init__(self, dim: int = 256):
+        super().__init__(f"hashing{dim}", timeout=30.0)
+        self.dim = dim
+
+    def _features(self, text: str) -> Counter:
+        from memory_rag import tokenize
+        tokens = tokenize(text)
+        feats = Counter(tokens)
+        for tok in tokens:
+            padded = f"#{tok}#"
+            feats.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return feats
+
+    def embed_sync(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for feat, tf in self._features(text).items():
+            h = int.from_bytes(hashlib.md5(feat.encode("utf-8")).digest()[:8], "little")
+            vec[h % self.dim] += (1.0 if (h >> 63) & 1 else -1.0) * (1.0 + math.log(tf))
+        norm = math.sqrt(sum(v * v for v in vec))
+        return [v / norm for v in vec] if norm else vec
+
+    async def _embed(self, texts):
+        return [self.embed_sync(t) for t in texts]
+
+
+def get_provider_for(agent) -> EmbeddingProvider:
+    """
+    Escolhe o provedor de embeddings do agente a partir de moltyclaw.json:
+
+        "memory": {"embeddings": {"provider": "auto|mistral|ollama|openai|local",
+                                  "model": "...", "base_url": "...", "api_key": "...", "timeout": 30}}
+
+    Em "auto": Mistral se houver cliente/chave, Ollama se o agente roda em Ollama, senão o local.
+    """
+    cfg = get_config().get("memory", {}).get("embeddings", {})
+    provider = (cfg.get("provider") or "auto").lower()
+    timeout = float(cfg.get("timeout", 30))
+    model = cfg.get("model")
+
+    if provider == "auto":
+        if getattr(agent, "mistral_client", None) or os.getenv("MISTRAL_API_KEY"):
+            provider = "mistral"
+        elif getattr(agent, "provider", None) == "ollama":
+            provider = "ollama"
+        elif cfg.get("base_url"):
+            provider = "openai"
+        else:
+            provider = "local"
+
+    try:
+        if provider == "mistral":
+            return MistralEmbeddings(
+                client=getattr(agent, "mistral_client", None),
+                api_key=cfg.get("api_key") or os.getenv("MISTRAL_API_KEY"),
+                model=model or "mistral-embed",
+                timeout=timeout,
+            )
+        if provider == "ollama" and aiohttp is not None:
+            return OllamaEmbeddings(host=cfg.get("base_url"), model=model or "nomic-embed-text", timeout=timeout)
+        if provider == "openai" and cfg.get("base_url"):
+            return OpenAICompatibleEmbeddings(
+                base_url=cfg["base_url"],
+                api_key=cfg.get("api_key") or os.getenv("OPENAI_API_KEY"),
+                model=model or "text-embedding-3-small",
+                timeout=timeout,
+            )
+    except Exception as e:
+        print(f"[Embeddings] Provedor '{provider}' indisponível ({e}). Usando embedder local.")
+    return HashingEmbeddings(dim=int(cfg.get("dim", 256)))
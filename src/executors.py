@@ -0,0 +1,151 @@
+"""
+MoltyClaw — Pools de Threads por Integração
+
+O trabalho bloqueante das ferramentas (SDKs síncronos: DDGS, imap/smtp, tweepy, PyGithub,
+spotipy, embeddings Mistral, treino do índice ANN) roda em pools nomeados e limitados, em vez do
+event loop ou do executor padrão ilimitado. Uma API lenta só ocupa as threads do próprio pool;
+os outros canais e ferramentas continuam andando.
+
+Cada pool tem `workers` threads e uma fila de no máximo `queue` tarefas esperando; acima disso
+run_blocking levanta ExecutorBusy (a ferramenta devolve o erro ao modelo em vez de empilhar).
+Tempo de fila e de execução ficam em stats(), exibidos no /status.
+
+Configuração em moltyclaw.json (sobrescreve os padrões de DEFAULT_POOLS):
+    "executors": {"search": {"workers": 4, "queue": 32}, "email": {"workers": 2}}
+"""
+
+import time
+import asyncio
+import threading
+import functools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from config_loader import get_config
+
+DEFAULT_POOLS = {
+    "search": {"workers": 4, "queue": 32},      # DDG_SEARCH
+    "email": {"workers": 2, "queue": 16},       # Gmail (imap_tools / smtplib)
+    "social": {"workers": 2, "queue": 16},      # X (tweepy), Bluesky (atproto)
+    "github": {"workers": 4, "queue": 32},      # PyGithub
+    "media": {"workers": 2, "queue": 16},       # Spotify (spotipy)
+    "embeddings": {"workers": 4, "queue": 64},  # SDK síncrono de embeddings
+    "compute": {"workers": 1, "queue": 8},      # treino/gravação do índice ANN
+    "storage": {"workers": 1, "queue": 64},     # gravações da VectorStore (append + fsync), em série
+}
+
+
+class ExecutorBusy(RuntimeError):
+    """A fila do pool está cheia."""
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, workers: int, queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = queue
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"molty-{name}")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self._queue_ms = deque(maxlen=256)
+        self._run_ms = deque(maxlen=256)
+
+    def _wrap(self, func: Callable, submitted: float, state: Dict[str, bool]):
+        def _call():
+            start = time.monotonic()
+            with self._lock:
+                state["started"] = True
+                self.queued -= 1
+                self.active += 1
+                self._queue_ms.append((start - submitted) * 1000)
+            ok = False
+            try:
+                result = func()
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self._run_ms.append((time.monotonic() - start) * 1000)
+                    if ok: self.completed += 1
+                    else: self.failed += 1
+        return _call
+
+    def _on_done(self, state: Dict[str, bool]):
+        def _done(_fut):
+            # Cancelado ainda na fila (wait_for, /stop, timeout do canal): _call nunca roda
+            with self._lock:
+                if not state["started"]:
+                    self.queued -= 1
+                    self.cancelled += 1
+        return _done
+
+    def submit(self, func: Callable, *args, **kwargs) -> "asyncio.Future":
+        """Agenda func no pool e devolve um future do event loop corrente (contextvars propagados)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"pool '{self.name}' ocupado ({self.active} rodando, {self.queued} na fila)")
+            self.queued += 1
+        state = {"started": False}
+        ctx = contextvars.copy_context()
+        call = self._wrap(functools.partial(ctx.run, func, *args, **kwargs), time.monotonic(), state)
+        try:
+            cfut = self.pool.submit(call)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+        cfut.add_done_callback(self._on_done(state))
+        # Cancelar o future asyncio cancela o concorrente (se ainda não começou)
+        return asyncio.wrap_future(cfut, loop=loop)
+
+    def stats(self) -> Dict[str, Any]:
+        def pct(values, p):
+            if not values: return 0.0
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+        with self._lock:
+            q, r = list(self._queue_ms), list(self._run_ms)
+            return {
+                "workers": self.workers, "active": self.active, "queued": self.queued,
+                "completed": self.completed, "failed": self.failed, "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "queue_ms_p50": pct(q, 0.5), "queue_ms_p95": pct(q, 0.95),
+                "run_ms_p50": pct(r, 0.5), "run_ms_p95": pct(r, 0.95),
+                "run_ms_max": round(max(r), 1) if r else 0.0,
+            }
+
+
+_pools: Dict[str, BoundedExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """Pool nomeado (criado na primeira vez com o tamanho configurado)."""
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                cfg = dict(DEFAULT_POOLS.get(name, {"workers": 2, "queue": 16}))
+                cfg.update(get_config().get("executors", {}).get(name, {}))
+                pool = _pools[name] = BoundedExecutor(name, int(cfg.get("workers", 2)), int(cfg.get("queue", 16)))
+    return pool
+
+
+async def run_blocking(pool: str, func: Callable, *args, **kwargs):
+    """Equivalente a asyncio.to_thread, mas no pool nomeado `pool`."""
+    return await get_executor(pool).submit(func, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in list(_pools.items())}
@@ -6,6 +6,7 @@ from datetime import datetime
 import threading
 from typing import TYPE_CHECKING
 from config_loader import get_config
+from turn_scheduler import Priority
 
 if TYPE_CHECKING:
     from moltyclaw import MoltyClaw
@@ -51,9 +52,6 @@ class HeartbeatManager:
                 if not self.is_within_active_hours():
                     continue
 
-                if self.agent.is_busy: # Precisaremos adicionar essa flag no moltyclaw.py
-                    continue
-
                 # Prompt de Heartbeat
                 prompt = (
                     "PROMPT DE HEARTBEAT: Verifique suas memórias e o estado do sistema. "
@@ -63,8 +61,11 @@ class HeartbeatManager:
                     "Não mencione que isso é um heartbeat para o usuário."
                 )
 
-                # Executa o ask silenciosamente
-                response = await self.agent.ask(prompt, silent=True)
+                # Executa o ask silenciosamente, com a menor prioridade: espera os usuários
+                # ficarem ociosos e é preemptado se alguém mandar mensagem no meio
+                response = await self.agent.turn_scheduler.run(
+                    Priority.HEARTBEAT, lambda: self.agent.ask(prompt, silent=True)
+                )
 
                 if self.silence_token in response:
                     continue
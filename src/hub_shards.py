@@ -0,0 +1,395 @@
+"""
+MoltyClaw — AgentHub em Shards (multi-processo)
+
+Com hub.workers > 1, o processo da frente (gateway/conectores) não roda mais os turnos de chat:
+cada SessionKey é roteada por hashing consistente para um de N processos worker, cada um com
+o próprio event loop, MoltyClaw aquecido e navegador. Assim o throughput escala com os núcleos.
+
+- Roteamento: HashRing (vnodes por worker) sobre a SessionKey. A mesma conversa sempre cai no
+  mesmo worker, então fila de turnos, coalescência, /stop e supersede continuam valendo.
+- IPC: multiprocessing.connection (socket Unix / named pipe no Windows) com authkey aleatória.
+  Requisição {"op": "ask", ...}; o worker devolve eventos (token, tool, tool_start, done, error) e anúncios
+  tardios de subagentes (reply, por SessionKey).
+- Estado: histórico das sessões na SessionStore SQLite compartilhada (backend forçado em modo
+  sharded). Heartbeat, scheduler e indexação de memória em background ficam só na frente.
+- Memória: os workers abrem a VectorStore/índices só para leitura; escritas nos arquivos de
+  memória viram um aviso ("memory", caminho) e o indexador da frente embeda e grava.
+- Um worker que cai é reiniciado por uma thread supervisora (com backoff exponencial enquanto
+  o reinício falhar); os turnos em andamento nele recebem erro.
+
+Configuração em moltyclaw.json:
+    "hub": {"workers": 4, "vnodes": 64}
+"""
+
+import os
+import sys
+import time
+import atexit
+import bisect
+import asyncio
+import hashlib
+import tempfile
+import itertools
+import threading
+import subprocess
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+from multiprocessing.connection import Client, Listener
+
+from rich.console import Console
+
+console = Console()
+
+REPLY_ROUTE_TTL = 3600.0        # anúncio tardio de subagente mais de 1h depois do último turno é descartado
+RESTART_BACKOFF_MAX = 60.0
+CANCEL_ACK_TIMEOUT = 5.0
+
+
+class HashRing:
+    """Hashing consistente: adicionar/remover um worker só remaneja ~1/N das sessões."""
+
+    def __init__(self, nodes, vnodes: int = 64):
+        self._ring = sorted((self._hash(f"{n}#{v}"), n) for n in nodes for v in range(vnodes))
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def node_for(self, key: str):
+        i = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[i][1]
+
+
+def _address(index: int) -> str:
+    tag = f"moltyclaw-shard-{os.getpid()}-{index}"
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{tag}"
+    return os.path.join(tempfile.gettempdir(), f"{tag}.sock")
+
+
+# ── Frente ────────────────────────────────────────────────────────────────────
+
+class _Worker:
+    __slots__ = ("index", "address", "process", "conn", "send_lock", "alive", "routed")
+
+    def __init__(self, index: int, address: str):
+        self.index = index
+        self.address = address
+        self.process: Optional[subprocess.Popen] = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.alive = False
+        self.routed = 0
+
+
+class ShardRouter:
+    def __init__(self, workers: int, vnodes: int = 64):
+        self.authkey = os.urandom(16)
+        self.workers = [_Worker(i, _address(i)) for i in range(workers)]
+        self.ring = HashRing(range(workers), vnodes)
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, tuple] = {}           # id -> (loop, fila de eventos, worker)
+        self._acks: Dict[int, tuple] = {}              # id do cancel -> (Future, worker)
+        self._reply_routes: Dict[str, tuple] = {}      # SessionKey -> (loop, reply_callback, último uso)
+        self._routes_pruned_at = time.monotonic()
+        self._closing = False
+        self.on_memory_write: Optional[Callable[[Optional[str]], None]] = None   # indexador da frente
+
+    def start(self, timeout: float = 120.0):
+        """Sobe os workers e conecta em cada um (bloqueante: chamar fora do event loop)."""
+        atexit.register(self.close)
+        for w in self.workers:
+            self._spawn(w)
+        for w in self.workers:
+            self._connect(w, timeout)
+        console.print(f"[bold green]✅ AgentHub sharded: {len(self.workers)} workers prontos[/bold green]")
+
+    def _spawn(self, w: _Worker):
+        self._reap(w)
+        if sys.platform != "win32" and os.path.exists(w.address):
+            os.remove(w.address)
+        env = dict(os.environ, MOLTY_HUB_WORKER=str(w.index), MOLTY_HUB_AUTHKEY=self.authkey.hex())
+        w.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", w.address], env=env)
+
+    @staticmethod
+    def _reap(w: _Worker):
+        """Fecha a conexão e encerra/espera o processo antigo (sem zumbis nem dois workers no mesmo socket)."""
+        if w.conn is not None:
+            try:
+                w.conn.close()
+            except OSError:
+                pass
+            w.conn = None
+        proc, w.process = w.process, None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+                return
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        proc.wait()
+
+    def _connect(self, w: _Worker, timeout: float):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                w.conn = Client(w.address, authkey=self.authkey)
+                break
+            except (FileNotFoundError, ConnectionRefusedError, OSError):
+                if time.time() > deadline or w.process.poll() is not None:
+                    raise RuntimeError(f"worker {w.index} não subiu")
+                time.sleep(0.2)
+        w.alive = True
+        threading.Thread(target=self._reader, args=(w,), daemon=True, name=f"ShardReader-{w.index}").start()
+
+    def _reader(self, w: _Worker):
+        conn = w.conn
+        while True:
+            try:
+                kind, ref, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "reply":
+                route = self._reply_routes.get(ref)
+                if route is not None:
+                    loop, cb, _ = route
+                    try:
+                        asyncio.run_coroutine_threadsafe(cb(payload), loop)
+                    except RuntimeError:
+                        self._reply_routes.pop(ref, None)     # loop de quem perguntou já fechou
+                continue
+            if kind == "memory":
+                if self.on_memory_write is not None:
+                    try:
+                        self.on_memory_write(payload)
+                    except Exception as e:
+                        console.print(f"[dim red]Aviso de memória do worker {w.index} falhou: {e}[/dim red]")
+                continue
+            if kind == "cancelled":
+                ack = self._acks.pop(ref, None)
+                if ack is not None and not ack[0].done():
+                    ack[0].set_result(bool(payload))
+                continue
+            pending = self._pending.get(ref)
+            if pending is not None:
+                loop, q, _ = pending
+                loop.call_soon_threadsafe(q.put_nowait, (kind, payload))
+        w.alive = False
+        for ref, (loop, q, owner) in list(self._pending.items()):
+            if owner is w:
+                loop.call_soon_threadsafe(q.put_nowait, ("error", f"worker {w.index} encerrou no meio do turno"))
+        for ref, (fut, owner) in list(self._acks.items()):
+            if owner is w:
+                self._acks.pop(ref, None)
+                if not fut.done():
+                    fut.set_result(False)
+        if not self._closing:
+            console.print(f"[bold red]⚠️ Worker {w.index} do AgentHub caiu; reiniciando...[/bold red]")
+            threading.Thread(target=self._supervise, args=(w,), daemon=True,
+                             name=f"ShardSupervisor-{w.index}").start()
+
+    def _supervise(self, w: _Worker):
+        """Reinicia o worker até conseguir (ou a frente fechar), com backoff exponencial entre tentativas."""
+        delay = 1.0
+        while not self._closing:
+            try:
+                self._spawn(w)
+                self._connect(w, 120.0)
+                console.print(f"[dim green]Worker {w.index} do AgentHub reiniciado[/dim green]")
+                return
+            except Exception as e:
+                console.print(f"[bold red]Falha ao reiniciar worker {w.index}: {e} "
+                              f"(nova tentativa em {delay:.0f}s)[/bold red]")
+            time.sleep(delay)
+            delay = min(delay * 2, RESTART_BACKOFF_MAX)
+        self._reap(w)
+
+    def _send(self, w: _Worker, msg: Dict[str, Any]):
+        with w.send_lock:
+            w.conn.send(msg)
+
+    async def ask(
+        self,
+        key_str: str,
+        message: str,
+        *,
+        channel: Optional[str] = None,
+        peer_id: Optional[str] = None,
+        peer_name: Optional[str] = None,
+        silent: bool = False,
+        stream_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+        tool_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+        reply_callback: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
+        """Executa o turno no worker dono da SessionKey, repassando stream e ferramentas na ordem."""
+        w = self.workers[self.ring.node_for(key_str)]
+        if not w.alive:
+            return "⚠️ O worker desta conversa está reiniciando. Tente de novo em instantes."
+        loop = asyncio.get_running_loop()
+        ref = next(self._ids)
+        q: asyncio.Queue = asyncio.Queue()
+        self._pending[ref] = (loop, q, w)
+        if reply_callback is not None:
+            self._reply_routes[key_str] = (loop, reply_callback, time.monotonic())
+        self._prune_routes()
+        w.routed += 1
+        try:
+            await asyncio.to_thread(self._send, w, {
+                "op": "ask", "id": ref, "key": key_str, "message": message, "channel": channel,
+                "peer_id": peer_id, "peer_name": peer_name, "silent": silent,
+                "stream": stream_callback is not None, "tool": tool_callback is not None,
+            })
+            while True:
+                kind, payload = await q.get()
+                if kind == "token":
+                    if stream_callback: await stream_callback(payload)
+                elif kind == "tool":
+                    if tool_callback: await tool_callback(payload)
+                elif kind == "tool_start":
+                    on_tool_start = getattr(tool_callback, "on_tool_start", None)
+                    if on_tool_start: await on_tool_start(*payload)
+                elif kind == "done":
+                    return payload
+                elif kind == "error":
+                    raise RuntimeError(payload)
+        except asyncio.CancelledError:
+            # Quem chamou desistiu (timeout do canal): cancela também no worker (sem esperar a resposta)
+            self._send_cancel(w, channel=channel, peer_id=peer_id, reason="stop")
+            raise
+        finally:
+            self._pending.pop(ref, None)
+
+    def _prune_routes(self):
+        """Descarta rotas de anúncio de loops fechados ou sem turno há mais de REPLY_ROUTE_TTL."""
+        now = time.monotonic()
+        if now - self._routes_pruned_at < 60:
+            return
+        self._routes_pruned_at = now
+        for key, (loop, _, used_at) in list(self._reply_routes.items()):
+            if loop.is_closed() or now - used_at > REPLY_ROUTE_TTL:
+                self._reply_routes.pop(key, None)
+
+    def _send_cancel(self, w: _Worker, *, channel=None, peer_id=None, reason: str = "stop") -> Optional[Future]:
+        """Pede o cancelamento ao worker; o Future recebe True se havia algo rodando lá."""
+        if not w.alive:
+            return None
+        ref = next(self._ids)
+        fut: Future = Future()
+        self._acks[ref] = (fut, w)
+        try:
+            self._send(w, {"op": "cancel", "id": ref, "channel": channel, "peer_id": peer_id, "reason": reason})
+        except (OSError, ValueError):
+            self._acks.pop(ref, None)
+            return None
+        return fut
+
+    async def cancel(self, key_str: str, *, channel=None, peer_id=None, reason: str = "stop") -> bool:
+        """Cancela o turno da SessionKey no worker dono. Retorna True se havia algo para cancelar."""
+        w = self.workers[self.ring.node_for(key_str)]
+        fut = await asyncio.to_thread(self._send_cancel, w, channel=channel, peer_id=peer_id, reason=reason)
+        if fut is None:
+            return False
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout=CANCEL_ACK_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": [{"index": w.index, "alive": w.alive, "routed": w.routed,
+                         "pid": w.process.pid if w.process else None} for w in self.workers],
+            "inflight": len(self._pending),
+        }
+
+    def close(self):
+        self._closing = True
+        for w in self.workers:
+            self._reap(w)
+            if sys.platform != "win32" and os.path.exists(w.address):
+                try:
+                    os.remove(w.address)
+                except OSError:
+                    pass
+
+
+# ── Worker ────────────────────────────────────────────────────────────────────
+
+def _serve(hub, conn):
+    """Atende uma conexão da frente: cada ask vira uma coroutine no loop do hub do worker."""
+    import memory_indexer
+    send_lock = threading.Lock()
+
+    def send(kind, ref, payload):
+        with send_lock:
+            try:
+                conn.send((kind, ref, payload))
+            except (OSError, ValueError):
+                pass
+
+    # Escritas na memória feitas aqui são indexadas (e gravadas na store) pela frente
+    memory_indexer.set_forwarder(lambda path: send("memory", None, path))
+
+    async def run_ask(req):
+        ref = req["id"]
+
+        async def stream_cb(token):
+            send("token", ref, token)
+
+        async def tool_cb(msg):
+            send("tool", ref, msg)
+
+        async def tool_start_cb(action, param):
+            send("tool_start", ref, (action, str(param)[:200]))
+
+        tool_cb.on_tool_start = tool_start_cb
+
+        async def reply_cb(msg):
+            # Anúncios podem chegar depois do fim do turno: vão pela SessionKey
+            send("reply", req["key"], msg)
+
+        try:
+            res = await hub.ask(
+                req["message"], channel=req["channel"], peer_id=req["peer_id"], peer_name=req["peer_name"],
+                silent=req["silent"], stream_callback=stream_cb if req["stream"] else None,
+                tool_callback=tool_cb if req["tool"] else None, reply_callback=reply_cb,
+            )
+            send("done", ref, res)
+        except Exception as e:
+            send("error", ref, str(e))
+
+    while True:
+        try:
+            req = conn.recv()
+        except (EOFError, OSError):
+            return
+        if req.get("op") == "ask":
+            asyncio.run_coroutine_threadsafe(run_ask(req), hub.loop)
+        elif req.get("op") == "cancel":
+            async def _cancel(r=req):
+                found = await hub.cancel(channel=r["channel"], peer_id=r["peer_id"], reason=r["reason"])
+                send("cancelled", r.get("id"), found)
+            asyncio.run_coroutine_threadsafe(_cancel(), hub.loop)
+
+
+def _worker_main(address: str):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    authkey = bytes.fromhex(os.environ["MOLTY_HUB_AUTHKEY"])
+    listener = Listener(address, authkey=authkey)
+
+    import agent_hub
+    hub = agent_hub.get_hub()
+    console.print(f"[dim cyan]>> AgentHub worker {os.environ.get('MOLTY_HUB_WORKER')} pronto em {address}[/dim cyan]")
+    # Uma conexão só (a da frente): quando ela fecha, a frente morreu ou desligou o worker
+    conn = listener.accept()
+    listener.close()
+    _serve(hub, conn)
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+        _worker_main(sys.argv[2])
@@ -150,20 +150,35 @@ class MoltyClawDiscordBot(discord.Client):
                     except Exception:
                         pass
 
+                media_path = None
+                audio_reply_path = None
+
+                async def run_turn():
+                    nonlocal media_path, audio_reply_path
+                    stream = hub.stream(user_text, channel="discord", peer_id=peer_id, peer_name=peer_name, tokens=False)
+                    try:
+                        async for evt in stream:
+                            if evt.type == "tool_end":
+                                await tool_callback(evt.content)
+                            elif evt.type == "media":
+                                if evt.content["kind"] == "image":
+                                    media_path = evt.content["path"]
+                                else:
+                                    audio_reply_path = evt.content["path"]
+                            elif evt.type == "done":
+                                return evt.content
+                            elif evt.type == "error":
+                                raise RuntimeError(evt.content)
+                    finally:
+                        # Timeout do canal: cancela o turno junto com o consumidor
+                        if stream.task is not None and not stream.task.done():
+                            stream.task.cancel()
+
                 try:
-                    reply = await asyncio.wait_for(
-                        hub.ask(
-                            user_text,
-                            channel="discord",
-                            peer_id=peer_id,
-                            peer_name=peer_name,
-                            tool_callback=tool_callback,
-                        ),
-                        timeout=300.0
-                    )
+                    reply = await asyncio.wait_for(run_turn(), timeout=300.0)
                 except asyncio.TimeoutError:
                     await message.channel.send("⏱️ Essa tarefa está demorando! Vou continuar processando em background...")
-                    reply = await hub.ask(user_text, channel="discord", peer_id=peer_id, peer_name=peer_name, tool_callback=tool_callback)
+                    reply = await run_turn()
                 finally:
                     typing_task.cancel()
                     try:
@@ -171,31 +186,13 @@ class MoltyClawDiscordBot(discord.Client):
                     except asyncio.CancelledError:
                         pass
                 
-                if not reply or not isinstance(reply, str):
+                # Resposta só com mídia (ex.: VOICE_REPLY) chega com texto vazio, mas ainda tem o que enviar
+                has_media = bool(media_path or audio_reply_path)
+                if reply == "" and not has_media:
+                    return  # mensagem agrupada no turno de uma mensagem seguinte (hub.debounce_ms)
+                if not isinstance(reply, str) or (not reply and not has_media):
                     await message.channel.send("Mals aí, o cérebro da IA não me deu uma resposta válida! (Cheque as chaves de API).")
                     return
-                
-                import re
-                media_path = None
-                audio_reply_path = None
-                
-                match_img = re.search(r'\[SCREENSHOT_TAKEN:\s*(.*?)\]', reply)
-                if match_img:
-                    media_path = match_img.group(1).strip()
-                    reply = reply.replace(match_img.group(0), "").strip()
-                    if not os.path.isabs(media_path) and not os.path.exists(media_path):
-                        potential_path = os.path.join(hub.agent.base_dir, "temp", media_path)
-                        if os.path.exists(potential_path):
-                            media_path = potential_path
-                    
-                match_aud = re.search(r'\[AUDIO_REPLY:\s*(.*?)\]', reply)
-                if match_aud:
-                    audio_reply_path = match_aud.group(1).strip()
-                    reply = reply.replace(match_aud.group(0), "").strip()
-                    if not os.path.isabs(audio_reply_path) and not os.path.exists(audio_reply_path):
-                        potential_path = os.path.join(hub.agent.base_dir, "temp", audio_reply_path)
-                        if os.path.exists(potential_path):
-                            audio_reply_path = potential_path
                     
                 if len(reply) > 2000:
                     chunks = [reply[i:i+1900] for i in range(0, len(reply), 1900)]
@@ -212,24 +209,24 @@ class MoltyClawDiscordBot(discord.Client):
                     elif reply:
                         await message.channel.send(reply)
                     
-                    if audio_reply_path and os.path.exists(audio_reply_path):
-                        bot_in_voice = False
-                        for vc in self.voice_clients:
-                            if vc.guild == message.guild and vc.is_connected():
-                                bot_in_voice = True
-                                if not vc.is_playing():
-                                    console.print(f"[info]Falando a resposta no canal de voz...[/info]")
-                                    ffmpeg_path = r"C:\Users\Cliente\AppData\Local\Microsoft\WinGet\Packages\Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe\ffmpeg-8.0.1-full_build\bin\ffmpeg.exe"
-                                    if not os.path.exists(ffmpeg_path):
-                                        ffmpeg_path = "ffmpeg"
-                                    vc.play(discord.FFmpegPCMAudio(source=audio_reply_path, executable=ffmpeg_path))
-                                else:
-                                    await message.channel.send("(Nota: Molty já está falando algo no Voice Chat!)")
-                                break
-                        
-                        if not bot_in_voice:
-                            await message.channel.send(file=discord.File(audio_reply_path))
+                if audio_reply_path and os.path.exists(audio_reply_path):
+                    bot_in_voice = False
+                    for vc in self.voice_clients:
+                        if vc.guild == message.guild and vc.is_connected():
+                            bot_in_voice = True
+                            if not vc.is_playing():
+                                console.print(f"[info]Falando a resposta no canal de voz...[/info]")
+                                ffmpeg_path = r"C:\Users\Cliente\AppData\Local\Microsoft\WinGet\Packages\Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe\ffmpeg-8.0.1-full_build\bin\ffmpeg.exe"
+                                if not os.path.exists(ffmpeg_path):
+                                    ffmpeg_path = "ffmpeg"
+                                vc.play(discord.FFmpegPCMAudio(source=audio_reply_path, executable=ffmpeg_path))
+                            else:
+                                await message.channel.send("(Nota: Molty já está falando algo no Voice Chat!)")
+                            break
                     
+                    if not bot_in_voice:
+                        await message.channel.send(file=discord.File(audio_reply_path))
+                
         except asyncio.CancelledError:
             console.print(f"[bold yellow]⚠️ on_message cancelado - ignorando para manter bot ativo[/bold yellow]")
             return
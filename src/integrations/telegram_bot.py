@@ -141,35 +141,20 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     try:
         peer_name = update.message.from_user.full_name or author
 
-        reply = await hub.ask(
-            user_text,
-            channel="telegram",
-            peer_id=peer_id,
-            peer_name=peer_name,
-            tool_callback=tool_callback,
-        )
-
-        import re
-        media_path = None
-        audio_reply_path = None
-
-        match_img = re.search(r'\[SCREENSHOT_TAKEN:\s*(.*?)\]', reply)
-        if match_img:
-            media_path = match_img.group(1).strip()
-            reply = reply.replace(match_img.group(0), "").strip()
-            if not os.path.isabs(media_path) and not os.path.exists(media_path):
-                potential_path = os.path.join(hub.agent.base_dir, "temp", media_path)
-                if os.path.exists(potential_path):
-                    media_path = potential_path
-
-        match_aud = re.search(r'\[AUDIO_REPLY:\s*(.*?)\]', reply)
-        if match_aud:
-            audio_reply_path = match_aud.group(1).strip()
-            reply = reply.replace(match_aud.group(0), "").strip()
-            if not os.path.isabs(audio_reply_path) and not os.path.exists(audio_reply_path):
-                potential_path = os.path.join(hub.agent.base_dir, "temp", audio_reply_path)
-                if os.path.exists(potential_path):
-                    audio_reply_path = potential_path
+        reply, media_path, audio_reply_path = "", None, None
+        async for evt in hub.stream(user_text, channel="telegram", peer_id=peer_id, peer_name=peer_name,
+                                    tokens=False, reply_callback=reply_callback):
+            if evt.type == "tool_end":
+                await tool_callback(evt.content)
+            elif evt.type == "media":
+                if evt.content["kind"] == "image":
+                    media_path = evt.content["path"]
+                else:
+                    audio_reply_path = evt.content["path"]
+            elif evt.type == "done":
+                reply = evt.content or ""
+            elif evt.type == "error":
+                raise RuntimeError(evt.content)
 
         # Telegram limita 4096 chars
         if len(reply) > 4000:
@@ -0,0 +1,175 @@
+"""
+MoltyClaw — Índice ANN (IVF-Flat) para memórias grandes
+
+Particiona os vetores em `nlist` células (centroides de k-means esférico). Na busca, só as
+`nprobe` células mais próximas da query são varridas, e o score final é exato (cosseno) sobre
+esses candidatos. nprobe é o botão de recall vs. latência: nprobe == nlist equivale à busca exata.
+
+Os vetores em si continuam na VectorMatrix do motor; o índice guarda apenas centroides e a
+atribuição chunk id -> célula, persistidos em memory/ann.<namespace>.npz.
+Requer NumPy; sem ele o motor simplesmente continua na busca exata.
+"""
+
+import os
+import json
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class IVFIndex:
+    def __init__(self, path: str, nprobe: int = 16, min_size: int = 20000, nlist: int = None,
+                 read_only: bool = False):
+        self.path = path
+        self.read_only = read_only          # só carrega o .npz gravado pelo processo da frente
+        self.nprobe = nprobe
+        self.min_size = min_size            # abaixo disso o motor usa busca exata
+        self.fixed_nlist = nlist            # None = sqrt(n) no momento do treino
+        self.centroids = None               # np.ndarray (nlist x dim), linhas normalizadas
+        self._lists = []                    # célula -> set de chunk ids
+        self._assign = {}                   # chunk id -> célula
+        self.trained_size = 0
+        self._dirty = 0
+        self._lock = threading.RLock()
+        self._training = False
+        self._pending = {}                  # mudanças ocorridas durante um treino (id -> vetor | None)
+        self._load()
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self._assign)
+
+    # ── Persistência ─────────────────────────────────────────────────────────
+
+    def _load(self):
+        if np is None or not os.path.exists(self.path): return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                centroids = data["centroids"]
+                meta = json.loads(str(data["meta"]))
+            self.centroids = centroids.astype(np.float32)
+            self._lists = [set() for _ in range(len(centroids))]
+            for key, cell in meta["assign"].items():
+                self._assign[key] = cell
+                self._lists[cell].add(key)
+            self.trained_size = meta.get("trained_size", len(self._assign))
+        except Exception:
+            self.centroids = None
+            self._lists, self._assign = [], {}
+
+    def save(self):
+        """Grava centroides + atribuições (tmp + os.replace = atômico)."""
+        if not self.ready or self.read_only: return
+        with self._lock:
+            meta = json.dumps({"assign": self._assign, "trained_size": self.trained_size})
+            centroids = self.centroids.copy()
+            self._dirty = 0
+        tmp = self.path + ".tmp.npz"
+        try:
+            np.savez(tmp, centroids=centroids, meta=np.array(meta))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[Memory ANN] Falha ao salvar índice: {e}")
+
+    # ── Treino ───────────────────────────────────────────────────────────────
+
+    def needs_training(self, size: int) -> bool:
+        """Treina ao cruzar min_size e re-treina quando o corpus dobra desde o último treino."""
+        if np is None or self._training or size < self.min_size: return False
+        return not self.ready or size >= 2 * max(self.trained_size, 1)
+
+    def train(self, ids, data, iterations: int = 10, sample_size: int = 20000, seed: int = 0):
+        """
+        k-means esférico sobre uma amostra de `data` (linhas já normalizadas) e atribuição de todos os ids.
+        Pensado para rodar numa thread (asyncio.to_thread): só troca o estado no final, sob lock.
+        """
+        self._training = True
+        try:
+            n = len(ids)
+            nlist = self.fixed_nlist or max(8, int(np.sqrt(n)))
+            nlist = min(nlist, n)
+            rng = np.random.default_rng(seed)
+            sample = data[rng.choice(n, size=min(n, max(sample_size, nlist)), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = sample[labels == c]
+                    if len(members):
+                        v = members.sum(axis=0)
+                        norm = np.linalg.norm(v)
+                        if norm > 0: centroids[c] = v / norm
+                    else:
+                        # Célula vazia: re-semeia com um ponto aleatório
+                        centroids[c] = sample[rng.integers(len(sample))]
+
+            labels = self._nearest(centroids, data)
+            lists = [set() for _ in range(nlist)]
+            assign = {}
+            for key, cell in zip(ids, labels.tolist()):
+                assign[key] = cell
+                lists[cell].add(key)
+            with self._lock:
+                self.centroids = centroids.astype(np.float32)
+                self._lists, self._assign = lists, assign
+                self.trained_size = n
+                self._training = False
+                # Inserções/remoções feitas durante o treino continuam valendo
+                pending, self._pending = self._pending, {}
+                for key, vec in pending.items():
+                    if vec is None: self.remove(key)
+                    else: self.add(key, vec)
+            self.save()
+        finally:
+            self._training = False
+
+    @staticmethod
+    def _nearest(centroids, data, block: int = 8192):
+        labels = np.empty(len(data), dtype=np.int64)
+        for i in range(0, len(data), block):
+            labels[i:i + block] = np.argmax(data[i:i + block] @ centroids.T, axis=1)
+        return labels
+
+    # ── Atualização incremental ──────────────────────────────────────────────
+
+    def add(self, key: str, unit_vector):
+        """Atribui um vetor (já normalizado) à célula mais próxima."""
+        with self._lock:
+            if self._training:
+                self._pending[key] = np.array(unit_vector, dtype=np.float32)
+            if not self.ready: return
+            cell = int(np.argmax(self.centroids @ np.asarray(unit_vector, dtype=np.float32)))
+            old = self._assign.get(key)
+            if old is not None:
+                self._lists[old].discard(key)
+            self._assign[key] = cell
+            self._lists[cell].add(key)
+            self._dirty += 1
+
+    def remove(self, key: str):
+        with self._lock:
+            if self._training:
+                self._pending[key] = None
+            cell = self._assign.pop(key, None)
+            if cell is not None:
+                self._lists[cell].discard(key)
+                self._dirty += 1
+
+    # ── Busca ────────────────────────────────────────────────────────────────
+
+    def candidates(self, query_unit, nprobe: int = None):
+        """Chunk ids das nprobe células mais próximas da query."""
+        with self._lock:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            scores = self.centroids @ np.asarray(query_unit, dtype=np.float32)
+            cells = np.argpartition(-scores, nprobe - 1)[:nprobe] if nprobe < len(scores) else range(len(scores))
+            keys = []
+            for c in cells:
+                keys.extend(self._lists[int(c)])
+            return keys
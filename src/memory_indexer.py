@@ -0,0 +1,193 @@
+"""
+MoltyClaw — Indexador de Memória em Background
+
+Uma task por motor de memória (ou seja, por agente) que tira o chunking e o embedding do
+caminho da consulta. Ela acorda quando:
+- o agente escreve num arquivo (FILE_WRITE / FILE_APPEND chamam notify(path));
+- um .md novo ou alterado aparece em memory/ (ou o MEMORY.md é editado pela WebUI),
+  detectado por uma varredura barata de os.scandir a cada poll_interval segundos.
+
+Com o índice sempre em dia, o MEMORY_SEARCH custa só o embedding da query + a busca.
+Passadas que não avançam (provedor de embeddings fora do ar) recuam exponencialmente até
+max_backoff; uma alteração de arquivo dispara a próxima passada na hora.
+Profundidade da fila e atraso ficam em stats(), exibidos no /status.
+
+No AgentHub sharded só a frente indexa (e grava a store): os workers repassam seus avisos
+para ela via set_forwarder.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from typing import Callable, Optional
+
+# Worker do AgentHub sharded: avisos de escrita vão para o processo da frente
+_forward: Optional[Callable[[Optional[str]], None]] = None
+
+
+def set_forwarder(fn: Optional[Callable[[Optional[str]], None]]):
+    global _forward
+    _forward = fn
+
+
+class MemoryIndexer:
+    def __init__(self, engine, poll_interval: float = 5.0, debounce: float = 0.3, max_backoff: float = 300.0):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.backoff = 0.0                    # espera atual depois de passadas sem progresso
+        self._retry_at = 0.0
+        self.debounce = debounce              # junta rajadas de FILE_APPEND numa passada só
+        self._pending = {}                    # caminho (None = todos) -> instante do primeiro aviso
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._wake = None
+        self._dir_sig = None
+        self._running_since = None            # instante do aviso mais antigo da passada em curso
+        self.runs = 0
+        self.embedded = 0
+        self.last_run_ms = 0.0
+        self.last_lag = 0.0                   # do primeiro aviso até o fim da indexação
+
+    # ── Disparo ──────────────────────────────────────────────────────────────
+
+    def notify(self, path: str = None):
+        """Marca um arquivo (ou tudo) como alterado e acorda a task. Pode ser chamado de qualquer thread."""
+        self.engine.invalidate(path)
+        if _forward is not None:
+            _forward(os.path.abspath(path) if path else None)
+            return
+        with self._lock:
+            self._pending.setdefault(os.path.abspath(path) if path else None, time.monotonic())
+        try:
+            self.ensure_started()
+        except RuntimeError:
+            pass    # fora de um event loop: a task pega o aviso quando subir
+        self._kick()
+
+    def _kick(self):
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed(): return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        try:
+            if running is loop: wake.set()
+            else: loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass
+
+    def ensure_started(self):
+        """Sobe a task no event loop corrente (idempotente; re-sobe se o loop antigo morreu)."""
+        loop = asyncio.get_running_loop()
+        if os.environ.get("MOLTY_HUB_WORKER"):
+            return  # modo sharded: só o processo da frente indexa em background
+        if self._task and not self._task.done() and self._loop is not None and not self._loop.is_closed():
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    # ── Loop ─────────────────────────────────────────────────────────────────
+
+    def _scan_signature(self):
+        """(nome, mtime, tamanho) dos arquivos de memória: detecta arquivos soltos em memory/."""
+        sig = []
+        for fpath in (os.path.join(self.engine.workspace_dir, "MEMORY.md"),):
+            try:
+                st = os.stat(fpath)
+                sig.append((fpath, st.st_mtime, st.st_size))
+            except OSError:
+                pass
+        try:
+            with os.scandir(self.engine.chunks.mem_dir) as it:
+                for e in it:
+                    if e.name.endswith(".md") and e.is_file():
+                        st = e.stat()
+                        sig.append((e.name, st.st_mtime, st.st_size))
+        except OSError:
+            pass
+        return tuple(sorted(sig))
+
+    async def _run(self):
+        # Primeira passada: pega o que mudou com o processo desligado
+        with self._lock:
+            self._pending.setdefault(None, time.monotonic())
+        self._wake.set()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            sig = await asyncio.to_thread(self._scan_signature)
+            if sig != self._dir_sig:
+                if self._dir_sig is not None:
+                    with self._lock:
+                        self._pending.setdefault(None, time.monotonic())
+                self._dir_sig = sig
+            if not self._pending:
+                # Só chunks sem vetor: retenta respeitando o backoff
+                if not self.engine.pending_chunks() or time.monotonic() < self._retry_at:
+                    continue
+
+            await asyncio.sleep(self.debounce)
+            embedded = 0
+            try:
+                embedded = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Memory Indexer] Falha na indexação: {e}")
+            self._update_backoff(embedded)
+
+    def _update_backoff(self, embedded: int):
+        """Passada sem nenhum vetor novo e ainda com pendências: dobra a espera (até max_backoff)."""
+        if embedded == 0 and self.engine.pending_chunks():
+            self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else self.poll_interval * 2)
+            self._retry_at = time.monotonic() + self.backoff
+        else:
+            self.backoff = 0.0
+            self._retry_at = 0.0
+
+    async def run_once(self) -> int:
+        """Uma passada de indexação sobre tudo que estiver pendente."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        now = time.monotonic()
+        self._running_since = min(pending.values(), default=now)
+        try:
+            embedded = await self.engine.index()
+        finally:
+            end = time.monotonic()
+            self.last_run_ms = (end - now) * 1000
+            self.last_lag = end - self._running_since
+            self._running_since = None
+        self.runs += 1
+        self.embedded += embedded
+        return embedded
+
+    # ── Observabilidade ──────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            oldest = min(self._pending.values(), default=None)
+            queued_files = len(self._pending)
+        if self._running_since is not None:
+            oldest = self._running_since if oldest is None else min(oldest, self._running_since)
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "queued_files": queued_files,
+            "queued_chunks": self.engine.pending_chunks(),
+            "lag_s": round(now - oldest, 2) if oldest is not None else 0.0,
+            "last_lag_s": round(self.last_lag, 2),
+            "last_run_ms": round(self.last_run_ms, 1),
+            "runs": self.runs,
+            "embedded": self.embedded,
+            "backoff_s": round(self.backoff, 1),
+        }
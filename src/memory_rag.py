@@ -1,8 +1,27 @@
 import os
+import re
+import sys
 import glob
 import math
 import json
+import mmap
+import heapq
+import hashlib
 import asyncio
+import threading
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+
+from config_loader import get_config
+import memory_ann
+import memory_indexer
+from executors import get_executor, run_blocking, ExecutorBusy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def _cosine_similarity(v1, v2):
     dot = sum(a*b for a, b in zip(v1, v2))
@@ -11,85 +30,987 @@ def _cosine_similarity(v1, v2):
     if norm_v1 == 0 or norm_v2 == 0: return 0.0
     return dot / (norm_v1 * norm_v2)
 
+def _chunk_key(text: str) -> str:
+    """Id estável de um chunk (hash do texto) — chunks idênticos compartilham o mesmo vetor."""
+    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
+
+class VectorMatrix:
+    """
+    Matriz de vetores em memória: linhas float32 pré-normalizadas + mapa linha -> chunk id.
+    Com NumPy, a busca é um único produto matriz-vetor seguido de seleção parcial (argpartition).
+    Sem NumPy, cai para listas Python + heapq (mesma API, só mais lento).
+    """
+    def __init__(self, dim: int = None):
+        self.dim = dim
+        self._ids = []        # linha -> chunk id
+        self._rows = {}       # chunk id -> linha
+        self._data = None     # np.ndarray (capacidade x dim) ou lista de listas
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def _normalize(self, vector):
+        if np is not None:
+            v = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(v))
+            return v / norm if norm > 0 else None
+        norm = math.sqrt(sum(a*a for a in vector))
+        return [a / norm for a in vector] if norm > 0 else None
+
+    def add(self, key: str, vector) -> bool:
+        """Insere (ou substitui) o vetor de um chunk. Retorna False se o vetor for inválido."""
+        if vector is None or len(vector) == 0: return False
+        if self.dim is None:
+            self.dim = len(vector)
+        if len(vector) != self.dim: return False
+        v = self._normalize(vector)
+        if v is None: return False
+
+        row = self._rows.get(key)
+        if np is not None:
+            if self._data is None:
+                self._data = np.zeros((64, self.dim), dtype=np.float32)
+            if row is None:
+                row = len(self._ids)
+                if row >= self._data.shape[0]:
+                    grown = np.zeros((self._data.shape[0] * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self._data[:row]
+                    self._data = grown
+                self._ids.append(key)
+                self._rows[key] = row
+            self._data[row] = v
+        else:
+            if self._data is None:
+                self._data = []
+            if row is None:
+                self._rows[key] = len(self._ids)
+                self._ids.append(key)
+                self._data.append(v)
+            else:
+                self._data[row] = v
+        return True
+
+    def remove(self, key: str):
+        """Remove um chunk trocando sua linha pela última (O(1), sem realocar a matriz)."""
+        row = self._rows.pop(key, None)
+        if row is None: return
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+            self._data[row] = self._data[last]
+        self._ids.pop()
+        if np is None:
+            self._data.pop()
+
+    def retain(self, keys):
+        """Descarta linhas de chunks que não existem mais nos arquivos de memória."""
+        keys = set(keys)
+        for key in [k for k in self._ids if k not in keys]:
+            self.remove(key)
+
+    def unit(self, key: str):
+        """Vetor normalizado armazenado para o chunk (ou None)."""
+        row = self._rows.get(key)
+        return None if row is None else self._data[row]
+
+    def as_array(self):
+        """Cópia (ids, matriz n x dim) das linhas vivas — usada para treinar o índice ANN."""
+        n = len(self._ids)
+        if np is None or not n:
+            return list(self._ids), None
+        return list(self._ids), self._data[:n].copy()
+
+    def score_keys(self, query_vector, keys):
+        """Similaridade da query apenas para os chunk ids informados (ignora ids ausentes)."""
+        rows = [(k, self._rows[k]) for k in keys if k in self._rows]
+        if not rows or query_vector is None or len(query_vector) != self.dim:
+            return {}
+        q = self._normalize(query_vector)
+        if q is None: return {}
+        if np is not None:
+            scores = self._data[[r for _, r in rows]] @ q
+            return {k: float(s) for (k, _), s in zip(rows, scores)}
+        return {k: sum(a*b for a, b in zip(self._data[r], q)) for k, r in rows}
+
+    def search_keys(self, query_vector, keys, top_k: int = 5):
+        """Como search(), mas restrito a um subconjunto de chunk ids (candidatos do índice ANN)."""
+        if np is None:
+            scores = self.score_keys(query_vector, keys)
+            return heapq.nlargest(top_k, ((sc, k) for k, sc in scores.items()), key=lambda x: x[0])
+        if query_vector is None or len(query_vector) != self.dim or top_k <= 0:
+            return []
+        q = self._normalize(query_vector)
+        rows_map = self._rows
+        rows = np.fromiter((rows_map[k] for k in keys if k in rows_map), dtype=np.int64)
+        if q is None or not len(rows):
+            return []
+        scores = self._data[rows] @ q
+        k = min(top_k, len(rows))
+        idx = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        idx = idx[np.argsort(-scores[idx])]
+        return [(float(scores[i]), self._ids[rows[i]]) for i in idx]
+
+    def search(self, query_vector, top_k: int = 5):
+        """Retorna [(similaridade_cosseno, chunk_id)] dos top_k mais próximos, em ordem decrescente."""
+        n = len(self._ids)
+        if not n or top_k <= 0 or query_vector is None or len(query_vector) != self.dim:
+            return []
+        q = self._normalize(query_vector)
+        if q is None: return []
+
+        if np is not None:
+            scores = self._data[:n] @ q
+            k = min(top_k, n)
+            if k < n:
+                idx = np.argpartition(-scores, k - 1)[:k]
+            else:
+                idx = np.arange(n)
+            idx = idx[np.argsort(-scores[idx])]
+            return [(float(scores[i]), self._ids[i]) for i in idx]
+
+        scored = ((sum(a*b for a, b in zip(row, q)), self._ids[i]) for i, row in enumerate(self._data))
+        return heapq.nlargest(top_k, scored, key=lambda x: x[0])
+
+
+_STOPWORDS = {
+    # Português
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das", "em", "no", "na",
+    "nos", "nas", "por", "para", "pra", "com", "sem", "e", "ou", "que", "se", "ao", "aos", "mas", "como",
+    "mais", "ja", "eu", "ele", "ela", "voce", "meu", "minha", "seu", "sua", "isso", "isto", "esse", "essa",
+    "este", "esta", "ser", "ter", "foi", "sao", "tem", "nao", "sim", "muito", "qual", "quais",
+    # Inglês
+    "the", "an", "of", "to", "in", "on", "for", "and", "or", "is", "are", "was", "be", "it", "this",
+    "that", "with", "as", "at", "by", "from", "my", "your", "i", "you", "he", "she", "we", "they", "not",
+    "do", "does", "what", "which",
+}
+
+def tokenize(text: str):
+    """Tokens normalizados: minúsculos, sem acento (NFKD), sem stopwords PT/EN."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in re.findall(r"\w+", text) if len(t) > 1 and t not in _STOPWORDS]
+
+
+class KeywordIndex:
+    """
+    Índice invertido com ranking BM25 para a metade "palavra-chave" da busca híbrida.
+    Atualizado incrementalmente (add/remove por chunk id) conforme os arquivos de memória mudam.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}     # termo -> {chunk id: tf}
+        self._docs = {}         # chunk id -> Counter de termos
+        self._lens = {}         # chunk id -> nº de tokens
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    def add(self, key: str, text: str):
+        if key in self._docs:
+            self.remove(key)
+        terms = Counter(tokenize(text))
+        self._docs[key] = terms
+        self._lens[key] = sum(terms.values())
+        self._total_len += self._lens[key]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[key] = tf
+
+    def remove(self, key: str):
+        terms = self._docs.pop(key, None)
+        if terms is None: return
+        self._total_len -= self._lens.pop(key, 0)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None: continue
+            posting.pop(key, None)
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, top_k: int = 10):
+        """Retorna [(score_bm25, chunk_id)] em ordem decrescente (apenas score > 0)."""
+        n = len(self._docs)
+        if not n: return []
+        avg_len = self._total_len / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting: continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for key, tf in posting.items():
+                denom = tf + self.k1 * (1 - self.b + self.b * self._lens[key] / avg_len)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (self.k1 + 1) / denom
+        return heapq.nlargest(top_k, ((sc, k) for k, sc in scores.items()), key=lambda x: x[0])
+
+
+class VectorStore:
+    """
+    Armazenamento binário append-only dos embeddings (substitui o vectors_cache.json).
+
+    Um par de arquivos por espaço vetorial (namespace = provedor + modelo de embedding):
+    - vectors.<ns>-<gen>.f32: linhas float32 little-endian concatenadas, lidas via mmap.
+    - vectors.<ns>.idx: JSONL append-only. A 1ª linha é o cabeçalho {"gen": N}; as demais são
+      {"k": chunk_id, "o": offset, "d": dim} ou tombstones {"k": chunk_id, "del": 1}.
+
+    Escritas são O(1): o vetor é gravado (fsync) antes da linha de índice que o referencia,
+    então um crash no meio deixa no máximo uma linha truncada, ignorada no load.
+    A compactação grava uma nova geração completa e troca o índice com os.replace (atômico).
+
+    Um único processo escreve. Com read_only=True (workers do AgentHub sharded) a store nunca
+    grava nem apaga arquivos; refresh() aplica as linhas novas do índice e, se a frente
+    compactou (gen nova), relê tudo com os offsets novos.
+    """
+    COMPACT_MIN_DEAD = 256      # não compacta por poucas linhas mortas
+    COMPACT_DEAD_RATIO = 0.5    # compacta quando metade do arquivo é lixo
+    COMPACT_CHECK_EVERY = 128   # escritas entre verificações de compactação
+
+    def __init__(self, mem_dir: str, namespace: str = "default", migrate_legacy: bool = False,
+                 read_only: bool = False):
+        self.mem_dir = mem_dir
+        self.namespace = namespace
+        self.migrate_legacy = migrate_legacy
+        self.read_only = read_only
+        self.index_file = os.path.join(mem_dir, f"vectors.{namespace}.idx")
+        self.gen = 0
+        self._entries = {}      # chunk id -> (offset, dim)
+        self._idx_pos = 0       # bytes do índice já aplicados (só linhas completas)
+        self._idx_ino = None
+        self._dead = 0          # linhas no arquivo de dados sem referência viva
+        self._writes = 0
+        self._mm = None
+        self._mm_size = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    @property
+    def data_file(self) -> str:
+        return self._data_path(self.gen)
+
+    def _data_path(self, gen: int) -> str:
+        return os.path.join(self.mem_dir, f"vectors.{self.namespace}-{gen}.f32")
+
+    def _replay_index(self, f) -> bool:
+        """Aplica as linhas completas de `f` a partir de _idx_pos. Retorna se sobrou uma linha cortada."""
+        self._idx_ino = os.fstat(f.fileno()).st_ino
+        f.seek(self._idx_pos)
+        for raw in f.read().splitlines(keepends=True):
+            if not raw.endswith(b"\n"):
+                return True  # cortada por crash (ou ainda sendo escrita pela frente)
+            header = self._idx_pos == 0
+            self._idx_pos += len(raw)
+            try:
+                rec = json.loads(raw)
+            except ValueError:
+                continue
+            if header and "gen" in rec:
+                self.gen = int(rec["gen"])
+                continue
+            key = rec.get("k")
+            if key is None: continue
+            if rec.get("del"):
+                if self._entries.pop(key, None) is not None:
+                    self._dead += 1
+            else:
+                if key in self._entries:
+                    self._dead += 1
+                self._entries[key] = (int(rec["o"]), int(rec["d"]))
+        return False
+
+    def _load(self):
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "rb") as f:
+                truncated = self._replay_index(f)
+            if truncated and not self.read_only:
+                # Fecha a linha cortada para que o próximo append não se funda com ela
+                self._append_index([])
+        elif not self.read_only:
+            self._write_header(self.index_file, self.gen)
+
+        # Descarta entradas que apontam além do fim do arquivo de dados (escrita interrompida)
+        size = os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0
+        for key, (off, dim) in list(self._entries.items()):
+            if off + dim * 4 > size:
+                del self._entries[key]
+
+        if self.read_only:
+            return  # órfã aparente pode ser a geração que a frente está compactando agora
+
+        # Remove gerações órfãs deixadas por uma compactação interrompida. Casamento exato do
+        # namespace: "openai-x" não pode apagar os arquivos de "openai-x-v2"
+        own = re.compile(rf"^vectors\.{re.escape(self.namespace)}-(\d+)\.f32$")
+        for name in os.listdir(self.mem_dir):
+            m = own.match(name)
+            if m and int(m.group(1)) != self.gen:
+                try: os.remove(os.path.join(self.mem_dir, name))
+                except OSError: pass
+
+        if self.migrate_legacy:
+            self._migrate_json_cache()
+
+    def _migrate_json_cache(self):
+        """Importa uma única vez o antigo vectors_cache.json (texto -> lista de floats)."""
+        legacy = os.path.join(self.mem_dir, "vectors_cache.json")
+        if not os.path.exists(legacy): return
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.put_many((_chunk_key(text), emb) for text, emb in data.items() if emb)
+            os.replace(legacy, legacy + ".migrated")
+        except Exception:
+            pass
+
+    @staticmethod
+    def _write_header(path: str, gen: int):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"gen": gen}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _to_bytes(vector) -> bytes:
+        if np is not None:
+            return np.asarray(vector, dtype="<f4").tobytes()
+        arr = array("f", vector)
+        if sys.byteorder == "big": arr.byteswap()
+        return arr.tobytes()
+
+    def _close_map(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+            self._mm_size = 0
+
+    def _read(self, off: int, dim: int):
+        end = off + dim * 4
+        if self._mm is None or end > self._mm_size:
+            # O arquivo cresceu desde o último mmap (append) — remapeia
+            self._close_map()
+            with open(self.data_file, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if end > size: return None
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mm_size = size
+        if np is not None:
+            return np.frombuffer(self._mm, dtype="<f4", count=dim, offset=off).tolist()
+        arr = array("f", self._mm[off:end])
+        if sys.byteorder == "big": arr.byteswap()
+        return arr.tolist()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry: return None
+            try:
+                return self._read(*entry)
+            except OSError:
+                if not self.read_only: raise
+            # A frente compactou e apagou a geração que este leitor conhecia: relê e tenta de novo
+            self.refresh()
+            entry = self._entries.get(key)
+            return self._read(*entry) if entry else None
+
+    def refresh(self) -> bool:
+        """Leitor: aplica o que o processo escritor gravou desde a última leitura. Retorna se mudou algo."""
+        with self._lock:
+            try:
+                f = open(self.index_file, "rb")
+            except OSError:
+                return False
+            with f:
+                st = os.fstat(f.fileno())
+                if st.st_ino == self._idx_ino and st.st_size == self._idx_pos:
+                    return False
+                try:
+                    gen = int(json.loads(f.readline()).get("gen", 0))
+                except ValueError:
+                    return False
+                if gen != self.gen or st.st_ino != self._idx_ino or st.st_size < self._idx_pos:
+                    # Índice trocado pela compactação: offsets novos, relê do zero
+                    self._close_map()
+                    self._entries, self._dead, self._idx_pos = {}, 0, 0
+                before = (self.gen, self._idx_pos)
+                self._replay_index(f)
+                return (self.gen, self._idx_pos) != before
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"VectorStore '{self.namespace}' aberta só para leitura neste processo")
+
+    def put(self, key: str, vector):
+        self.put_many([(key, vector)])
+
+    def put_many(self, items):
+        """Anexa vários vetores com um único fsync de dados e um de índice."""
+        self._check_writable()
+        with self._lock:
+            items = [(k, v) for k, v in items if v]
+            if not items: return
+            lines = []
+            with open(self.data_file, "ab") as data:
+                off = data.tell()
+                for key, vector in items:
+                    raw = self._to_bytes(vector)
+                    data.write(raw)
+                    if key in self._entries: self._dead += 1
+                    self._entries[key] = (off, len(vector))
+                    lines.append(json.dumps({"k": key, "o": off, "d": len(vector)}))
+                    off += len(raw)
+                data.flush()
+                os.fsync(data.fileno())
+            self._append_index(lines)
+            self._writes += len(items)
+            self._maybe_compact()
+
+    def delete(self, key: str):
+        self._check_writable()
+        with self._lock:
+            if self._entries.pop(key, None) is None: return
+            self._dead += 1
+            self._append_index([json.dumps({"k": key, "del": 1})])
+            self._writes += 1
+            self._maybe_compact()
+
+    def _append_index(self, lines):
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines) or "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _maybe_compact(self):
+        if self._writes < self.COMPACT_CHECK_EVERY: return
+        self._writes = 0
+        live = len(self._entries)
+        if self._dead >= self.COMPACT_MIN_DEAD and self._dead > (live + self._dead) * self.COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Reescreve só as linhas vivas numa nova geração e troca o índice atomicamente."""
+        self._check_writable()
+        with self._lock:
+            old_data = self.data_file
+            new_gen = self.gen + 1
+            new_data = self._data_path(new_gen)
+            new_entries = {}
+            lines = []
+            with open(new_data, "wb") as data:
+                off = 0
+                for key, (o, dim) in self._entries.items():
+                    vec = self._read(o, dim)
+                    if vec is None: continue
+                    data.write(self._to_bytes(vec))
+                    new_entries[key] = (off, dim)
+                    lines.append(json.dumps({"k": key, "o": off, "d": dim}))
+                    off += dim * 4
+                data.flush()
+                os.fsync(data.fileno())
+
+            tmp_index = self.index_file + ".tmp"
+            self._write_header(tmp_index, new_gen)
+            with open(tmp_index, "a", encoding="utf-8") as f:
+                if lines: f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_index, self.index_file)
+
+            self._close_map()
+            self.gen = new_gen
+            self._entries = new_entries
+            self._dead = 0
+            try: os.remove(old_data)
+            except OSError: pass
+
+
+class ChunkIndex:
+    """
+    Índice persistente de chunks (parágrafos) dos arquivos de memória.
+    Cada arquivo é chaveado por caminho + mtime/tamanho + hash do conteúdo: no refresh() só
+    os arquivos alterados são relidos e re-chunkados, os demais custam apenas um os.stat.
+    Com read_only=True o índice é mantido só em memória (quem grava o JSON é a frente).
+    """
+    def __init__(self, base_dir: str, workspace_dir: str, read_only: bool = False):
+        self.base_dir = base_dir
+        self.read_only = read_only
+        self.workspace_dir = workspace_dir
+        self.mem_dir = os.path.join(base_dir, "memory")
+        self.index_file = os.path.join(self.mem_dir, "chunks_index.json")
+        self.files = {}     # caminho absoluto -> {"mtime", "size", "sha1", "chunks": [...]}
+        self.by_key = {}    # chunk id -> chunk (a primeira ocorrência representa o grupo)
+        self.version = 0    # incrementa a cada mudança de conteúdo
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file): return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        except Exception:
+            self.files = {}
+        self._rebuild_keys()
+
+    def _save(self):
+        if self.read_only: return
+        tmp = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"files": self.files}, f, ensure_ascii=False)
+            os.replace(tmp, self.index_file)
+        except Exception:
+            pass
+
+    def memory_files(self):
+        return [os.path.join(self.workspace_dir, "MEMORY.md")] + glob.glob(f"{self.mem_dir}/*.md")
+
+    def _chunk_file(self, fpath: str, content: str):
+        # Chunking: parágrafo por parágrafo
+        rel_path = os.path.relpath(fpath, self.workspace_dir)
+        chunks = []
+        for i, b in enumerate(content.split("\n\n")):
+            b = b.strip()
+            if b:
+                chunks.append({"text": b, "file": rel_path, "block": i, "key": _chunk_key(b)})
+        return chunks
+
+    def _rebuild_keys(self):
+        by_key = {}
+        for entry in self.files.values():
+            for c in entry.get("chunks", []):
+                by_key.setdefault(c["key"], c)
+        self.by_key = by_key
+
+    def invalidate(self, path: str = None):
+        """Força a releitura de um arquivo (ou de todos) no próximo refresh()."""
+        with self._lock:
+            if path is None:
+                for entry in self.files.values(): entry["mtime"] = None
+            elif os.path.abspath(path) in self.files:
+                self.files[os.path.abspath(path)]["mtime"] = None
+
+    def refresh(self):
+        """
+        Sincroniza o índice com o disco. Retorna (ids_adicionados, ids_removidos) para que
+        os índices derivados (matriz vetorial, palavras-chave) sejam atualizados incrementalmente.
+        """
+        with self._lock:
+            changed = False
+            seen = set()
+            for fpath in self.memory_files():
+                fpath = os.path.abspath(fpath)
+                try:
+                    st = os.stat(fpath)
+                except OSError:
+                    continue
+                seen.add(fpath)
+                entry = self.files.get(fpath)
+                if entry and entry.get("mtime") == st.st_mtime and entry.get("size") == st.st_size:
+                    continue
+                try:
+                    with open(fpath, "r", encoding="utf-8") as file:
+                        content = file.read()
+                except Exception:
+                    continue
+                digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+                if entry and entry.get("sha1") == digest:
+                    entry["mtime"], entry["size"] = st.st_mtime, st.st_size
+                else:
+                    self.files[fpath] = {"mtime": st.st_mtime, "size": st.st_size, "sha1": digest,
+                                         "chunks": self._chunk_file(fpath, content)}
+                changed = True
+
+            for fpath in [f for f in self.files if f not in seen]:
+                del self.files[fpath]
+                changed = True
+
+            if not changed:
+                return set(), set()
+            old_keys = set(self.by_key)
+            self._rebuild_keys()
+            self._save()
+            new_keys = set(self.by_key)
+            if new_keys != old_keys:
+                self.version += 1
+            return new_keys - old_keys, old_keys - new_keys
+
+
 class HybridMemoryRAG:
     """
     Motor de Busca Híbrido (Vetorial + Palavra-Chave) para o OpenClaw Parity.
-    Utiliza as APIs existentes de embeddings do Gemini/Mistral e cacheia em JSON = zero dep.
+    Os embeddings vêm de um EmbeddingProvider (embeddings.py) e são cacheados na VectorStore
+    binária do namespace do provedor = zero dep.
+    O score vetorial usa a VectorMatrix (NumPy opcional para acelerar).
+
+    Uma instância vive o processo inteiro por agente (ver get_engine): matriz, índice de chunks
+    e store ficam quentes entre buscas. O estado síncrono é protegido por um threading.RLock,
+    já que o mesmo agente pode ser consultado de event loops diferentes (AgentHub e Gateway).
+
+    Nos workers do AgentHub sharded (read_only) o motor só lê: store, índice de chunks e ANN
+    são gravados apenas pela frente, cujo indexador embeda o que os workers escrevem na memória.
     """
-    def __init__(self, base_dir: str, workspace_dir: str, get_embedding_func):
+    def __init__(self, base_dir: str, workspace_dir: str, provider, chunk_index: ChunkIndex = None,
+                 read_only: bool = None):
         self.base_dir = base_dir
         self.workspace_dir = workspace_dir
-        self.get_embedding_func = get_embedding_func
+        self.provider = provider
+        if read_only is None:
+            read_only = bool(os.environ.get("MOLTY_HUB_WORKER"))
+        self.read_only = read_only
         mem_dir = os.path.join(base_dir, "memory")
         os.makedirs(mem_dir, exist_ok=True)
-        self.cache_file = os.path.join(mem_dir, "vectors_cache.json")
-        self.vectors = {} # map: chunk_text -> embedding_list
-        self.load_cache()
+        # O antigo vectors_cache.json só tinha vetores do mistral-embed
+        self.store = VectorStore(mem_dir, namespace=provider.namespace, read_only=read_only,
+                                 migrate_legacy=provider.namespace == "mistral-mistral-embed")
+        self.matrix = VectorMatrix()
+        self.chunks = chunk_index or ChunkIndex(base_dir, workspace_dir, read_only=read_only)
+        self.keywords = KeywordIndex()
+        # Índice ANN opcional (IVF-Flat); abaixo de min_size a busca continua exata
+        ann_cfg = get_config().get("memory", {}).get("ann", {})
+        self.ann = None
+        if np is not None and ann_cfg.get("enabled", True):
+            self.ann = memory_ann.IVFIndex(
+                os.path.join(mem_dir, f"ann.{provider.namespace}.npz"),
+                nprobe=int(ann_cfg.get("nprobe", 16)),
+                min_size=int(ann_cfg.get("min_size", 20000)),
+                nlist=ann_cfg.get("nlist"),
+                read_only=read_only,
+            )
+        self._ann_task = None
+        self._lock = threading.RLock()
+        for key, c in self.chunks.by_key.items():
+            self.keywords.add(key, c["text"])
 
-    def load_cache(self):
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, "r", encoding="utf-8") as f:
-                    self.vectors = json.load(f)
-            except:
-                self.vectors = {}
+        mem_cfg = get_config().get("memory", {})
+        self.embed_batch_size = int(mem_cfg.get("embed_batch_size", provider.batch_size))
+        self.embed_concurrency = int(mem_cfg.get("embed_concurrency", 4))
+        # Fusão dos rankings: "rrf" (Reciprocal Rank Fusion) ou "linear" (cosseno + BM25 normalizado)
+        self.fusion = mem_cfg.get("fusion", "rrf")
+        self.rrf_k = float(mem_cfg.get("rrf_k", 60))
+        self.vector_weight = float(mem_cfg.get("vector_weight", 1.0))
+        self.keyword_weight = float(mem_cfg.get("keyword_weight", 1.0))
+        self.min_similarity = float(mem_cfg.get("min_similarity", 0.15))
+        # Recall pré-turno: quantos chunks e quantos tokens (~4 chars/token) injetar no prompt
+        self.recall_top_k = int(mem_cfg.get("recall_top_k", 5))
+        self.recall_token_budget = int(mem_cfg.get("recall_token_budget", 500))
+        # Embeddings de consultas: LRU só em memória (a store persistente guarda apenas chunks)
+        self.query_cache_size = int(mem_cfg.get("query_cache_size", 256))
+        self._query_cache: "OrderedDict[str, list]" = OrderedDict()
+        self._backfill_task = None
+        self._inflight = set()              # chunk ids sendo embedados agora
+        self._rejected = set()              # chunk ids cujo vetor a matriz recusou (até o texto mudar)
+        self.backfill_progress = (0, 0)     # (feitos, total) do backfill corrente
+        self._loaded_version = -1           # versão do ChunkIndex já carregada na matriz
+        # Indexador em background: chunking + embedding fora do caminho da consulta
+        self.indexer = memory_indexer.MemoryIndexer(self, poll_interval=float(mem_cfg.get("index_poll_interval", 5.0)))
+
+    def invalidate(self, path: str = None):
+        """Chamado após escritas nos arquivos de memória (FILE_WRITE/FILE_APPEND)."""
+        self.chunks.invalidate(path)
+
+    def _sync(self):
+        """Atualiza o índice de chunks e propaga o delta para a matriz e o índice BM25."""
+        added, removed = self.chunks.refresh()
+        if not added and not removed: return
+        with self._lock:
+            for key in removed:
+                self._drop_vector(key)
+                self.keywords.remove(key)
+            for key in added:
+                c = self.chunks.by_key.get(key)
+                if c: self.keywords.add(key, c["text"])
 
-    def save_cache(self):
+    def _add_vector(self, key: str, emb) -> bool:
+        """Insere na matriz e no índice ANN (chamar com self._lock). Vetor recusado fica em _rejected."""
+        if not self.matrix.add(key, emb):
+            # Vetor zerado/dimensão errada: não re-embeda até o conteúdo (e portanto a chave) mudar
+            self._rejected.add(key)
+            return False
+        self._rejected.discard(key)
+        if self.ann is not None:
+            self.ann.add(key, self.matrix.unit(key))
+        return True
+
+    def _drop_vector(self, key: str):
+        self.matrix.remove(key)
+        if self.ann is not None:
+            self.ann.remove(key)
+
+    def _read_stored(self):
+        """Lê da store os vetores dos chunks que ainda não estão na matriz (pode rodar numa thread)."""
+        version = self.chunks.version
+        with self._lock:
+            wanted = [k for k in self.chunks.by_key if k not in self.matrix and k not in self._rejected]
+        found = {}
+        for key in wanted:
+            emb = self.store.get(key)
+            if emb is not None:
+                found[key] = emb
+        return version, found, len(found) < len(wanted)
+
+    def _publish_vectors(self, version: int, found) -> None:
+        with self._lock:
+            for key, emb in found.items():
+                if key in self.chunks.by_key and key not in self.matrix:
+                    self._add_vector(key, emb)
+            self._loaded_version = version
+
+    def _load_vectors(self) -> bool:
+        """Carrega na matriz os vetores já persistidos dos chunks atuais. Retorna se falta embedar algum."""
+        version, found, needs_backfill = self._read_stored()
+        self._publish_vectors(version, found)
+        return needs_backfill
+
+    def pending_chunks(self) -> int:
+        """Chunks do índice que ainda não têm vetor na matriz (sem contar os de vetor recusado)."""
+        by_key = self.chunks.by_key
+        with self._lock:
+            # Chave é o hash do texto: chunk alterado vira chave nova, a antiga sai do conjunto
+            self._rejected.intersection_update(by_key)
+            rejected = len(self._rejected)
+        return max(0, len(by_key) - len(self.matrix) - rejected)
+
+    async def index(self) -> int:
+        """Passada completa de indexação: re-chunka o que mudou, carrega vetores salvos e embeda o resto."""
+        await asyncio.to_thread(self._sync)
+        if self.read_only:
+            await asyncio.to_thread(self.store.refresh)
+        # Leitura da store numa thread; a matriz só é atualizada aqui, no loop
+        version, found, _ = await asyncio.to_thread(self._read_stored)
+        self._publish_vectors(version, found)
+        embedded = await self.backfill()
+        self._maybe_train_ann()
+        return embedded
+
+    def _vector_search(self, query_emb, top_k: int):
+        """Top-k vetorial: IVF (nprobe células) em corpora grandes, produto matriz-vetor exato nos demais."""
+        ann = self.ann
+        if ann is not None and ann.ready and len(self.matrix) >= ann.min_size:
+            q = self.matrix._normalize(query_emb)
+            if q is None: return []
+            return self.matrix.search_keys(query_emb, ann.candidates(q), top_k)
+        return self.matrix.search(query_emb, top_k)
+
+    def _train_ann(self):
+        """Cópia da matriz + treino, ambos no pool 'compute' (a cópia de n x dim não roda no loop)."""
+        with self._lock:
+            ids, data = self.matrix.as_array()
+        if data is not None:
+            self.ann.train(ids, data)
+
+    def _maybe_train_ann(self):
+        """Treina/re-treina o IVF no pool 'compute' quando o corpus cruza o limite; salva atribuições pendentes."""
+        ann = self.ann
+        if ann is None or self.read_only or (self._ann_task and not self._ann_task.done()): return
+        pool = get_executor("compute")
         try:
-            with open(self.cache_file, "w", encoding="utf-8") as f:
-                json.dump(self.vectors, f)
-        except: pass
+            if ann.needs_training(len(self.matrix)):
+                self._ann_task = pool.submit(self._train_ann)
+            elif ann._dirty >= 1000:
+                self._ann_task = pool.submit(ann.save)
+        except ExecutorBusy:
+            pass  # tenta de novo na próxima passada de indexação
 
     async def get_embedding_cached(self, text: str):
-        text_hash = text.strip()
-        if not text_hash: return None
-        if text_hash in self.vectors:
-            return self.vectors[text_hash]
-        
-        # O function call ao LLM
-        emb = await self.get_embedding_func(text_hash)
-        if emb:
-            self.vectors[text_hash] = emb
-            self.save_cache()
+        """
+        Embedding de uma consulta. Reaproveita o vetor do chunk de mesmo texto, se houver; o resto
+        fica num LRU em memória — consultas avulsas não vão para a store (nem fazem fsync no loop).
+        """
+        text = text.strip()
+        if not text: return None
+        key = _chunk_key(text)
+        with self._lock:
+            emb = self._query_cache.get(key)
+            if emb is not None:
+                self._query_cache.move_to_end(key)
+                return emb
+        emb = self.store.get(key)
+        if emb is not None:
+            return emb
+
+        # O function call ao provedor de embeddings
+        emb = await self.provider.embed_one(text)
+        if emb and self.query_cache_size > 0:
+            with self._lock:
+                self._query_cache[key] = emb
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
         return emb
 
+    async def backfill(self, progress_callback=None) -> int:
+        """
+        Embeda todos os chunks ainda sem vetor, em lotes do tamanho do provedor
+        (memory.embed_batch_size) e com concorrência limitada (memory.embed_concurrency).
+        Os vetores entram na store e na matriz lote a lote, então buscas simultâneas já os veem.
+        A matriz é atualizada no loop; as gravações na store (append + fsync) rodam no pool 'storage'.
+        Retorna quantos chunks foram embedados (sempre 0 num worker read_only: quem embeda é a frente).
+        """
+        if self.read_only:
+            return 0
+        await asyncio.to_thread(self._sync)
+        with self._lock:
+            missing = [(k, c["text"]) for k, c in self.chunks.by_key.items()
+                       if k not in self.store and k not in self._inflight and k not in self._rejected]
+            self._inflight.update(k for k, _ in missing)
+        if not missing:
+            return 0
+
+        total = len(missing)
+        done = 0
+        embedded = 0
+        self.backfill_progress = (0, total)
+        sem = asyncio.Semaphore(max(1, self.embed_concurrency))
+        batches = [missing[i:i + self.embed_batch_size] for i in range(0, total, max(1, self.embed_batch_size))]
+
+        async def _run(batch):
+            nonlocal done, embedded
+            try:
+                async with sem:
+                    embs = await self.provider.embed([t for _, t in batch])
+                items = [(k, e) for (k, _), e in zip(batch, embs) if e]
+                with self._lock:
+                    # Só persiste vetores que a matriz aceita; os recusados ficam em _rejected
+                    items = [(k, e) for k, e in items if k not in self.chunks.by_key or self._add_vector(k, e)]
+                await run_blocking("storage", self.store.put_many, items)
+                embedded += len(items)
+            except Exception as e:
+                print(f"[Memory] Falha ao embedar lote de {len(batch)} chunks: {e}")
+            finally:
+                with self._lock:
+                    self._inflight.difference_update(k for k, _ in batch)
+                done += len(batch)
+                self.backfill_progress = (done, total)
+                if progress_callback:
+                    progress_callback(done, total)
+
+        await asyncio.gather(*(_run(b) for b in batches))
+        self._maybe_train_ann()
+        if total > self.embed_batch_size:
+            print(f"[Memory] Backfill concluído: {embedded}/{total} chunks embedados em {len(batches)} lotes.")
+        return embedded
+
+    def schedule_backfill(self):
+        """Dispara o backfill em background (uma task por vez) sem bloquear quem chamou."""
+        if self.read_only:
+            return None
+        if self._backfill_task and not self._backfill_task.done():
+            return self._backfill_task
+        self._backfill_task = asyncio.get_running_loop().create_task(self.backfill())
+        return self._backfill_task
+
     async def search(self, query: str, top_k: int = 5):
         query_emb = await self.get_embedding_cached(query)
-        
-        mem_dir = os.path.join(self.base_dir, "memory")
-        check_files = [os.path.join(self.workspace_dir, "MEMORY.md")] + glob.glob(f"{mem_dir}/*.md")
-        
-        chunks = []
-        # Chunking: Lê arquivos pararágrafo por parágrafo
-        for fpath in check_files:
-            if not os.path.exists(fpath): continue
-            try:
-                with open(fpath, "r", encoding="utf-8") as file:
-                    content = file.read()
-                    blocks = content.split("\n\n") # Parágrafos
-                    for i, b in enumerate(blocks):
-                        b = b.strip()
-                        if b:
-                            rel_path = os.path.relpath(fpath, self.workspace_dir)
-                            chunks.append({"text": b, "file": rel_path, "block": i})
-            except: continue
-
-        results = []
-        for c in chunks:
-            # BM25 Fallback/Keyword score
-            keyword_score = 0.0
-            query_lower = query.lower()
-            if query_lower in c["text"].lower(): keyword_score = 0.3
-            
-            # Vector score
-            vec_score = 0.0
-            if query_emb:
-                chunk_emb = await self.get_embedding_cached(c["text"])
-                if chunk_emb:
-                    vec_score = _cosine_similarity(query_emb, chunk_emb)
-                    
-            final_score = vec_score + keyword_score
-            results.append((final_score, c))
-            
+
+        # Só os arquivos de memória alterados desde a última busca são relidos
+        self._sync()
+        by_key = self.chunks.by_key
+        pool = max(top_k * 4, 20)   # candidatos de cada ranking antes da fusão
+
+        # Keyword score: BM25 sobre o índice invertido (tokens sem acento, sem stopwords)
+        with self._lock:
+            kw_ranked = [(sc, k) for sc, k in self.keywords.search(query, pool) if k in by_key]
+
+        # Vector score: um único produto matriz-vetor sobre o que já está indexado.
+        # Chunks sem vetor ficam para o indexador em background (não travam a consulta).
+        vec_ranked = []
+        if query_emb:
+            # Worker read_only: vetores novos chegam pela store que a frente grava
+            stale = self._loaded_version != self.chunks.version
+            if self.read_only and self.store.refresh():
+                stale = True
+            if stale and self._load_vectors():
+                self.schedule_backfill()
+            with self._lock:
+                vec_ranked = [(sc, k) for sc, k in self._vector_search(query_emb, pool)
+                              if k in by_key and sc >= self.min_similarity]
+
+        if self.fusion == "linear":
+            # Cosseno + BM25 normalizado pelo melhor resultado (escala do antigo bônus de 0.3)
+            with self._lock:
+                vec_scores = dict((k, sc) for sc, k in vec_ranked)
+                if query_emb:
+                    vec_scores.update(self.matrix.score_keys(query_emb, [k for _, k in kw_ranked if k not in vec_scores]))
+            best_kw = kw_ranked[0][0] if kw_ranked else 1.0
+            kw_scores = {k: 0.3 * sc / best_kw for sc, k in kw_ranked}
+            fused = {k: self.vector_weight * vec_scores.get(k, 0.0) + self.keyword_weight * kw_scores.get(k, 0.0)
+                     for k in set(vec_scores) | set(kw_scores)}
+            threshold = self.min_similarity
+        else:
+            # Reciprocal Rank Fusion: só a posição em cada ranking importa, não a escala dos scores
+            fused = {}
+            for weight, ranked in ((self.vector_weight, vec_ranked), (self.keyword_weight, kw_ranked)):
+                for rank, (_, k) in enumerate(ranked, start=1):
+                    fused[k] = fused.get(k, 0.0) + weight / (self.rrf_k + rank)
+            threshold = 0.0
+
+        results = [(score, by_key[k]) for k, score in fused.items() if score > threshold]
         results.sort(key=lambda x: x[0], reverse=True)
-        return [r for r in results[:top_k] if r[0] > 0.15] # 0.15 é um threshold de similaridade bom
+        return results[:top_k]
+
+    def recent_chunks(self, limit: int = 20):
+        """Chunks mais novos do MEMORY.md (o FILE_APPEND grava no fim), do mais recente ao mais antigo."""
+        self._sync()
+        entry = self.chunks.files.get(os.path.abspath(os.path.join(self.workspace_dir, "MEMORY.md")))
+        if not entry: return []
+        return [c["text"] for c in reversed(entry.get("chunks", []))][:limit]
+
+    async def recall(self, query: str, top_k: int = None, token_budget: int = None):
+        """
+        Recall pré-turno: os chunks mais relevantes para a mensagem do usuário, cortados no
+        orçamento de tokens. Sem resultado (ex: "oi"), cai para as memórias mais recentes.
+        """
+        top_k = top_k or self.recall_top_k
+        budget = (token_budget or self.recall_token_budget) * 4
+        texts = []
+        if query and query.strip():
+            texts = [c["text"] for _, c in await self.search(query, top_k=top_k)]
+        if not texts:
+            texts = self.recent_chunks(limit=top_k)
+
+        selected, used = [], 0
+        for text in texts:
+            if used + len(text) > budget:
+                if not selected:
+                    selected.append(text[:budget])
+                continue
+            selected.append(text)
+            used += len(text)
+        return selected
+
+
+# ── Registro de motores (um por agente, vivo durante todo o processo) ─────────
+_engines: dict = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(base_dir: str, workspace_dir: str, provider) -> HybridMemoryRAG:
+    """
+    Retorna o motor de memória do agente dono de base_dir, criando-o na primeira chamada.
+    Instâncias do MoltyClaw do mesmo agente (canais, sub-agentes re-spawnados) compartilham o motor;
+    o provedor de embeddings registrado é o da primeira instância.
+    """
+    key = os.path.abspath(base_dir)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = HybridMemoryRAG(base_dir, workspace_dir, provider)
+                _engines[key] = engine
+    return engine
@@ -26,6 +26,7 @@ except ImportError:
 
 from system_prompt import build_system_prompt
 from config_loader import get_config
+from sessions import SessionContext, SessionKey, current_session
 from skills import (
     load_skill_entries,
     build_skills_metadata_prompt,
@@ -34,6 +35,9 @@ from skills import (
 )
 from scheduler import SchedulerManager
 from heartbeat import HeartbeatManager
+from turn_scheduler import PriorityTurnScheduler, Priority, current_priority
+from cancellation import CancelToken, current_cancel
+from executors import run_blocking, ExecutorBusy
 
 try:
     from mistralai import Mistral
@@ -77,6 +81,56 @@ custom_theme = Theme({
 })
 console = Console(theme=custom_theme)
 
+# Resultados de um passo do loop do agente (MoltyClaw._agent_step) que não são a resposta final
+_NEXT_STEP = object()    # ferramenta executada: chama o modelo de novo com o resultado
+_EMPTY_STEP = object()   # modelo respondeu vazio: tenta de novo (até 3 vezes seguidas)
+
+
+class _ProviderHistory:
+    """
+    Conversão do histórico para o formato do provedor, feita de forma incremental entre os passos
+    de um turno (dentro do turno o histórico só cresce): cada passo converte só as mensagens novas.
+    """
+
+    def __init__(self):
+        self._mistral, self._mistral_n, self._last_role = [], 0, None
+        self._gemini, self._gemini_n = [], 0
+
+    def mistral(self, history):
+        if len(history) < self._mistral_n:
+            self._mistral, self._mistral_n, self._last_role = [], 0, None
+        # Sanitização rigorosa para Mistral (v1 e legado)
+        for msg in history[self._mistral_n:]:
+            role = msg["role"]
+            # Força conteúdo a ser string e não vazio
+            content = str(msg.get("content") or "").strip()
+            if not content:
+                content = "..." # Placeholder obrigatório
+            if role == "system":
+                self._mistral.append({"role": "system", "content": content})
+                continue
+            if role == self._last_role:
+                # Une mensagens seguidas do mesmo autor
+                if self._mistral:
+                    self._mistral[-1]["content"] += "\n" + content
+                continue
+            self._mistral.append({"role": role, "content": content})
+            self._last_role = role
+        self._mistral_n = len(history)
+        return self._mistral
+
+    def gemini(self, history):
+        if len(history) < self._gemini_n:
+            self._gemini, self._gemini_n = [], 0
+        # Formato Gemini (user/model); o system já está no system_instruction
+        for m in history[self._gemini_n:]:
+            if m["role"] == "system": continue
+            role = "user" if m["role"] == "user" else "model"
+            self._gemini.append({"role": role, "parts": [m["content"]]})
+        self._gemini_n = len(history)
+        return self._gemini
+
+
 class MoltyClaw:
     def __init__(self, name="MoltyClaw", agent_id=None, channel=None):
         self.name = name
@@ -174,9 +228,12 @@ class MoltyClaw:
         self.browser = None
         self.context = None
         self.page = None
-        # Callback para anunciar resultado de sub-agentes de volta ao canal (Telegram, Discord...)
-        # É preenchido pelo ask() quando vem do gateway (telegram_bot, discord_bot, etc.)
-        self._current_reply_callback = None
+        # Contexto de conversa padrão (CLI, heartbeat, scheduler). Turnos vindos do AgentHub usam
+        # um SessionContext próprio por SessionKey (ver ask(session=...) e a propriedade history)
+        self._default_session = SessionContext(owner=self, loaded=True)
+        self._active_turns = 0
+        self.last_turn_steps = []   # cronometragem do último turno (_agent_loop)
+        self._cancel_tokens = set()         # turnos em andamento (cancel_turn / supersede)
         # Inicializa MCPHub com lista de servidores permitidos (se for sub-agente)
         if MCPHub:
             if self.is_master:
@@ -289,11 +346,16 @@ class MoltyClaw:
                     base_url="https://openrouter.ai/api/v1",
                     api_key=self.api_key,
                 )
-        self.is_busy = False # Flag para o Heartbeat/Background tasks
+        # Motor de memória (RAG) do agente: vive o processo inteiro e é compartilhado entre sessões
+        import memory_rag
+        import embeddings
+        self.embeddings = embeddings.get_provider_for(self)
+        self.memory = memory_rag.get_engine(self.base_dir, self.workspace_dir, self.embeddings)
         self.pty_bridge_process = None
         self.pty_output = ""
         
-        # Inicializa o Motor de Agendamento Proativo
+        # Inicializa o Motor de Agendamento Proativo (jobs e heartbeat passam pelo escalonador de prioridade)
+        self.turn_scheduler = PriorityTurnScheduler()
         self.scheduler = SchedulerManager(self, base_dir=self.base_dir)
         self.heartbeat = HeartbeatManager(self)
 
@@ -521,10 +583,8 @@ class MoltyClaw:
                 env=env
             )
 
-            try:
-                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=float(timeout_seconds))
-            except asyncio.TimeoutError:
-                # Mata a árvore inteira de processos em caso de timeout (estilo OpenClaw kill-tree)
+            def _kill_tree():
+                # Mata a árvore inteira de processos (estilo OpenClaw kill-tree)
                 if sys.platform == "win32":
                     subprocess.run(f"taskkill /F /T /PID {process.pid}", shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
                 else:
@@ -532,7 +592,16 @@ class MoltyClaw:
                         process.kill()
                     except Exception:
                         pass
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=float(timeout_seconds))
+            except asyncio.TimeoutError:
+                _kill_tree()
                 return f"[Timeout] O comando excedeu o limite de tempo de {timeout_seconds}s e foi encerrado."
+            except asyncio.CancelledError:
+                # Turno cancelado (/stop, supersede): o comando não continua rodando órfão
+                _kill_tree()
+                raise
 
             out_text = stdout.decode("utf-8", errors="replace").strip()
             err_text = stderr.decode("utf-8", errors="replace").strip()
@@ -703,21 +772,13 @@ class MoltyClaw:
             return f"Erro durante a execução da ferramenta '{action}': {e}"
             
     async def get_embedding(self, text: str):
-        try:
-            if self.provider == "gemini":
-                # Uso sincrono/nativo do SDK do Google
-                resp = self.gemini_client.generate_content("Resuma em uma única palavra-chave: " + text[:500]) # Fallback improvisado se nao houver genai.embed
-                # Na verdade, tentaremos usar o requests nativo caso o SDK nao tenha o embed no objeto ativo Client.
-                # Mas para evitar dependencias e erros com chaves bloqueadas, retornamos None e deixamos o BM25 Fallback do RAG agir forte!
-                return None
-            elif self.provider == "mistral":
-                ret = self.mistral_client.embeddings(model="mistral-embed", inputs=[text[:2000]])
-                if hasattr(ret, "data") and len(ret.data) > 0:
-                    return ret.data[0].embedding
-        except Exception:
-            pass
-        return None
-                
+        """Embedding de um texto pelo provedor assíncrono do agente (None em caso de falha)."""
+        return await self.embeddings.embed_one(text)
+
+    async def get_embeddings(self, texts: list):
+        """Embeddings em lote (um único request por lote). Retorna uma lista alinhada com texts."""
+        return await self.embeddings.embed(texts)
+
     async def run_workspace_action(self, action: str, param: str) -> str:
         import datetime
         import glob
@@ -743,6 +804,7 @@ class MoltyClaw:
                 mode = "w" if action == "FILE_WRITE" else "a"
                 with open(path, mode, encoding="utf-8") as f:
                     f.write(content + ("\n" if mode == "a" else ""))
+                self.memory.indexer.notify(path)
                 return f"✅ Arquivo {filepath} {'criado/sobrescrito' if mode == 'w' else 'atualizado (append)'} com sucesso!"
                 
             elif action == "FILE_READ":
@@ -759,9 +821,7 @@ class MoltyClaw:
 
             elif action == "MEMORY_SEARCH":
                 query = param.lower().strip()
-                import memory_rag
-                rag = memory_rag.HybridMemoryRAG(self.base_dir, self.workspace_dir, self.get_embedding)
-                search_res = await rag.search(query, top_k=5)
+                search_res = await self.memory.search(query, top_k=5)
                 
                 if search_res:
                     res_texts = []
@@ -803,7 +863,7 @@ class MoltyClaw:
         if not user or not password:
             return "ERRO: Ferramenta do Gmail tentou ser usada, mas GMAIL_USER ou GMAIL_APP_PASSWORD não estão configurados no seu .env."
         
-        try:
+        def _run_sync():
             if action == "READ_EMAILS":
                 from imap_tools import MailBox, A
                 limit = int(param) if param and param.isdigit() else 5
@@ -844,7 +904,11 @@ class MoltyClaw:
                 with MailBox('imap.gmail.com').login(user, password) as mailbox:
                     mailbox.delete(uid)
                 return f"E-mail referenciado pelo ID {uid} deletado com sucesso e jogado na Lixeira!"
-                
+            return f"Ação Gmail desconhecida: {action}"
+
+        try:
+            # imap/smtp são síncronos: rodam no pool 'email' para não travar o event loop
+            return await run_blocking("email", _run_sync)
         except Exception as e:
             return f"Exceção Módulo Gmail ({action}): {e}"
 
@@ -907,8 +971,8 @@ class MoltyClaw:
             
         try:
             import asyncio
-            # Roda as requisições bloqueantes (sync) do Spotipy em outra thread com Timeout fixo de 20s
-            return await asyncio.wait_for(asyncio.to_thread(_run_spotify_sync), timeout=20.0)
+            # Roda as requisições bloqueantes (sync) do Spotipy no pool 'media' com Timeout fixo de 20s
+            return await asyncio.wait_for(run_blocking("media", _run_spotify_sync), timeout=20.0)
         except asyncio.TimeoutError:
             return "ERRO_TIMEOUT: A API do Spotify demorou muito para responder (mais de 20 segundos) e a requisição foi cancelada automaticamente!"
         except Exception as e:
@@ -1174,7 +1238,10 @@ class MoltyClaw:
 
             return f"Ação GitHub desconhecida: {action}"
 
-        return await asyncio.get_event_loop().run_in_executor(None, _run_sync)
+        try:
+            return await run_blocking("github", _run_sync)
+        except ExecutorBusy as e:
+            return f"Erro GitHub: {e}"
 
     async def execute_social_send(self, action: str, param: str) -> str:
         if action == "X_POST":
@@ -1195,7 +1262,7 @@ class MoltyClaw:
                 if not os.getenv("TWITTER_API_KEY"):
                     return "Erro: Token de Twitter ausente."
                 
-                client.create_tweet(text=text)
+                await run_blocking("social", client.create_tweet, text=text)
                 return "Tweet disparado ativamente com sucesso na timeline do X!"
             except Exception as ex:
                 return f"Erro na API do Twitter (X) v2: {ex}"
@@ -1209,18 +1276,18 @@ class MoltyClaw:
                     return "Erro: Credenciais do Bluesky ausentes no .env."
                 
                 client = Client()
-                # O login do atproto é síncrono, então rodamos em thread para não travar o bot
-                await asyncio.to_thread(client.login, handle, password)
+                # O login do atproto é síncrono, então rodamos no pool 'social' para não travar o bot
+                await run_blocking("social", client.login, handle, password)
                 
                 if action == "BLUESKY_POST":
                     text = param.strip()
                     if len(text) > 300: text = text[:297] + "..."
-                    await asyncio.to_thread(client.send_post, text=text)
+                    await run_blocking("social", client.send_post, text=text)
                     return "Skeet postado com sucesso no Bluesky!"
                 
                 elif action == "BLUESKY_GET_PROFILE":
                     target = param.strip() or handle
-                    profile = await asyncio.to_thread(client.get_profile, actor=target)
+                    profile = await run_blocking("social", client.get_profile, actor=target)
                     return (
                         f"Perfil de {profile.handle}:\n"
                         f"- Nome: {profile.display_name or 'N/A'}\n"
@@ -1362,12 +1429,20 @@ class MoltyClaw:
         except Exception as e:
             return f"Exceção Módulo YouTube ({action}): {e}"
 
-    async def update_system_prompt_with_memory(self):
-        """Recarrega SOUL.md e MEMORY.md do workspace do agente atual e atualiza o prompt."""
+    async def update_system_prompt_with_memory(self, query: str = None):
+        """
+        Recarrega SOUL.md e injeta no prompt só as memórias relevantes para a mensagem atual
+        (recall via RAG, dentro do orçamento de tokens), em vez do começo do MEMORY.md.
+        """
         ws = self.workspace_dir
         memory_data = ""
         soul_data = ""
-        
+
+        # O recall roda em paralelo com a leitura do SOUL.md (e com o resto da montagem do prompt no ask)
+        if query:
+            query = re.sub(r'\[(?:SISTEMA|INFO DO REMETENTE):.*?\]', '', query, flags=re.DOTALL)
+        recall_task = asyncio.ensure_future(self.memory.recall(query))
+
         soul_path = os.path.join(ws, "SOUL.md")
         if os.path.exists(soul_path):
             with open(soul_path, "r", encoding="utf-8") as fs:
@@ -1375,16 +1450,16 @@ class MoltyClaw:
                 if s_content.strip():
                     soul_data = "\n--- SOUL.md (ESTA É A SUA ALMA - QUEM VOCÊ É) ---\n" + s_content + "\n[IMPORTANTE: Esses são os traços da sua personalidade e evolução.]\n"
 
-        memory_path = os.path.join(ws, "MEMORY.md")
-        if os.path.exists(memory_path):
-            with open(memory_path, "r", encoding="utf-8") as f:
-                content = f.read()[:2000]
-                if content.strip():
-                    memory_data = "\n--- MEMÓRIA DE LONGO PRAZO ---\n" + content + "\n[IMPORTANTE: Use os fatos acima de forma implícita e natural. NÃO comente que você está lendo da memória de longo prazo, apenas saiba as informações.]\n"
-                
+        try:
+            recalled = await recall_task
+        except Exception as e:
+            console.print(f"[dim red]Falha no recall de memória: {e}[/dim red]")
+            recalled = []
+        if recalled:
+            memory_data = "\n--- MEMÓRIA DE LONGO PRAZO ---\n" + "\n\n".join(recalled) + "\n[IMPORTANTE: Use os fatos acima de forma implícita e natural. NÃO comente que você está lendo da memória de longo prazo, apenas saiba as informações.]\n"
+
         # Mantém a original e apenda a memória carregada no início do boot
         import datetime
-        import re
         current_content = self.history[0]["content"]
         
         # Atualiza data dinâmica se o marcador existir
@@ -1406,29 +1481,40 @@ class MoltyClaw:
         if char_count > 15000:  # Limite de segurança arbitrário para flush
             console.print(f"[dim yellow][SISTEMA] Iniciando flush de memória silencioso (Compaction)... ({char_count:,} caracteres nas mensagens)[/dim yellow]")
             
-            # Remove temporariamente o prompt atual do usuário para protegê-lo da compactação
-            last_user_msg = self.history.pop()
-            hist_len_before = len(self.history)
+            session = self.session
+            session.compacting = True
+            try:
+                # Remove temporariamente o prompt atual do usuário para protegê-lo da compactação
+                last_user_msg = self.history.pop()
+                hist_len_before = len(self.history)
             
-            compaction_prompt = "A sessão está no limite de contexto. Você DEVE armazenar TODO O CONHECIMENTO CRUCIAL recém-aprendido nesta sessão usando FILE_APPEND em MEMORY.md ou criando anotações com FILE_WRITE. Se não houver nada importante a guardar, responda única e puramente com o texto: NO_REPLY."
+                compaction_prompt = "A sessão está no limite de contexto. Você DEVE armazenar TODO O CONHECIMENTO CRUCIAL recém-aprendido nesta sessão usando FILE_APPEND em MEMORY.md ou criando anotações com FILE_WRITE. Se não houver nada importante a guardar, responda única e puramente com o texto: NO_REPLY."
             
-            self.history.append({"role": "user", "content": compaction_prompt})
-            await self.ask(None, is_tool_response=True, silent=True)
+                self.history.append({"role": "user", "content": compaction_prompt})
+                try:
+                    await self.ask(None, is_tool_response=True, silent=True)
+                except BaseException:
+                    # Turno cancelado no meio do flush: devolve o prompt do usuário para o rollback achá-lo
+                    self.history = self.history[:hist_len_before] + [last_user_msg]
+                    raise
             
-            # Reverte o histórico e destrói todos os delírios e respostas de background geradas na compactação
-            self.history = self.history[:hist_len_before]
+                # Reverte o histórico e destrói todos os delírios e respostas de background geradas na compactação
+                self.history = self.history[:hist_len_before]
             
-            new_history = [self.history[0]]
-            recent_msgs = self.history[1:][-4:]
-            for msg in recent_msgs:
-                # Trunca respostas gigantes do sistema das interações velhas para salvar peso
-                if msg.get("content") and "[SISTEMA:" in msg["content"] and len(msg["content"]) > 1000:
-                    msg["content"] = msg["content"][:1000] + "\n... [RESULTADO TRUNCADO PELO SISTEMA PARA POUPAR RAM]"
-                new_history.append(msg)
+                new_history = [self.history[0]]
+                recent_msgs = self.history[1:][-4:]
+                for msg in recent_msgs:
+                    # Trunca respostas gigantes do sistema das interações velhas para salvar peso
+                    if msg.get("content") and "[SISTEMA:" in msg["content"] and len(msg["content"]) > 1000:
+                        msg["content"] = msg["content"][:1000] + "\n... [RESULTADO TRUNCADO PELO SISTEMA PARA POUPAR RAM]"
+                    new_history.append(msg)
                 
-            self.history = new_history
-            self.history.append(last_user_msg)
-            
+                self.history = new_history
+                self.history.append(last_user_msg)
+                session.compactions += 1
+            finally:
+                session.compacting = False
+
             new_char_count = sum(len(msg.get("content", "")) for msg in self.history[1:] if msg.get("content"))
             console.print(f"[dim green][SISTEMA] Contexto compactado! {char_count:,} → {new_char_count:,} caracteres (mantidas últimas 4 mensagens)[/dim green]")
 
@@ -1462,10 +1548,159 @@ class MoltyClaw:
             console.print(f"[error]Exceção ao transcrever áudio: {e}[/error]")
             return ""
 
-    async def ask(self, prompt: str = None, is_tool_response: bool = False, silent: bool = False, stream_callback=None, tool_callback=None, reply_callback=None, requester: dict = None, _empty_retry: int = 0):
-        # Limite de retries por resposta vazia
-        if _empty_retry >= 3:
-            return "..."
+    # ── Contexto de sessão ────────────────────────────────────────────────────
+
+    @property
+    def session(self) -> SessionContext:
+        """SessionContext do turno corrente (ou o contexto padrão do agente)."""
+        ctx = current_session.get()
+        if ctx is not None and ctx.owner is self:
+            return ctx
+        return self._default_session
+
+    @property
+    def history(self):
+        return self.session.history
+
+    @history.setter
+    def history(self, value):
+        self.session.history = value
+
+    @property
+    def _current_reply_callback(self):
+        # Callback para anunciar resultado de sub-agentes de volta ao canal (Telegram, Discord...)
+        return self.session.reply_callback
+
+    @_current_reply_callback.setter
+    def _current_reply_callback(self, value):
+        self.session.reply_callback = value
+
+    @property
+    def is_busy(self) -> bool:
+        """Flag para o Heartbeat/Background tasks: há algum turno em andamento."""
+        return self._active_turns > 0
+
+    def new_session(self, session_key: str = None) -> SessionContext:
+        """Contexto novo para uma SessionKey: começa só com o system prompt do agente."""
+        return SessionContext(session_key=session_key, history=[dict(self._default_session.history[0])], owner=self)
+
+    async def _run_in_session(self, session: SessionContext, prompt, silent, stream_callback, tool_callback, reply_callback, requester):
+        """Executa um turno dentro de `session`: carrega o histórico salvo, roda e persiste uma vez no fim."""
+        session.owner = self
+        session.requester = requester or session.requester
+        session.stream_callback = stream_callback
+        session.tool_callback = tool_callback
+        if reply_callback is not None:
+            session.reply_callback = reply_callback
+        session.last_active = time.time()
+
+        from agent_hub import get_session_store
+        s_store = get_session_store() if session.session_key else None
+        if s_store is not None and not session.loaded:
+            try:
+                # Cache miss lê do disco: fora do event loop para não travar os outros canais
+                s_hist = await asyncio.to_thread(s_store.load_history, SessionKey.parse(session.session_key))
+                # Só as últimas 20 vão para o contexto do modelo; as antigas continuam na transcrição salva
+                session.stored_prefix = list(s_hist[:-20])
+                session.history.extend(s_hist[-20:])
+            except Exception:
+                pass
+            session.loaded = True
+
+        token = current_session.set(session)
+        try:
+            return await self.ask(prompt, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback,
+                                  reply_callback=reply_callback, requester=requester)
+        finally:
+            current_session.reset(token)
+            if s_store is not None:
+                # Write-behind: só marca a sessão como suja; a SessionWriter grava em background
+                peer_name = (session.requester or {}).get("name")
+                s_store.save_history(SessionKey.parse(session.session_key),
+                                     session.stored_prefix + session.history[1:], peer_name=peer_name)
+
+    def _turn_token(self):
+        """CancelToken do turno corrente deste agente/sessão (tasks filhas herdam o de outro turno)."""
+        token = current_cancel.get()
+        if token in self._cancel_tokens and token.session_key == self.session.session_key:
+            return token
+        return None
+
+    def cancel_turn(self, session_key: str = None, reason: str = "stop") -> int:
+        """Cancela os turnos em andamento de uma sessão (None = contexto padrão). Retorna quantos."""
+        return sum(1 for t in list(self._cancel_tokens) if t.session_key == session_key and t.cancel(reason))
+
+    @staticmethod
+    def _turn_start(ctx: SessionContext, mark: int) -> int:
+        """
+        Posição no histórico onde o turno corrente começou. A compactação troca a lista no meio
+        do turno, então a referência é a própria mensagem do usuário (por identidade); `mark`
+        (tamanho do histórico no início) só vale se ela ainda não entrou.
+        """
+        anchor = ctx.turn_message
+        if anchor is not None:
+            for i in range(len(ctx.history) - 1, -1, -1):
+                if ctx.history[i] is anchor:
+                    return i
+        return min(mark, len(ctx.history))
+
+    async def _run_cancellable(self, prompt, silent, stream_callback, tool_callback, reply_callback, requester):
+        """
+        Roda o turno numa task filha ligada a um CancelToken. Se o turno for cancelado, a parte
+        parcial (respostas e resultados de ferramentas) sai do histórico: fica só a mensagem do
+        usuário e uma nota de interrupção, para o próximo turno saber o que aconteceu.
+        """
+        ctx = self.session
+        token = CancelToken(ctx.session_key)
+        mark = len(ctx.history)
+        ctx.turn_message = None
+        reset = current_cancel.set(token)
+        try:
+            inner = asyncio.ensure_future(self.ask(prompt, silent=silent, stream_callback=stream_callback,
+                                                   tool_callback=tool_callback, reply_callback=reply_callback,
+                                                   requester=requester))
+        finally:
+            current_cancel.reset(reset)
+        self._cancel_tokens.add(token)
+        token.bind(inner)
+        try:
+            return await inner
+        except asyncio.CancelledError:
+            start = self._turn_start(ctx, mark)
+            if not token.cancelled:
+                # Cancelado de fora (preempção, timeout do canal): desfaz o turno inteiro
+                del ctx.history[start:]
+                raise
+            keep = start + 1 if prompt else start
+            del ctx.history[keep:]
+            if prompt:
+                note = ("[Turno interrompido pelo usuário (/stop) antes da resposta]" if token.reason == "stop"
+                        else "[Turno substituído por uma mensagem mais nova antes da resposta]")
+                ctx.history.append({"role": "assistant", "content": note})
+            console.print(f"[dim yellow]⏹️ [{self.name}] Turno cancelado ({token.reason})"
+                          f"{' em ' + ctx.session_key if ctx.session_key else ''}[/dim yellow]")
+            return ""
+        finally:
+            self._cancel_tokens.discard(token)
+
+    async def ask(self, prompt: str = None, is_tool_response: bool = False, silent: bool = False, stream_callback=None, tool_callback=None, reply_callback=None, requester: dict = None, session: SessionContext = None):
+        # Turno de usuário fora do escalonador (CLI, bots diretos, WebUI): conta como interativo
+        # para segurar heartbeat/jobs enquanto ele roda
+        if not is_tool_response and current_priority.get() == Priority.INTERACTIVE and not self.turn_scheduler.is_marked():
+            async with self.turn_scheduler.interactive():
+                return await self.ask(prompt, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback,
+                                      reply_callback=reply_callback, requester=requester, session=session)
+
+        # Turno de uma sessão específica (AgentHub): roda com o histórico e callbacks dela
+        if session is not None and current_session.get() is not session:
+            return await self._run_in_session(session, prompt, silent, stream_callback, tool_callback, reply_callback, requester)
+
+        # Turno novo: roda numa task própria com CancelToken (/stop, supersede)
+        cancel_token = self._turn_token()
+        if not is_tool_response and cancel_token is None:
+            return await self._run_cancellable(prompt, silent, stream_callback, tool_callback, reply_callback, requester)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
 
         # Guarda reply_callback na instância (se for uma chamada nova, não recursiva de tool)
         if reply_callback is not None:
@@ -1474,6 +1709,9 @@ class MoltyClaw:
             msg = "[SISTEMA: Nenhuma IA (Mistral, Gemini, OpenRouter ou OpenCode Zen) configurada. Verifique suas chaves de API no arquivo .env ou no painel.]"
             console.print(f"[warning]{msg}[/warning]")
             return msg
+
+        # Indexador de memória em background (sobe no primeiro turno, no event loop do agente)
+        self.memory.indexer.ensure_started()
             
         if prompt:
             final_prompt = prompt
@@ -1483,57 +1721,91 @@ class MoltyClaw:
                 platform = requester.get("platform", "Desconhecida")
                 req_info = f"[INFO DO REMETENTE: Nome: {req_name} | ID: {req_id} | Plataforma: {platform}]"
                 final_prompt = f"{req_info}\n\n{prompt}"
-                
-                # Carrega histórico isolado da SessionKey se existir
-                if requester.get("session_key"):
-                    try:
-                        from sessions import SessionStore, SessionKey
-                        s_store = SessionStore()
-                        s_key = SessionKey.parse(requester["session_key"])
-                        s_hist = s_store.load_history(s_key)
-                        if s_hist and len(self.history) <= 1:
-                            self.history.extend(s_hist[-20:])
-                    except Exception:
-                        pass
             self.history.append({"role": "user", "content": final_prompt})
+            if not is_tool_response:
+                self.session.turn_message = self.history[-1]
             
         # Avalia sempre que o usuario manda uma mensagem real se precisa flushear contexto
         if not is_tool_response and not silent:
-            await self.update_system_prompt_with_memory()
-            await self.update_mcp_tools_in_prompt()
+            # Recall de memória e ferramentas MCP são independentes: monta os dois em paralelo
+            await asyncio.gather(
+                self.update_system_prompt_with_memory(prompt),
+                self.update_mcp_tools_in_prompt(),
+            )
             await self.check_compaction()
         
         if not is_tool_response and not silent:
             console.print(f"\n[moltyclaw]{self.name}:[/moltyclaw]", end=" ")
-        
-        self.is_busy = True
+
+        return await self._agent_loop(silent, stream_callback, tool_callback, is_tool_response)
+
+    async def _agent_loop(self, silent, stream_callback, tool_callback, is_tool_response=False):
+        """
+        Loop do agente num frame só: chama o modelo, executa a ferramenta pedida e repete até a
+        resposta final. Limites em moltyclaw.json ("agent_loop": {"max_steps": 25, "max_seconds": 600});
+        cada passo é cronometrado (modelo + ferramenta) em self.last_turn_steps.
+        """
+        cfg = get_config().get("agent_loop", {})
+        max_steps = int(cfg.get("max_steps", 25))
+        max_seconds = float(cfg.get("max_seconds", 600))
+        cancel_token = self._turn_token()
+        view = _ProviderHistory()
+        steps = []
+        empty_retries = 0
+        started = time.monotonic()
+
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            elapsed = time.monotonic() - started
+            if len(steps) >= max_steps or elapsed >= max_seconds:
+                limit = f"{max_steps} passos" if len(steps) >= max_steps else f"{int(max_seconds)}s"
+                result = (f"⚠️ Parei esta tarefa ao atingir o limite de {limit} do loop do agente. "
+                          "Peça para eu continuar se quiser que eu siga de onde parei.")
+                console.print(f"\n[warning]>> [{self.name}] Limite do loop atingido ({limit}).[/warning]")
+                self.history.append({"role": "assistant", "content": result})
+                break
+
+            step = {"step": len(steps) + 1, "action": None, "model_ms": 0, "ms": 0}
+            step_started = time.monotonic()
+            outcome = await self._agent_step(silent, stream_callback, tool_callback,
+                                             is_tool_response or bool(steps), step, view)
+            step["ms"] = round((time.monotonic() - step_started) * 1000)
+            steps.append(step)
+
+            if outcome is _NEXT_STEP:
+                empty_retries = 0
+                continue
+            if outcome is _EMPTY_STEP:
+                # Retry silencioso em caso de resposta vazia (até 3 tentativas)
+                empty_retries += 1
+                if empty_retries >= 3:
+                    result = "..."
+                    break
+                continue
+            result = outcome
+            break
+
+        # Ponto único de saída do turno: a SessionStore grava o histórico em _run_in_session
+        self.last_turn_steps = steps
+        if len(steps) > 1:
+            console.print(f"[dim]>> [{self.name}] {len(steps)} passos em {time.monotonic() - started:.1f}s: "
+                          + ", ".join(f"{s['action'] or 'resposta'} {s['ms']}ms" for s in steps) + "[/dim]")
+        return result
+
+    async def _agent_step(self, silent, stream_callback, tool_callback, is_tool_response, step, view):
+        """
+        Um passo do loop: uma chamada ao modelo e, se ele pedir, uma ferramenta. Retorna a resposta
+        final, _NEXT_STEP (ferramenta executada, resultado no histórico) ou _EMPTY_STEP.
+        """
+        cancel_token = self._turn_token()
+        step_started = time.monotonic()
+        self._active_turns += 1
         try:
             response_chunks = ""
             
             if self.provider == "mistral":
-                # Sanitização rigorosa para Mistral (v1 e legado)
-                sanitized_history = []
-                last_role = None
-                
-                for msg in self.history:
-                    role = msg["role"]
-                    # Força conteúdo a ser string e não vazio
-                    content = str(msg.get("content") or "").strip()
-                    if not content:
-                        content = "..." # Placeholder obrigatório
-                    
-                    if role == "system":
-                        sanitized_history.append({"role": "system", "content": content})
-                        continue
-                    
-                    if role == last_role:
-                        # Une mensagens seguidas do mesmo autor
-                        if sanitized_history:
-                            sanitized_history[-1]["content"] += "\n" + content
-                        continue
-                    
-                    sanitized_history.append({"role": role, "content": content})
-                    last_role = role
+                sanitized_history = view.mistral(self.history)
 
                 # Suporte para versão nova (Mistral.chat.stream) e antiga (MistralAsyncClient.chat_stream)
                 for _retry in range(4):
@@ -1571,12 +1843,8 @@ class MoltyClaw:
             elif self.provider == "gemini":
                 for _retry in range(4):
                     try:
-                        # Converte história para o formato Gemini (user/model)
-                        contents = []
-                        for m in self.history:
-                            if m["role"] == "system": continue # Já está no system_instruction
-                            role = "user" if m["role"] == "user" else "model"
-                            contents.append({"role": role, "parts": [m["content"]]})
+                        # Converte história para o formato Gemini (user/model), só o que é novo
+                        contents = view.gemini(self.history)
                         
                         # Gemini streaming é assíncrono
                         async_response = await self.gemini_client.generate_content_async(
@@ -1716,6 +1984,7 @@ class MoltyClaw:
                     if not text:
                         return _buffer_txt, _in_tool_mode, _in_think_mode, _response_chunks
                     _response_chunks += text
+                    narrative = []
                     for char in text:
                         _buffer_txt += char
                         
@@ -1731,11 +2000,8 @@ class MoltyClaw:
                                     _buffer_txt = ""
                                 continue
                             
-                            # Texto narrativo livre
-                            if not silent:
-                                print(_buffer_txt, end="", flush=True)
-                            if stream_callback:
-                                await stream_callback(_buffer_txt)
+                            # Texto narrativo livre (emitido uma vez por chunk, não por caractere)
+                            narrative.append(_buffer_txt)
                             _buffer_txt = ""
                             
                         elif _in_tool_mode:
@@ -1747,7 +2013,13 @@ class MoltyClaw:
                             if _buffer_txt.endswith("</think>"):
                                 _in_think_mode = False
                                 _buffer_txt = ""
-                                
+
+                    if narrative:
+                        out = "".join(narrative)
+                        if not silent:
+                            print(out, end="", flush=True)
+                        if stream_callback:
+                            await stream_callback(out)
                     return _buffer_txt, _in_tool_mode, _in_think_mode, _response_chunks
 
                 def extract_text(_chunk, _provider=None):
@@ -1782,11 +2054,15 @@ class MoltyClaw:
 
                 if hasattr(async_response, '__aiter__'):
                     async for chunk in async_response:
+                        if cancel_token is not None and cancel_token.cancelled:
+                            break
                         t = extract_text(chunk, self.provider)
                         if t:
                             buffer_txt, in_tool_mode, in_think_mode, response_chunks = await process_chunk_text(t, buffer_txt, in_tool_mode, in_think_mode, response_chunks)
                 else:
                     for chunk in async_response:
+                        if cancel_token is not None and cancel_token.cancelled:
+                            break
                         t = extract_text(chunk, self.provider)
                         if t:
                             buffer_txt, in_tool_mode, in_think_mode, response_chunks = await process_chunk_text(t, buffer_txt, in_tool_mode, in_think_mode, response_chunks)
@@ -1798,12 +2074,9 @@ class MoltyClaw:
             elif is_tool_response and not silent:
                 print()
             
-            # Retry silencioso em caso de resposta vazia (até 3 tentativas)
+            step["model_ms"] = round((time.monotonic() - step_started) * 1000)
             if not response_chunks.strip():
-                return await self.ask(None, is_tool_response=True, silent=silent,
-                                      stream_callback=stream_callback, tool_callback=tool_callback,
-                                      reply_callback=None, requester=None,
-                                      _empty_retry=(_empty_retry or 0) + 1)
+                return _EMPTY_STEP
                 
             if "NO_REPLY" in response_chunks:
                 self.history.append({"role": "assistant", "content": response_chunks}) 
@@ -1878,14 +2151,20 @@ class MoltyClaw:
                     cmd_data = json.loads(json_str.strip())
                     action = cmd_data.get("action")
                     param = cmd_data.get("param", "")
+                    step["action"] = action
                     
                     # ─── VERIFICAÇÃO DE PERMISSÕES ───────────────────────────────────
                     if not self._is_tool_allowed(action):
                         error_msg = f"❌ ACESSO NEGADO: O agente '{self.name}' não tem permissão para usar a ferramenta '{action}'."
                         console.print(f"[error]{error_msg}[/error]")
                         self.history.append({"role": "user", "content": f"[SISTEMA: Erro de Permissão] -> {error_msg}"})
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                     # ──────────────────────────────────────────────────────────────────
+
+                    # Consumidores de stream (turn_stream) recebem o início da ferramenta
+                    on_tool_start = getattr(tool_callback, "on_tool_start", None)
+                    if on_tool_start is not None:
+                        await on_tool_start(action, param)
                     
                     if action == "MCP_TOOL":
                         mcp_server = cmd_data.get("server")
@@ -1902,7 +2181,7 @@ class MoltyClaw:
                                 
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado MCP Tool {mcp_tool}] ->\n{result}"})
                         if tool_callback: await tool_callback(f"[MCP] {mcp_tool}")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
 
                     elif action == "CMD":
                         console.print(f"\n[info]⚙️ Executando TERMINAL:[/info] {param}")
@@ -1911,7 +2190,7 @@ class MoltyClaw:
                             result = await self.execute_terminal_command(param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado CMD] -> {result}"})
                         if tool_callback: await tool_callback(f"[CMD] {param}")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
 
                     elif action == "FS_LIST":
                         console.print(f"\n[info]📂 Listando Diretório (FS Nativo):[/info] {param or '~'}")
@@ -1938,7 +2217,7 @@ class MoltyClaw:
                                     result = f"[FS_LIST] Acesso negado: {target_path}"
                                     self.history.append({"role": "user", "content": f"[SISTEMA: Resultado FS_LIST] -> {result}"})
                                     if tool_callback: await tool_callback(f"[FS_LIST] {param}")
-                                    return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                                    return _NEXT_STEP
 
                                 dirs = sorted([(n, s) for k, n, s in entries if k == "DIR "], key=lambda x: x[0].lower())
                                 files = sorted([(n, s) for k, n, s in entries if k == "FILE"], key=lambda x: x[0].lower())
@@ -1957,7 +2236,7 @@ class MoltyClaw:
                             result = f"[FS_LIST] Erro inesperado: {str(e)}"
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado FS_LIST] -> {result}"})
                         if tool_callback: await tool_callback(f"[FS_LIST] {param}")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
 
                     elif action == "DDG_SEARCH":
                         console.print(f"\n[info]🦆 Executando Busca Nativa ({action}):[/info] {param}")
@@ -1966,7 +2245,7 @@ class MoltyClaw:
                             
                             try:
                                 from ddgs import DDGS
-                                results = DDGS().text(param, max_results=5)
+                                results = await run_blocking("search", lambda: DDGS().text(param, max_results=5))
                                 if not results:
                                     result = "Nenhum resultado encontrado."
                                 else:
@@ -1978,7 +2257,7 @@ class MoltyClaw:
                                 
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado DDG_SEARCH] -> {result}"})
                         if tool_callback: await tool_callback(f"[SEARCH] {param}")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action == "CANVAS_UPDATE":
                         try:
@@ -2013,7 +2292,7 @@ class MoltyClaw:
                             result = f"Erro na renderização do Canvas: {str(e)}"
                             
                         self.history.append({"role": "user", "content": f"[SISTEMA: CANVAS_UPDATE] -> {result}"})
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action == "SESSION_SPAWN":
                         console.print(f"\n[info]🤖 Delegando Tarefa ({action}):[/info] {param}")
@@ -2080,7 +2359,7 @@ class MoltyClaw:
                                             # ── Announce de volta ao canal original (OpenClaw-style) ──
                                             if _reply_cb:
                                                 announce = f"✅ *[{_label}]* concluiu a tarefa em {duration}s:\n\n{sub_reply}"
-                                                await _reply_cb(announce)
+                                                await self.turn_scheduler.run(Priority.ANNOUNCE, lambda: _reply_cb(announce))
                                                 
                                         except Exception as _e:
                                             _run.status = "error"
@@ -2098,13 +2377,13 @@ class MoltyClaw:
                             result = f"Erro ao executar SESSION_SPAWN: {e}"
                             
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action == "SESSION_LIST":
                         import subagent_registry as _sreg
                         result = _sreg.summary()
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado SESSION_LIST] ->\n{result}"})
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action == "SESSION_SEND":
                         try:
@@ -2124,7 +2403,7 @@ class MoltyClaw:
                         except Exception as e:
                             result = f"Erro ao executar SESSION_SEND: {e}"
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado SESSION_SEND] -> {result}"})
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action == "SESSION_HISTORY":
                         run_id = param.strip()
@@ -2140,14 +2419,14 @@ class MoltyClaw:
                         else:
                             result = f"Erro: Sessão {run_id} não encontrada ou a instância foi destruída."
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado SESSION_HISTORY] ->\n{result}"})
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action in ["OPEN_BROWSER", "GOTO", "CLICK", "TYPE", "READ_PAGE", "SCREENSHOT", "INSPECT_PAGE", "PRESS_ENTER", "PRESS_KEY", "SCROLL_DOWN"]:
                         if not silent: console.print(f"\n[info]🌐 Executando Browser ({action}):[/info] {param}")
                         result = await self.run_browser_action(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}] {param[:30]}")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action in ["READ_EMAILS", "SEND_EMAIL", "DELETE_EMAIL"]:
                         console.print(f"\n[info]📧 Módulo GMAIL ({action}):[/info] {param}")
@@ -2156,14 +2435,14 @@ class MoltyClaw:
                             result = await self.execute_gmail_action(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action.startswith("FILE_") or action.startswith("MEMORY_"):
                         if not silent: console.print(f"\n[info]📂 Workspace ({action}):[/info] {param[:30]}")
                         result = await self.run_workspace_action(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
 
                     elif action == "SKILL_USE":
                         console.print(f"\n[info]🧩 Ativando SKILL:[/info] {param}")
@@ -2179,7 +2458,7 @@ class MoltyClaw:
                         self.history.append({"role": "user", "content": f"[SISTEMA: Ativação de Skill] -> {result}"})
                         if tool_callback: await tool_callback(f"[SKILL] {param}")
                         # Chama ask recursivamente para o modelo processar as novas instruções
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action.startswith("SPOTIFY_"):
                         if not silent: console.print(f"\n[info]🎵 Módulo SPOTIFY ({action}):[/info] {param}")
@@ -2188,7 +2467,7 @@ class MoltyClaw:
                             result = await self.execute_spotify_action(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
 
                     elif action.startswith("GITHUB_"):
                         if not silent: console.print(f"\n[info]🐙 Módulo GITHUB ({action}):[/info] {param}")
@@ -2197,7 +2476,7 @@ class MoltyClaw:
                             result = await self.execute_github_action(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action in ["WHATSAPP_SEND", "DISCORD_SEND", "TELEGRAM_SEND", "X_POST", "BLUESKY_POST", "BLUESKY_GET_PROFILE"]:
                         if not silent: 
@@ -2212,7 +2491,7 @@ class MoltyClaw:
                             result = await self.execute_social_send(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
 
                     elif action in ["WHATSAPP_GET_CONTACTS", "WHATSAPP_GET_CHATS", "WHATSAPP_GET_MESSAGES"]:
                         if not silent:
@@ -2222,7 +2501,7 @@ class MoltyClaw:
                             result = await self.execute_whatsapp_read(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] ->\n{result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                         if not silent: console.print(f"\n[info]▶️ Módulo YOUTUBE ({action}):[/info] {param}")
                         with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
@@ -2230,7 +2509,7 @@ class MoltyClaw:
                             result = await self.execute_youtube_action(action, param)
                         self.history.append({"role": "user", "content": f"[SISTEMA: Resultado {action}] -> {result}"})
                         if tool_callback: await tool_callback(f"[{action}]")
-                        return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                        return _NEXT_STEP
                         
                     elif action == "VOICE_REPLY":
                         parts = param.split("|", 1)
@@ -2243,7 +2522,6 @@ class MoltyClaw:
                             else:
                                 console.print(f"\n[info]🎙️ Módulo TTS (Gerando Voz):[/info] {text[:30]}...")
                                 
-                        import time
                         from pathlib import Path
                         temp_dir = Path(os.path.join(MOLTY_DIR, "temp"))
                         temp_dir.mkdir(exist_ok=True)
@@ -2258,7 +2536,7 @@ class MoltyClaw:
                             err_str = str(e)
                             console.print(f"[bold red]Erro edge-tts nativo:[/bold red] {err_str}")
                             self.history.append({"role": "user", "content": f"[SISTEMA: ERRO TTS] Falha ao gerar o arquivo mp3. Erro: {err_str}"})
-                            return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                            return _NEXT_STEP
                         
                         if audio_path.exists():
                             if target and target.strip().upper() not in ["SEU_ZAP_ID_AQUI", "TELEGRAM", "DISCORD", "WHATSAPP", "AQUI", "AQUI MESMO"]:
@@ -2274,33 +2552,22 @@ class MoltyClaw:
                                     
                                 self.history.append({"role": "user", "content": f"[SISTEMA: Resultado envio de VOZ ativo para {target}] -> {result}"})
                                 if tool_callback: await tool_callback(f"[AUDIO_SENT_TO] {target}")
-                                return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                                return _NEXT_STEP
                             else:
                                 # Se ela não usou o parametro extra target ou errou colocando o placeholder, apenas retorne pra thread original e a ponte Node ou Discord vai subir.
                                 return f"[AUDIO_REPLY: {audio_path.absolute()}]"
                         else:
                             console.print(f"[bold red]Erro edge-tts nativo:[/bold red] Arquivo não foi criado fisicamente no disco.")
                             self.history.append({"role": "user", "content": f"[SISTEMA: ERRO TTS] Falha desconhecida. O arquivo mp3 não foi criado."})
-                            return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                            return _NEXT_STEP
                         
                 except Exception as e:
                     err_msg = f"Erro no Parse do JSON da Tool: {str(e)} no bloco: {tool_match.group(1)}"
                     console.print(f"\n[error]{err_msg}[/error]")
                     self.history.append({"role": "user", "content": f"[SISTEMA: ERRO] {err_msg}. Corrija o JSON!"})
-                    return await self.ask(None, is_tool_response=True, silent=silent, stream_callback=stream_callback, tool_callback=tool_callback)
+                    return _NEXT_STEP
                 
             stripped_response = re.sub(r'<think>.*?</think>', '', response_chunks, flags=re.DOTALL).strip()
-            
-            # Persiste o histórico atualizado na SessionStore se houver session_key
-            if requester and requester.get("session_key") and not is_tool_response:
-                try:
-                    from sessions import SessionStore, SessionKey
-                    s_store = SessionStore()
-                    s_key = SessionKey.parse(requester["session_key"])
-                    s_store.save_history(s_key, self.history[1:], peer_name=requester.get("name"))
-                except Exception:
-                    pass
-
             return stripped_response
             
         except Exception as e:
@@ -2315,7 +2582,7 @@ class MoltyClaw:
                     self._kodacloud_session = None
                 except:
                     pass
-            self.is_busy = False
+            self._active_turns -= 1
 
     def _get_available_agents(self):
         """Retorna uma lista resumida de todos os sub-agentes criados no .moltyclaw/agents"""
@@ -2377,9 +2644,11 @@ class MoltyClaw:
         return self._read_workspace_file("BOOTSTRAP.md")
         
     def _load_memory(self):
-        """Carrega o MEMORY.md do agente"""
+        """Seção de memória do prompt base. O conteúdo em si é injetado por turno via recall (RAG)."""
         content = self._read_workspace_file("MEMORY.md")
-        return content if content else "Nenhuma memória registrada ainda."
+        if not content:
+            return "Nenhuma memória registrada ainda."
+        return "As memórias relevantes para cada mensagem são injetadas automaticamente a cada turno. Use MEMORY_SEARCH para buscar outras."
 
     def _read_workspace_file(self, filename: str) -> str:
         """Lê um arquivo do workspace com fallback para a raiz do agente e migração automática."""
@@ -1,34 +1,239 @@
 """
-MoltyClaw — Queued Turn Manager (Per-Session Concurrency)
+MoltyClaw — Queued Turn Manager (Per-Session Concurrency + Admission Control)
 Inspirado no chat-queued-turns.ts do OpenClaw.
 
 Garante que:
 1. Mensagens da MESMA sessão (SessionKey) sejam processadas em fila sequencial (evita race conditions no histórico).
-2. Mensagens de SESSÕES DIFERENTES sejam processadas concorrentemente em paralelo sem travamentos.
+2. Mensagens de SESSÕES DIFERENTES sejam processadas concorrentemente, mas com limites:
+   - semáforo global de turnos simultâneos (streams de LLM, browser, subprocessos)
+   - cotas por canal e por peer (canal + id do remetente, somando todos os agentes)
+   - fila de espera limitada, com timeout
+   - política de overflow por canal: "queue" (espera até o timeout) ou "reject" (recusa na hora)
+
+Configuração em moltyclaw.json:
+    "turns": {"max_concurrent": 8, "per_channel": {"whatsapp": 4}, "per_peer": 2,
+              "max_queue": 100, "wait_timeout": 120, "overflow": "queue",
+              "overflow_by_channel": {"whatsapp": "reject"}, "busy_message": "..."}
 """
 
+import time
 import asyncio
-from typing import Dict, Any, Callable, Awaitable, TypeVar
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, TypeVar, Optional
 from rich.console import Console
+from config_loader import get_config
 
 console = Console()
 T = TypeVar("T")
 
+DEFAULT_BUSY_MESSAGE = "⏳ Estou atendendo muitas conversas ao mesmo tempo agora. Tente de novo em instantes."
+
+
+class TurnRejected(Exception):
+    """Turno recusado pelo controle de admissão (fila cheia, timeout ou política reject)."""
+
+    def __init__(self, reason: str, message: str = DEFAULT_BUSY_MESSAGE):
+        super().__init__(reason)
+        self.reason = reason
+        self.message = message
+
+
+class RefCountedTable:
+    """
+    Tabela chave -> primitiva de asyncio (Lock, Semaphore...) com contagem de referências.
+
+    Sem trava global: tudo roda no event loop, e ref()/unref() não têm await, então a busca
+    e a criação são atômicas. A entrada some quando o último turno que a referenciou sai,
+    e a tabela fica do tamanho das sessões ativas, não de todos os peers já vistos.
+    """
+
+    __slots__ = ("_factory", "_entries")
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._entries: Dict[str, list] = {}            # chave -> [primitiva, referências]
+
+    def ref(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [self._factory(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def unref(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._entries[key]
+
+    def refs(self, key: str) -> int:
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class QueuedTurnManager:
-    """Gerencia travas e filas assíncronas por SessionKey."""
+    """Gerencia travas por SessionKey e a admissão de turnos (limites globais, por canal e por peer)."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        cfg = config if config is not None else get_config().get("turns", {})
+        self.max_concurrent = int(cfg.get("max_concurrent", 8))
+        self.per_channel: Dict[str, int] = {k.lower(): int(v) for k, v in cfg.get("per_channel", {}).items()}
+        self.per_peer = int(cfg.get("per_peer", 2))
+        self.max_queue = int(cfg.get("max_queue", 100))
+        self.wait_timeout = float(cfg.get("wait_timeout", 120))
+        self.overflow = cfg.get("overflow", "queue")
+        self.overflow_by_channel: Dict[str, str] = {k.lower(): v for k, v in cfg.get("overflow_by_channel", {}).items()}
+        self.busy_message = cfg.get("busy_message", DEFAULT_BUSY_MESSAGE)
 
-    def __init__(self):
-        self._locks: Dict[str, asyncio.Lock] = {}
-        self._global_lock = asyncio.Lock()
+        self._session_locks = RefCountedTable(asyncio.Lock)
+        self._peer_sems = RefCountedTable(lambda: asyncio.Semaphore(self.per_peer))
+        self._global_sem = asyncio.Semaphore(self.max_concurrent) if self.max_concurrent > 0 else None
+        self._channel_sems: Dict[str, asyncio.Semaphore] = {}
 
-    async def _get_session_lock(self, session_key_str: str) -> asyncio.Lock:
-        async with self._global_lock:
-            if session_key_str not in self._locks:
-                self._locks[session_key_str] = asyncio.Lock()
-            return self._locks[session_key_str]
+        # Estatísticas (lidas pelo gateway / /status)
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._channel_stats: Dict[str, Dict[str, int]] = {}
+        self._waits = deque(maxlen=500)                # últimos tempos de espera (s)
+
+    # ── Cotas ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _split_key(session_key_str: str):
+        """
+        (canal, chave da cota de peer). A cota é da pessoa no canal (canal:peer), somada entre
+        os agentes com quem ela fala; o mesmo id em outro canal (Telegram 123 x Discord 123)
+        é outra pessoa. Não é a SessionKey: essa já tem a própria trava de um turno por vez.
+        """
+        parts = session_key_str.split(":", 2)
+        if len(parts) == 3:
+            channel, peer = parts[1].strip().lower(), parts[2].strip().lower()
+            return channel, f"{channel}:{peer}"
+        return "cli", f"cli:{session_key_str.strip().lower()}"
+
+    def _channel_sem(self, channel: str) -> Optional[asyncio.Semaphore]:
+        limit = self.per_channel.get(channel, self.per_channel.get("*", 0))
+        if limit <= 0:
+            return None
+        sem = self._channel_sems.get(channel)
+        if sem is None:
+            sem = self._channel_sems[channel] = asyncio.Semaphore(limit)
+        return sem
+
+    def _stats_for(self, channel: str) -> Dict[str, int]:
+        st = self._channel_stats.get(channel)
+        if st is None:
+            st = self._channel_stats[channel] = {"waiting": 0, "running": 0, "rejected": 0}
+        return st
+
+    # ── Turno ────────────────────────────────────────────────────────────────
+
+    def _reject(self, channel: str, reason: str):
+        self.rejected += 1
+        self._stats_for(channel)["rejected"] += 1
+        if reason == "timeout":
+            self.timed_out += 1
+        console.print(f"[dim yellow]Turno recusado no canal '{channel}' ({reason}) — "
+                      f"{self.running} rodando, {self.waiting} na fila[/dim yellow]")
+        raise TurnRejected(reason, self.busy_message)
 
     async def run_turn(self, session_key_str: str, func: Callable[[], Awaitable[T]]) -> T:
-        """Executa um turno de conversa garantindo isolamento de trava por SessionKey."""
-        lock = await self._get_session_lock(session_key_str)
-        async with lock:
+        """
+        Executa um turno de conversa garantindo isolamento de trava por SessionKey e respeitando
+        os limites de admissão. Levanta TurnRejected se o turno não puder ser admitido.
+        """
+        channel, peer = self._split_key(session_key_str)
+        policy = self.overflow_by_channel.get(channel, self.overflow)
+        ch_stats = self._stats_for(channel)
+        if self.waiting >= self.max_queue:
+            self._reject(channel, "queue_full")
+
+        # Ordem fixa de aquisição (sessão -> peer -> canal -> global) e liberação na ordem inversa
+        held = []
+        lock = self._session_locks.ref(session_key_str)
+        peer_sem = self._peer_sems.ref(peer) if self.per_peer > 0 else None
+        channel_sem = self._channel_sem(channel)
+
+        def _unref():
+            self._session_locks.unref(session_key_str)
+            if peer_sem is not None:
+                self._peer_sems.unref(peer)
+
+        sems = [s for s in (peer_sem, channel_sem, self._global_sem) if s is not None]
+
+        async def _acquire():
+            await lock.acquire()
+            held.append(lock)
+            if policy == "reject" and any(s.locked() for s in sems):
+                # Sem vaga agora: recusa em vez de enfileirar (a fila da própria sessão ainda vale)
+                raise TurnRejected("busy", self.busy_message)
+            for sem in sems:
+                await sem.acquire()
+                held.append(sem)
+
+        t0 = time.monotonic()
+        if self._session_locks.refs(session_key_str) == 1 and not any(s.locked() for s in sems):
+            # Caminho rápido: trava recém-criada e vaga em todas as cotas, nenhum acquire vai esperar
+            # (dispensa a task do wait_for e a contabilidade da fila)
+            await _acquire()
+        else:
+            self.waiting += 1
+            ch_stats["waiting"] += 1
+            try:
+                await asyncio.wait_for(_acquire(), timeout=self.wait_timeout if self.wait_timeout > 0 else None)
+            except (asyncio.TimeoutError, TurnRejected) as e:
+                for h in reversed(held):
+                    h.release()
+                _unref()
+                self._reject(channel, "timeout" if isinstance(e, asyncio.TimeoutError) else e.reason)
+            except BaseException:
+                for h in reversed(held):
+                    h.release()
+                _unref()
+                raise
+            finally:
+                self.waiting -= 1
+                ch_stats["waiting"] -= 1
+
+        self._waits.append(time.monotonic() - t0)
+        self.admitted += 1
+        self.running += 1
+        ch_stats["running"] += 1
+        try:
             return await func()
+        finally:
+            self.running -= 1
+            ch_stats["running"] -= 1
+            for h in reversed(held):
+                h.release()
+            _unref()
+
+    # ── Observabilidade ──────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "session_locks": len(self._session_locks),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_p50": pct(0.5),
+            "wait_ms_p95": pct(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "channels": {ch: dict(st) for ch, st in self._channel_stats.items()},
+        }
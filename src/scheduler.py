@@ -6,6 +6,7 @@ from datetime import datetime
 from uuid import uuid4
 
 from initializer import MOLTY_DIR
+from turn_scheduler import Priority
 
 class SchedulerManager:
     def __init__(self, agent, base_dir=None):
@@ -15,6 +16,7 @@ class SchedulerManager:
         self.jobs = self.load_jobs()
         self.is_running = False
         self._loop_task = None
+        self._pending = set()   # jobs na fila do escalonador ou rodando (não enfileira de novo)
 
     def load_jobs(self):
         if not os.path.exists(self.jobs_file):
@@ -71,21 +73,31 @@ class SchedulerManager:
                     interval = job.get("interval", 900)
                     
                     if now - last_run >= interval:
-                        # Verifica se o agente está ocupado
-                        if hasattr(self.agent, "is_busy") and self.agent.is_busy:
+                        if job["id"] in self._pending:
                             continue
-                            
+
                         print(f"[Scheduler] Executando Job: {job['name']}")
                         job["last_run"] = now
                         self.save_jobs()
-                        
-                        # Executa em background
-                        asyncio.create_task(self.agent.ask(job["payload"], silent=True))
+
+                        # Executa em background, atrás dos turnos interativos (escalonador de prioridade)
+                        self._pending.add(job["id"])
+                        asyncio.create_task(self._run_job(job))
                         
                 await asyncio.sleep(30) # Check a cada 30 segundos
             except Exception as e:
                 print(f"[Scheduler Error] {e}")
                 await asyncio.sleep(10)
 
+    async def _run_job(self, job):
+        try:
+            await self.agent.turn_scheduler.run(
+                Priority.SCHEDULED, lambda: self.agent.ask(job["payload"], silent=True)
+            )
+        except Exception as e:
+            print(f"[Scheduler Error] Job {job['name']}: {e}")
+        finally:
+            self._pending.discard(job["id"])
+
     def stop(self):
         self.is_running = False
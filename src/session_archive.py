@@ -0,0 +1,200 @@
+"""
+MoltyClaw — Armazenamento Frio de Sessões
+
+Sessões ociosas saem de ~/.moltyclaw/sessions/ e vão para segmentos comprimidos em
+sessions/archive/. Assim o diretório quente (e qualquer varredura dele) fica do tamanho do
+conjunto ativo, mesmo com dezenas de milhares de peers.
+
+- seg-000001.zst / .gz: cada sessão é um frame comprimido independente (acesso aleatório
+  por offset/tamanho, sem descomprimir o segmento inteiro)
+- index.jsonl: índice append-only {"k": chave, "s": segmento, "o": offset, "n": bytes, "meta": {...}}
+  e tombstones {"k": chave, "d": 1} quando a sessão é reidratada. É reescrito quando metade
+  das linhas já está morta; segmentos sem nenhuma sessão viva são apagados.
+
+zstd (pacote zstandard) é usado quando disponível; senão gzip da stdlib.
+"""
+
+import os
+import json
+import gzip
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class SessionArchive:
+    def __init__(self, archive_dir: str, codec: str = "auto", segment_max_bytes: int = 64 * 1024 * 1024):
+        self.archive_dir = archive_dir
+        os.makedirs(self.archive_dir, exist_ok=True)
+        if codec == "auto":
+            codec = "zstd" if zstandard is not None else "gzip"
+        if codec == "zstd" and zstandard is None:
+            codec = "gzip"
+        self.codec = codec
+        self.segment_max_bytes = segment_max_bytes
+        self.index_path = os.path.join(self.archive_dir, "index.jsonl")
+        self._entries: Dict[str, Dict[str, Any]] = {}   # chave -> {"s", "o", "n", "meta"}
+        self._live: Dict[int, int] = {}                  # segmento -> sessões vivas
+        self._dead_lines = 0
+        self._lock = threading.RLock()
+        segs = [int(f[4:10]) for f in os.listdir(self.archive_dir) if f.startswith("seg-")]
+        self._seg = max(segs, default=1)                 # segmento aberto para append
+        self._load()
+
+    # ── Índice ───────────────────────────────────────────────────────────────
+
+    def _load(self):
+        if not os.path.exists(self.index_path): return
+        with open(self.index_path, "rb") as f:
+            raw = f.read()
+        good = raw.rfind(b"\n") + 1
+        if good < len(raw):
+            # Linha cortada por um crash: descarta para o próximo append começar numa linha nova
+            with open(self.index_path, "r+b") as f:
+                f.truncate(good)
+        for line in raw[:good].splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            old = self._entries.pop(rec["k"], None)
+            if old is not None:
+                self._live[old["s"]] -= 1
+                self._dead_lines += 1
+            if rec.get("d"):
+                self._dead_lines += 1
+                continue
+            self._entries[rec["k"]] = {"s": rec["s"], "o": rec["o"], "n": rec["n"], "meta": rec.get("meta", {})}
+            self._live[rec["s"]] = self._live.get(rec["s"], 0) + 1
+
+    def _append_index(self, records: List[Dict[str, Any]]):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for k, e in self._entries.items():
+                f.write(json.dumps({"k": k, "s": e["s"], "o": e["o"], "n": e["n"], "meta": e["meta"]},
+                                   ensure_ascii=False) + "\n")
+        os.replace(tmp, self.index_path)
+        self._dead_lines = 0
+
+    # ── Segmentos ────────────────────────────────────────────────────────────
+
+    def _segment_path(self, seg: int) -> str:
+        ext = "zst" if self.codec == "zstd" else "gz"
+        return os.path.join(self.archive_dir, f"seg-{seg:06d}.{ext}")
+
+    def _segment_file(self, seg: int) -> str:
+        # O segmento pode ter sido escrito com outro codec (zstandard instalado/removido depois)
+        for ext in ("zst", "gz"):
+            path = os.path.join(self.archive_dir, f"seg-{seg:06d}.{ext}")
+            if os.path.exists(path):
+                return path
+        return self._segment_path(seg)
+
+    def _current_segment(self) -> int:
+        """Segmento aberto para append; rotaciona ao passar do limite (ou se ele é de outro codec)."""
+        path = self._segment_path(self._seg)
+        if self._segment_file(self._seg) != path or \
+                (os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes):
+            self._seg += 1
+        return self._seg
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=6).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(path: str, blob: bytes) -> bytes:
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("segmento zstd, mas o pacote zstandard não está instalado")
+            return zstandard.ZstdDecompressor().decompress(blob)
+        return gzip.decompress(blob)
+
+    # ── API ──────────────────────────────────────────────────────────────────
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put_many(self, sessions: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]):
+        """Arquiva várias sessões (chave, metadados, histórico) de uma vez: um append por segmento + um no índice."""
+        if not sessions: return
+        with self._lock:
+            seg = self._current_segment()
+            path = self._segment_path(seg)
+            records = []
+            with open(path, "ab") as f:
+                offset = f.tell()
+                for key, meta, history in sessions:
+                    blob = self._compress(json.dumps({"meta": meta, "history": history},
+                                                     ensure_ascii=False, default=str).encode("utf-8"))
+                    f.write(blob)
+                    records.append({"k": key, "s": seg, "o": offset, "n": len(blob), "meta": meta})
+                    offset += len(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            # O índice só aponta para o frame depois que ele está no disco
+            self._append_index(records)
+            for rec in records:
+                self._forget(rec["k"])
+                self._entries[rec["k"]] = {"s": seg, "o": rec["o"], "n": rec["n"], "meta": rec["meta"]}
+                self._live[seg] = self._live.get(seg, 0) + 1
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """(metadados, histórico) de uma sessão arquivada, ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path = self._segment_file(entry["s"])
+            with open(path, "rb") as f:
+                f.seek(entry["o"])
+                blob = f.read(entry["n"])
+        data = json.loads(self._decompress(path, blob))
+        return data.get("meta", {}), data.get("history", [])
+
+    def remove(self, key: str):
+        """Tombstone depois da reidratação; apaga segmentos que ficaram sem sessões vivas."""
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._append_index([{"k": key, "d": 1}])
+            self._forget(key)
+            self._dead_lines += 1
+            if self._dead_lines > max(1000, len(self._entries)):
+                self._rewrite_index()
+
+    def _forget(self, key: str):
+        old = self._entries.pop(key, None)
+        if old is None:
+            return
+        self._live[old["s"]] -= 1
+        if self._live[old["s"]] <= 0:
+            del self._live[old["s"]]
+            if old["s"] != self._seg:
+                try:
+                    os.remove(self._segment_file(old["s"]))
+                except OSError:
+                    pass
+
+    def list_metadata(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(e["meta"], archived=True) for e in self._entries.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._entries), "segments": len(self._live), "codec": self.codec}
@@ -4,14 +4,42 @@ Inspirado no sistema de sessões do OpenClaw.
 
 Chave de Sessão no formato: <agent_id>:<channel>:<peer_id>
 Exemplo: MoltyClaw:telegram:12984712
+
+Persistência por sessão em dois arquivos:
+- <sessão>.json  — snapshot compactado (metadados + histórico até a geração `journal_gen`)
+- <sessão>.jsonl — journal append-only: uma linha {"g": geração, "m": mensagem} por mensagem nova
+Cada turno só anexa as mensagens novas ao journal; a cada `sessions.snapshot_every` registros
+o snapshot é reescrito e o journal zerado. load_history = snapshot + cauda do journal.
+
+Backend alternativo (sessions.backend = "sqlite"): SqliteSessionStore, um único sessions.db em
+modo WAL com metadados indexados (canal, agente, updated_at) e paginação por keyset, para que
+listar milhares de sessões não precise abrir o histórico de nenhuma.
+Use open_session_store() para obter o backend configurado.
+
+Escrita write-behind: save_history só atualiza o cache e marca a sessão como suja; a thread
+SessionWriter grava em lote a cada sessions.flush_interval_ms, juntando várias atualizações da
+mesma sessão numa única escrita. Nada de I/O de disco no event loop; flush no encerramento (atexit).
+
+Armazenamento frio (backend JSON): sessões sem atividade há sessions.archive_ttl_hours vão para
+segmentos comprimidos em sessions/archive/ (ver session_archive.py) e voltam sozinhas para o
+diretório quente na próxima mensagem do peer.
 """
 
 import os
 import json
+import atexit
 import time
+import base64
+import hashlib
+import sqlite3
+import threading
+import contextvars
+from collections import OrderedDict
 from dataclasses import dataclass, field, asdict
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from rich.console import Console
+from config_loader import get_config
+from session_archive import SessionArchive
 
 console = Console()
 MOLTY_DIR = os.path.join(os.path.expanduser("~"), ".moltyclaw")
@@ -41,6 +69,33 @@ class SessionKey:
         return cls(agent_id="MoltyClaw", channel="cli", peer_id=raw or "default")
 
 
+@dataclass
+class SessionContext:
+    """
+    Estado de conversa de uma sessão dentro de um agente compartilhado: histórico próprio,
+    callbacks do canal, remetente e estado de compactação. O AgentHub mantém um por SessionKey
+    e o passa em MoltyClaw.ask(session=...), então sessões diferentes rodam em paralelo no mesmo
+    agente sem misturar históricos.
+    """
+    session_key: Optional[str] = None
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    requester: Optional[Dict[str, Any]] = None
+    stream_callback: Optional[Callable] = None
+    tool_callback: Optional[Callable] = None
+    reply_callback: Optional[Callable] = None
+    loaded: bool = False                # histórico da SessionStore já carregado
+    stored_prefix: List[Dict[str, Any]] = field(default_factory=list)  # mensagens salvas fora da janela do modelo
+    compacting: bool = False
+    compactions: int = 0
+    turn_message: Optional[Dict[str, Any]] = None  # mensagem do usuário do turno corrente (âncora do rollback)
+    owner: Any = None                   # agente dono deste contexto
+    last_active: float = field(default_factory=time.time)
+
+
+# Sessão do turno corrente. Tasks filhas herdam o valor, por isso o agente confere o `owner`.
+current_session: contextvars.ContextVar = contextvars.ContextVar("molty_session", default=None)
+
+
 @dataclass
 class SessionMetadata:
     session_key: str
@@ -52,71 +107,559 @@ class SessionMetadata:
     message_count: int = 0
 
 
-class SessionStore:
+def _estimate_size(history: List[Dict[str, Any]]) -> int:
+    """Tamanho aproximado de um histórico em memória (conteúdo + overhead fixo por mensagem)."""
+    return sum(len(str(m.get("content") or "")) + 64 if isinstance(m, dict) else 64 for m in history)
+
+
+class SessionCache:
+    """
+    LRU de históricos limitado por número de sessões e por bytes (estimados).
+    Entradas sujas (ainda não persistidas) nunca são despejadas: a evicção pula para a próxima
+    limpa e pede a gravação via `flush(session_key)`, que só agenda (sem I/O sob o lock do cache).
+    Depois de gravadas, elas saem normalmente numa próxima evicção.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, flush=None, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.flush = flush
+        self.on_evict = on_evict
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, k: str) -> bool:
+        return k in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, k: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._data.get(k)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(k)
+            self.hits += 1
+            return entry["history"]
+
+    def put(self, session_key: SessionKey, history: List[Dict[str, Any]], peer_name: Optional[str] = None, dirty: bool = False):
+        k = session_key.key_str
+        size = _estimate_size(history)
+        with self._lock:
+            old = self._data.pop(k, None)
+            if old is not None:
+                self.bytes -= old["size"]
+                peer_name = peer_name or old["peer_name"]
+            self._data[k] = {"key": session_key, "history": history, "peer_name": peer_name,
+                             "size": size, "dirty": dirty}
+            self.bytes += size
+            self._evict()
+
+    def peek(self, k: str) -> Optional[Dict[str, Any]]:
+        """Entrada sem contar hit/miss nem mexer na ordem do LRU."""
+        with self._lock:
+            entry = self._data.get(k)
+            return dict(entry) if entry is not None else None
+
+    def discard(self, k: str) -> bool:
+        """Remove uma entrada limpa (sessões sujas ficam: ainda precisam ser gravadas)."""
+        with self._lock:
+            entry = self._data.get(k)
+            if entry is None or entry["dirty"]:
+                return entry is None
+            del self._data[k]
+            self.bytes -= entry["size"]
+            return True
+
+    def mark_clean(self, k: str, history: List[Dict[str, Any]]):
+        """Marca como persistida, desde que ninguém tenha trocado o histórico nesse meio tempo."""
+        with self._lock:
+            entry = self._data.get(k)
+            if entry is not None and entry["history"] is history:
+                entry["dirty"] = False
+                # Pode estar acima do limite por causa de sessões sujas que a evicção pulou
+                self._evict()
+
+    def dirty_entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [e for e in self._data.values() if e["dirty"]]
+
+    def _evict(self):
+        # Do mais antigo para o mais novo; a entrada mais recente (a que acabou de entrar) fica
+        for k in list(self._data)[:-1]:
+            if len(self._data) <= self.max_entries and self.bytes <= self.max_bytes:
+                break
+            entry = self._data[k]
+            if entry["dirty"]:
+                if self.flush is not None:
+                    self.flush(entry["key"])
+                continue
+            del self._data[k]
+            self.bytes -= entry["size"]
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(k)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "dirty": sum(1 for e in self._data.values() if e["dirty"]),
+            }
+
+
+def _make_cache(store) -> SessionCache:
+    cfg = get_config().get("sessions", {})
+    return SessionCache(
+        max_entries=int(cfg.get("cache_max_entries", 256)),
+        max_bytes=int(cfg.get("cache_max_mb", 64)) * 1024 * 1024,
+        flush=store._request_flush,
+        on_evict=getattr(store, "_forget", None),
+    )
+
+
+class SessionWriter:
+    """
+    Thread de persistência write-behind. Recebe chaves de sessões sujas, espera a janela de
+    coalescência (interval) e grava a versão mais recente de cada uma, uma vez só.
+    """
+
+    def __init__(self, store, interval: float = 0.2):
+        self.store = store
+        self.interval = interval
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name="SessionWriter")
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, k: str, update: bool = True):
+        with self._cond:
+            if update and k in self._pending:
+                self.coalesced += 1
+            self._pending.add(k)
+            self._cond.notify()
+
+    def _run(self):
+        failed = False
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+                closed = self._closed
+            # Janela de coalescência (fora do lock: enqueue() não acorda a thread antes da hora)
+            if not closed:
+                time.sleep(max(self.interval, 1.0) if failed else self.interval)
+            with self._cond:
+                batch, self._pending = self._pending, set()
+            failed = False
+            for k in batch:
+                result = self.store._flush_key(k)
+                if result:
+                    self.writes += 1
+                elif result is False:
+                    # Mantém suja e tenta de novo no próximo ciclo (com pausa maior)
+                    self.errors += 1
+                    failed = True
+                    with self._cond:
+                        self._pending.add(k)
+            if failed and closed:
+                return
+
+    def close(self, timeout: float = 10.0):
+        """Para a thread depois de esvaziar a fila."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+
+class _CachedStore:
+    """
+    Parte comum aos backends: cache LRU compartilhado + persistência write-behind.
+    Subclasses implementam _persist(session_key, history, peer_name), que grava de fato.
+    """
+
+    def _init_cache(self, write_behind: bool = None):
+        cfg = get_config().get("sessions", {})
+        self._cache = _make_cache(self)
+        self._io_lock = threading.RLock()       # uma gravação por vez (writer, evicção, flush)
+        if write_behind is None:
+            write_behind = cfg.get("write_behind", True)
+        self._writer = None
+        if write_behind:
+            self._writer = SessionWriter(self, interval=float(cfg.get("flush_interval_ms", 200)) / 1000)
+            atexit.register(self.close)
+
+    def save_history(
+        self,
+        session_key: SessionKey,
+        history: List[Dict[str, Any]],
+        peer_name: Optional[str] = None
+    ):
+        """Atualiza o histórico no cache e agenda a gravação. Com write-behind, não toca o disco."""
+        self._cache.put(session_key, history, peer_name, dirty=True)
+        if self._writer is not None:
+            self._writer.enqueue(session_key.key_str)
+        else:
+            self._flush_key(session_key.key_str)
+
+    def _request_flush(self, session_key: SessionKey):
+        """Chamado pelo cache (sob o lock dele) quando uma sessão suja bloqueia a evicção: só agenda."""
+        if self._writer is not None:
+            self._writer.enqueue(session_key.key_str, update=False)
+
+    def _flush_entry(self, session_key: SessionKey, history: List[Dict[str, Any]], peer_name: Optional[str] = None):
+        with self._io_lock:
+            self._persist(session_key, history, peer_name)
+
+    def _flush_key(self, k: str) -> Optional[bool]:
+        """Grava a sessão se estiver suja. True = gravou, None = nada a fazer, False = falhou."""
+        entry = self._cache.peek(k)
+        if entry is None or not entry["dirty"]:
+            return None
+        try:
+            self._flush_entry(entry["key"], entry["history"], entry["peer_name"])
+        except Exception as e:
+            console.print(f"[dim red]Erro ao salvar sessão {k}: {e}[/dim red]")
+            return False
+        # Fora do _io_lock: a evicção pega o lock do cache antes do _io_lock
+        self._cache.mark_clean(k, entry["history"])
+        return True
+
+    def flush(self) -> bool:
+        """Grava agora todas as sessões sujas. Retorna False se alguma falhou."""
+        ok = True
+        for entry in self._cache.dirty_entries():
+            ok = self._flush_key(entry["key"].key_str) is not False and ok
+        return ok
+
+    def close(self):
+        """Esvazia a fila do writer e garante que nada sujo ficou para trás (chamado no atexit)."""
+        if self._writer is not None:
+            self._writer.close()
+        self.flush()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        if self._writer is not None:
+            stats.update(pending_writes=self._writer.pending, writes=self._writer.writes,
+                         coalesced=self._writer.coalesced, write_errors=self._writer.errors)
+        return stats
+
+
+class SessionStore(_CachedStore):
     """Gerencia a persistência e isolamento do histórico e metadados por SessionKey."""
 
-    def __init__(self, sessions_dir: str = SESSIONS_DIR):
+    def __init__(self, sessions_dir: str = SESSIONS_DIR, snapshot_every: int = None, write_behind: bool = None):
         self.sessions_dir = sessions_dir
         os.makedirs(self.sessions_dir, exist_ok=True)
-        self._cache: Dict[str, List[Dict[str, Any]]] = {}
+        cfg = get_config().get("sessions", {})
+        # Compacta o journal num snapshot novo a cada N registros (limita o tempo de replay)
+        self.snapshot_every = snapshot_every or int(cfg.get("snapshot_every", 50))
+        self.snapshot_max_bytes = int(cfg.get("snapshot_max_bytes", 256 * 1024))
+        # Estado do journal por sessão: geração do snapshot, mensagens persistidas,
+        # fingerprint da última mensagem persistida e tamanho atual do journal
+        self._journal: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._init_cache(write_behind)
+
+        # Armazenamento frio: sessões ociosas viram frames comprimidos em sessions/archive/
+        self.archive_ttl = float(cfg.get("archive_ttl_hours", 168)) * 3600
+        self.archive = SessionArchive(os.path.join(self.sessions_dir, "archive"), codec=cfg.get("archive_codec", "auto"))
+        # Só a store de longa duração (com writer) roda a varredura periódica
+        if self._writer is not None and self.archive_ttl > 0:
+            interval = float(cfg.get("archive_interval_s", 600))
+            threading.Thread(target=self._archive_loop, args=(interval,), daemon=True, name="SessionArchiver").start()
 
     def _get_file_path(self, session_key: SessionKey) -> str:
         # Substitui caracteres inválidos em nomes de arquivos de SO
         safe_filename = session_key.key_str.replace(":", "_").replace("/", "_").replace("\\", "_")
         return os.path.join(self.sessions_dir, f"{safe_filename}.json")
 
+    def _get_journal_path(self, session_key: SessionKey) -> str:
+        return self._get_file_path(session_key) + "l"
+
+    @staticmethod
+    def _fingerprint(message: Dict[str, Any]) -> str:
+        raw = json.dumps(message, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _read_journal(self, journal_path: str, gen: int):
+        """Mensagens da geração `gen` no journal. Corta uma última linha incompleta (crash no meio da escrita)."""
+        messages, records, size = [], 0, 0
+        if not os.path.exists(journal_path):
+            return messages, records, size
+        with open(journal_path, "rb") as f:
+            raw = f.read()
+        good = raw.rfind(b"\n") + 1
+        if good < len(raw):
+            with open(journal_path, "r+b") as f:
+                f.truncate(good)
+        for line in raw[:good].splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            records += 1
+            # Linhas de uma geração antiga sobram se o processo caiu entre o snapshot e o truncate
+            if rec.get("g") == gen:
+                messages.append(rec.get("m"))
+        return messages, records, good
+
     def load_history(self, session_key: SessionKey) -> List[Dict[str, Any]]:
-        """Carrega o histórico de mensagens para uma chave de sessão específica."""
+        """Carrega o histórico de mensagens (snapshot + cauda do journal) para uma chave de sessão."""
+        cached = self._cache.get(session_key.key_str)
+        if cached is not None:
+            return cached
+        history = self._load_state(session_key)
+        self._cache.put(session_key, history)
+        return history
+
+    def _load_state(self, session_key: SessionKey) -> List[Dict[str, Any]]:
+        """Lê snapshot + journal do disco e registra o estado do journal da sessão."""
+        k = session_key.key_str
+        with self._lock:
+            file_path = self._get_file_path(session_key)
+            history, gen = [], 0
+            if not os.path.exists(file_path) and k in self.archive:
+                return self._rehydrate(session_key)
+            try:
+                if os.path.exists(file_path):
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    history = data.get("history", [])
+                    gen = data.get("journal_gen", 0)
+                tail, records, size = self._read_journal(self._get_journal_path(session_key), gen)
+                history.extend(tail)
+            except Exception as e:
+                console.print(f"[dim red]Erro ao carregar histórico da sessão {k}: {e}[/dim red]")
+                history, records, size = [], 0, 0
+
+            self._journal[k] = {
+                "gen": gen,
+                "count": len(history),
+                "tail": self._fingerprint(history[-1]) if history else None,
+                "records": records,
+                "bytes": size,
+                "snapshot": os.path.exists(file_path),
+            }
+            return history
+
+    def _rehydrate(self, session_key: SessionKey) -> List[Dict[str, Any]]:
+        """Traz uma sessão do arquivo frio de volta para um snapshot quente."""
         k = session_key.key_str
-        if k in self._cache:
-            return self._cache[k]
+        with self._lock:
+            try:
+                meta, history = self.archive.get(k)
+            except Exception as e:
+                console.print(f"[dim red]Erro ao reidratar sessão {k}: {e}[/dim red]")
+                history, meta = [], {}
+            self._journal[k] = {"gen": 0, "count": 0, "tail": None, "records": 0, "bytes": 0, "snapshot": False}
+            if history or meta:
+                self._write_snapshot(session_key, history, meta.get("peer_name"), created_at=meta.get("created_at"))
+                self.archive.remove(k)
+            self._journal[k].update(count=len(history), tail=self._fingerprint(history[-1]) if history else None)
+            return history
 
-        file_path = self._get_file_path(session_key)
-        if not os.path.exists(file_path):
-            self._cache[k] = []
-            return []
+    def archive_idle(self, ttl_seconds: float = None, batch_size: int = 200) -> int:
+        """
+        Move para o arquivo frio as sessões sem escrita há mais de ttl_seconds.
+        A ociosidade vem do mtime do snapshot/journal (só os.stat, sem abrir os arquivos).
+        Retorna quantas sessões foram arquivadas.
+        """
+        cutoff = time.time() - (ttl_seconds if ttl_seconds is not None else self.archive_ttl)
+        idle = []
+        with os.scandir(self.sessions_dir) as it:
+            for e in it:
+                if not e.name.endswith(".json") or not e.is_file():
+                    continue
+                try:
+                    mtime = e.stat().st_mtime
+                    mtime = max(mtime, os.stat(e.path + "l").st_mtime)
+                except OSError:
+                    pass
+                if mtime < cutoff:
+                    idle.append(e.path)
 
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                history = data.get("history", [])
-                self._cache[k] = history
-                return history
-        except Exception as e:
-            console.print(f"[dim red]Erro ao carregar histórico da sessão {k}: {e}[/dim red]")
-            self._cache[k] = []
-            return []
+        archived = 0
+        for i in range(0, len(idle), batch_size):
+            # _io_lock: nenhuma gravação do writer acontece no meio do arquivamento do lote
+            with self._io_lock, self._lock:
+                batch, paths = [], []
+                for path in idle[i:i + batch_size]:
+                    meta = self._read_metadata(path)
+                    k = meta.get("session_key")
+                    if not k:
+                        continue
+                    entry = self._cache.peek(k)
+                    if entry is not None and entry["dirty"]:
+                        continue
+                    session_key = SessionKey.parse(k)
+                    history = self._load_state(session_key)
+                    meta["message_count"] = len(history)
+                    batch.append((k, meta, history))
+                    paths.append((k, path))
+                try:
+                    self.archive.put_many(batch)
+                except Exception as e:
+                    console.print(f"[dim red]Erro ao arquivar sessões: {e}[/dim red]")
+                    return archived
+                for k, path in paths:
+                    for p in (path, path + "l"):
+                        try:
+                            os.remove(p)
+                        except OSError:
+                            pass
+                    self._journal.pop(k, None)
+                    self._cache.discard(k)
+                archived += len(batch)
+        if archived:
+            console.print(f"[dim cyan]Sessões: {archived} sessões ociosas movidas para o arquivo frio[/dim cyan]")
+        return archived
 
-    def save_history(
-        self,
-        session_key: SessionKey,
-        history: List[Dict[str, Any]],
-        peer_name: Optional[str] = None
-    ):
-        """Salva o histórico de mensagens de uma sessão isolada em disco."""
+    def _archive_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.archive_idle()
+            except Exception as e:
+                console.print(f"[dim red]Erro na varredura de sessões ociosas: {e}[/dim red]")
+
+    def _persist(self, session_key: SessionKey, history: List[Dict[str, Any]], peer_name: Optional[str] = None):
+        """
+        Grava no disco. Se `history` só cresceu desde a última escrita, anexa as mensagens novas ao
+        journal; se foi reescrito (compactação, reset) ou o journal passou do limite, grava um
+        snapshot novo. Levanta exceção em caso de falha.
+        """
         k = session_key.key_str
-        self._cache[k] = history
+        with self._lock:
+            if k not in self._journal:
+                self._load_state(session_key)
+            state = self._journal[k]
+
+            n = state["count"]
+            appended = (
+                state["snapshot"]
+                and len(history) >= n
+                and (n == 0 or self._fingerprint(history[n - 1]) == state["tail"])
+            )
+            if not appended or state["records"] + len(history) - n >= self.snapshot_every \
+                    or state["bytes"] >= self.snapshot_max_bytes:
+                self._write_snapshot(session_key, history, peer_name)
+            elif len(history) > n:
+                self._append_journal(session_key, history[n:])
+            else:
+                return
+            state["count"] = len(history)
+            state["tail"] = self._fingerprint(history[-1]) if history else None
+
+    def _forget(self, k: str):
+        """
+        Chamado quando a sessão sai do cache: o estado do journal é recarregado sob demanda.
+        Roda sob o lock do cache, então não pega self._lock (ordem de locks: _lock -> cache).
+        Sessões sujas nunca são despejadas, então nenhuma gravação está usando esse estado.
+        """
+        self._journal.pop(k, None)
 
+    def _append_journal(self, session_key: SessionKey, messages: List[Dict[str, Any]]):
+        state = self._journal[session_key.key_str]
+        lines = "".join(json.dumps({"g": state["gen"], "m": m}, ensure_ascii=False, default=str) + "\n"
+                        for m in messages)
+        data = lines.encode("utf-8")
+        with open(self._get_journal_path(session_key), "ab") as f:
+            f.write(data)
+        state["records"] += len(messages)
+        state["bytes"] += len(data)
+
+    def _write_snapshot(self, session_key: SessionKey, history: List[Dict[str, Any]], peer_name: Optional[str] = None,
+                        created_at: float = None):
+        """Reescreve o snapshot (tmp + os.replace) numa geração nova e zera o journal."""
+        k = session_key.key_str
+        state = self._journal[k]
         file_path = self._get_file_path(session_key)
+        created_at = created_at or time.time()
+        if os.path.exists(file_path):
+            meta = self._read_metadata(file_path)
+            created_at = meta.get("created_at", created_at)
+            peer_name = peer_name or meta.get("peer_name")
+
         metadata = SessionMetadata(
             session_key=k,
+            created_at=created_at,
             updated_at=time.time(),
             peer_name=peer_name,
             channel=session_key.channel,
             agent_id=session_key.agent_id,
             message_count=len(history)
         )
-
         payload = {
             "metadata": asdict(metadata),
+            "journal_gen": state["gen"] + 1,
             "history": history
         }
 
+        tmp = file_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, default=str)
+        os.replace(tmp, file_path)
+        # Depois do replace, linhas antigas do journal já não valem (geração anterior)
+        with open(self._get_journal_path(session_key), "wb"):
+            pass
+        state.update(gen=state["gen"] + 1, records=0, bytes=0, snapshot=True)
+
+    @staticmethod
+    def _read_metadata(file_path: str) -> Dict[str, Any]:
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(payload, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            console.print(f"[dim red]Erro ao salvar sessão {k}: {e}[/dim red]")
+            with open(file_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("metadata", {})
+        except Exception:
+            return {}
+
+    def list_sessions_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        channel: Optional[str] = None,
+        agent_id: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de sessões (mais recentes primeiro). No backend JSON ainda lê todos os metadados."""
+        sessions = [m for m in self.list_sessions()
+                    if (not channel or m.get("channel", "").lower() == channel.lower())
+                    and (not agent_id or m.get("agent_id", "").lower() == agent_id.lower())]
+        sessions.sort(key=lambda m: (m.get("updated_at", 0), m.get("session_key", "")), reverse=True)
+        if cursor:
+            after = _decode_cursor(cursor)
+            sessions = [m for m in sessions if (m.get("updated_at", 0), m.get("session_key", "")) < after]
+        page = sessions[:limit]
+        next_cursor = None
+        if len(sessions) > limit:
+            next_cursor = _encode_cursor(page[-1]["updated_at"], page[-1]["session_key"])
+        return page, next_cursor
 
     def list_sessions(self) -> List[Dict[str, Any]]:
         """Lista todas as sessões ativas com metadados."""
@@ -127,11 +670,221 @@ class SessionStore:
         for filename in os.listdir(self.sessions_dir):
             if filename.endswith(".json"):
                 path = os.path.join(self.sessions_dir, filename)
+                meta = self._read_metadata(path)
+                if not meta:
+                    continue
+                # Mensagens anexadas ao journal depois do último snapshot
+                journal = path + "l"
                 try:
-                    with open(path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        meta = data.get("metadata", {})
-                        sessions.append(meta)
-                except Exception:
+                    st = os.stat(journal)
+                    if st.st_size:
+                        with open(journal, "rb") as f:
+                            meta["message_count"] = meta.get("message_count", 0) + f.read().count(b"\n")
+                        meta["updated_at"] = max(meta.get("updated_at", 0), st.st_mtime)
+                except OSError:
                     pass
+                sessions.append(meta)
+        # Sessões no arquivo frio: metadados vêm do índice, sem descomprimir nada
+        sessions.extend(self.archive.list_metadata())
         return sessions
+
+
+def _encode_cursor(updated_at: float, session_key: str) -> str:
+    raw = json.dumps([updated_at, session_key]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        updated_at, session_key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(updated_at), str(session_key)
+    except Exception:
+        raise ValueError("cursor inválido")
+
+
+class SqliteSessionStore(_CachedStore):
+    """
+    SessionStore sobre SQLite (WAL). Mesma API do backend JSON:
+    - sessions: uma linha de metadados por SessionKey (índices em channel, agent_id, updated_at)
+    - messages: uma linha por mensagem (session_key, seq), então um turno só insere as novas
+    Conexões são por thread (AgentHub, Gateway e threads de canais podem usar o mesmo store).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_key   TEXT PRIMARY KEY,
+            agent_id      TEXT NOT NULL COLLATE NOCASE,
+            channel       TEXT NOT NULL COLLATE NOCASE,
+            peer_id       TEXT NOT NULL,
+            peer_name     TEXT,
+            created_at    REAL NOT NULL,
+            updated_at    REAL NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            tail          TEXT
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            session_key TEXT NOT NULL,
+            seq         INTEGER NOT NULL,
+            body        TEXT NOT NULL,
+            PRIMARY KEY (session_key, seq)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at DESC, session_key DESC);
+        CREATE INDEX IF NOT EXISTS idx_sessions_channel ON sessions (channel, updated_at DESC, session_key DESC);
+        CREATE INDEX IF NOT EXISTS idx_sessions_agent ON sessions (agent_id, updated_at DESC, session_key DESC);
+    """
+
+    def __init__(self, sessions_dir: str = SESSIONS_DIR, db_path: str = None, write_behind: bool = None):
+        self.sessions_dir = sessions_dir
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        self.db_path = db_path or os.path.join(self.sessions_dir, "sessions.db")
+        self._local = threading.local()
+        self._init_cache(write_behind)
+        conn = self._conn()
+        with conn:
+            conn.executescript(self.SCHEMA)
+        self._migrate_json()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_json(self):
+        """Importa uma única vez as sessões do backend JSON (banco recém-criado e vazio)."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone():
+            return
+        legacy = [f for f in os.listdir(self.sessions_dir) if f.endswith(".json")]
+        if not legacy:
+            return
+        json_store = SessionStore(self.sessions_dir, write_behind=False)
+        for filename in legacy:
+            meta = json_store._read_metadata(os.path.join(self.sessions_dir, filename))
+            if not meta.get("session_key"):
+                continue
+            # session_key vem normalizado (minúsculas); agent_id/canal originais estão nos metadados
+            key = SessionKey.parse(meta["session_key"])
+            key = SessionKey(agent_id=meta.get("agent_id") or key.agent_id,
+                             channel=meta.get("channel") or key.channel, peer_id=key.peer_id)
+            self._persist(key, json_store.load_history(key), peer_name=meta.get("peer_name"))
+            if meta.get("created_at"):
+                with conn:
+                    conn.execute("UPDATE sessions SET created_at = ? WHERE session_key = ?",
+                                 (meta["created_at"], key.key_str))
+        console.print(f"[dim cyan]Sessões: {len(legacy)} sessões JSON importadas para {self.db_path}[/dim cyan]")
+
+    def load_history(self, session_key: SessionKey) -> List[Dict[str, Any]]:
+        """Carrega o histórico de mensagens para uma chave de sessão específica."""
+        k = session_key.key_str
+        cached = self._cache.get(k)
+        if cached is not None:
+            return cached
+        try:
+            rows = self._conn().execute(
+                "SELECT body FROM messages WHERE session_key = ? ORDER BY seq", (k,)
+            ).fetchall()
+            history = [json.loads(r["body"]) for r in rows]
+        except Exception as e:
+            console.print(f"[dim red]Erro ao carregar histórico da sessão {k}: {e}[/dim red]")
+            history = []
+        self._cache.put(session_key, history)
+        return history
+
+    def _persist(self, session_key: SessionKey, history: List[Dict[str, Any]], peer_name: Optional[str] = None):
+        """
+        Grava no banco numa transação: insere só as mensagens novas; se o histórico foi reescrito,
+        troca todas as linhas da sessão. Levanta exceção em caso de falha.
+        """
+        k = session_key.key_str
+        now = time.time()
+        tail = SessionStore._fingerprint(history[-1]) if history else None
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT message_count, tail FROM sessions WHERE session_key = ?", (k,)).fetchone()
+            n = row["message_count"] if row else 0
+            appended = (
+                row is not None
+                and len(history) >= n
+                and (n == 0 or SessionStore._fingerprint(history[n - 1]) == row["tail"])
+            )
+            if not appended:
+                conn.execute("DELETE FROM messages WHERE session_key = ?", (k,))
+                n = 0
+            conn.executemany(
+                "INSERT INTO messages (session_key, seq, body) VALUES (?, ?, ?)",
+                ((k, i, json.dumps(m, ensure_ascii=False, default=str)) for i, m in enumerate(history[n:], start=n))
+            )
+            conn.execute(
+                """INSERT INTO sessions (session_key, agent_id, channel, peer_id, peer_name,
+                                         created_at, updated_at, message_count, tail)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(session_key) DO UPDATE SET
+                       peer_name = COALESCE(excluded.peer_name, sessions.peer_name),
+                       updated_at = excluded.updated_at,
+                       message_count = excluded.message_count,
+                       tail = excluded.tail""",
+                (k, session_key.agent_id, session_key.channel,
+                 session_key.peer_id, peer_name, now, now, len(history), tail)
+            )
+
+    @staticmethod
+    def _row_to_meta(row) -> Dict[str, Any]:
+        return asdict(SessionMetadata(
+            session_key=row["session_key"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            peer_name=row["peer_name"],
+            channel=row["channel"],
+            agent_id=row["agent_id"],
+            message_count=row["message_count"],
+        ))
+
+    def list_sessions_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        channel: Optional[str] = None,
+        agent_id: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de sessões por keyset (updated_at, session_key) — custo independe do offset."""
+        where, params = [], []
+        if channel:
+            where.append("channel = ?")
+            params.append(channel)
+        if agent_id:
+            where.append("agent_id = ?")
+            params.append(agent_id)
+        if cursor:
+            updated_at, session_key = _decode_cursor(cursor)
+            where.append("(updated_at, session_key) < (?, ?)")
+            params.extend([updated_at, session_key])
+        sql = "SELECT * FROM sessions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated_at DESC, session_key DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        page = [self._row_to_meta(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor(page[-1]["updated_at"], page[-1]["session_key"])
+        return page, next_cursor
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Lista todas as sessões ativas com metadados."""
+        rows = self._conn().execute("SELECT * FROM sessions ORDER BY updated_at DESC").fetchall()
+        return [self._row_to_meta(r) for r in rows]
+
+
+def open_session_store(backend: str = None, sessions_dir: str = SESSIONS_DIR):
+    """Instancia o backend de sessões configurado em moltyclaw.json ("sessions": {"backend": "json|sqlite"})."""
+    backend = (backend or get_config().get("sessions", {}).get("backend", "json")).lower()
+    if backend == "sqlite":
+        return SqliteSessionStore(sessions_dir)
+    return SessionStore(sessions_dir)
@@ -0,0 +1,250 @@
+"""
+MoltyClaw — Escalonador de Turnos por Prioridade
+
+Fica na frente do agente e decide quando o trabalho de background pode rodar:
+
+    INTERACTIVE (canais/CLI) > ANNOUNCE (anúncio de subagente) > SCHEDULED (jobs) > HEARTBEAT
+
+- Turnos interativos nunca esperam aqui: só são contados (interactive()).
+- Trabalho de background entra numa fila por prioridade e só roda quando não há turno
+  interativo ativo nem recente (idle_grace_s), com no máximo max_background ao mesmo tempo.
+- Prioridades em `preempt` são canceladas quando chega um turno interativo e voltam para a
+  fila (mantendo a idade original).
+- Proteção contra inanição: um item esperando há mais de starvation_s[prioridade] roda mesmo
+  com carga interativa (0 = espera indefinidamente) e não é mais preemptado.
+- Pode ser chamado de vários event loops/threads (loop do hub, loop do gateway, threads do
+  Flask): o estado fica sob uma trava e futures/tasks de outro loop são resolvidos e
+  cancelados no loop dono via call_soon_threadsafe. O timer de reexame também vive no loop
+  de quem está na fila, nunca no loop (talvez transitório) de quem chamou.
+
+Configuração em moltyclaw.json:
+    "turn_scheduler": {"max_background": 1, "idle_grace_s": 2,
+                       "starvation_s": {"announce": 15, "scheduled": 300, "heartbeat": 0},
+                       "preempt": ["heartbeat"]}
+"""
+
+import time
+import asyncio
+import itertools
+import threading
+import contextvars
+from enum import IntEnum
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from config_loader import get_config
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    ANNOUNCE = 1
+    SCHEDULED = 2
+    HEARTBEAT = 3
+
+
+# Prioridade do turno em execução (tasks de background rodam com a prioridade do item)
+current_priority = contextvars.ContextVar("molty_turn_priority", default=Priority.INTERACTIVE)
+# Já contado como interativo neste contexto (evita contar duas vezes hub -> agente)
+_interactive_marked = contextvars.ContextVar("molty_interactive_marked", default=False)
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable, *args) -> bool:
+    """Agenda callback no próximo ciclo de `loop` (thread-safe). False se o loop já fechou."""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+        return True
+    except RuntimeError:
+        return False
+
+
+class PriorityTurnScheduler:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        cfg = config if config is not None else get_config().get("turn_scheduler", {})
+        self.max_background = int(cfg.get("max_background", 1))
+        self.idle_grace = float(cfg.get("idle_grace_s", 2.0))
+        starvation = {"announce": 15, "scheduled": 300, "heartbeat": 0}
+        starvation.update(cfg.get("starvation_s", {}))
+        self.starvation_s = {Priority[k.upper()]: float(v) for k, v in starvation.items()}
+        self.preemptible = {Priority[p.upper()] for p in cfg.get("preempt", ["heartbeat"])}
+
+        self.interactive_active = 0
+        self._last_interactive = 0.0
+        self._queue = []                       # [prioridade, seq, enfileirado_em, future]
+        self._granted = 0                      # vagas concedidas (rodando ou prestes a rodar)
+        self._running: Dict[asyncio.Task, tuple] = {}   # task -> (prioridade, forçado)
+        self._preempted = set()
+        self._seq = itertools.count()
+        self._timer_gen = 0                    # reexames agendados de gerações antigas não fazem nada
+        self._lock = threading.RLock()
+
+        self.ran = 0
+        self.forced = 0
+        self.preemptions = 0
+        self._max_wait: Dict[str, float] = {}
+
+    # ── Turnos interativos ───────────────────────────────────────────────────
+
+    def is_marked(self) -> bool:
+        return _interactive_marked.get()
+
+    @asynccontextmanager
+    async def interactive(self):
+        """Marca um turno interativo (enfileirado ou rodando): segura o background enquanto durar."""
+        token = _interactive_marked.set(True)
+        with self._lock:
+            self.interactive_active += 1
+            if self.interactive_active == 1:
+                self._preempt()
+        try:
+            yield
+        finally:
+            _interactive_marked.reset(token)
+            with self._lock:
+                self.interactive_active -= 1
+                self._last_interactive = time.monotonic()
+                if self.interactive_active == 0:
+                    self._dispatch()
+
+    def _preempt(self):
+        for task, (priority, forced) in self._running.items():
+            if priority in self.preemptible and not forced and not task.done():
+                self._preempted.add(task)
+                # A task pode ser de outro loop (ex.: heartbeat no hub, turno no gateway)
+                _call_soon(task.get_loop(), task.cancel)
+
+    # ── Background ───────────────────────────────────────────────────────────
+
+    async def run(self, priority: Priority, func: Callable[[], Awaitable[T]]) -> T:
+        """Roda func() quando a prioridade permitir. Preempções reenfileiram e repetem func()."""
+        if priority == Priority.INTERACTIVE:
+            async with self.interactive():
+                return await func()
+
+        enqueued_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        while True:
+            fut = loop.create_future()
+            with self._lock:
+                entry = [priority, next(self._seq), enqueued_at, fut]
+                self._queue.append(entry)
+                self._dispatch()
+            try:
+                forced = await fut
+            except asyncio.CancelledError:
+                with self._lock:
+                    if entry in self._queue:
+                        self._queue.remove(entry)
+                    elif fut.done() and not fut.cancelled():
+                        self._release()      # vaga concedida, mas quem esperava desistiu
+                # (concedida e ainda não entregue: _grant vê o future cancelado e devolve a vaga)
+                raise
+
+            waited = time.monotonic() - enqueued_at
+            name = priority.name.lower()
+            self._max_wait[name] = max(self._max_wait.get(name, 0.0), waited)
+            task = loop.create_task(self._call(priority, func))
+            with self._lock:
+                self._running[task] = (priority, forced)
+            try:
+                result = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if task.cancelled() and task in self._preempted:
+                    # Preemptado por um turno interativo: volta para a fila com a idade original
+                    self.preemptions += 1
+                    continue
+                task.cancel()
+                raise
+            finally:
+                with self._lock:
+                    self._running.pop(task, None)
+                    self._preempted.discard(task)
+                    self._release()
+            self.ran += 1
+            return result
+
+    @staticmethod
+    async def _call(priority: Priority, func):
+        current_priority.set(priority)
+        return await func()
+
+    def _release(self):
+        with self._lock:
+            self._granted -= 1
+            self._dispatch()
+
+    def _grant(self, fut: asyncio.Future, forced: bool):
+        """Roda no loop de quem espera: entrega a vaga, ou a devolve se ele já desistiu."""
+        if fut.done():
+            self._release()
+        else:
+            fut.set_result(forced)
+
+    def _on_timer(self, gen: int):
+        with self._lock:
+            if gen == self._timer_gen:
+                self._dispatch()
+
+    def _is_busy(self, now: float) -> bool:
+        return self.interactive_active > 0 or now - self._last_interactive < self.idle_grace
+
+    def _dispatch(self):
+        """
+        Concede vagas a quem pode rodar agora e agenda o próximo reexame (inanição/fim do idle_grace).
+        Chamado com self._lock.
+        """
+        self._timer_gen += 1
+        now = time.monotonic()
+        busy = self._is_busy(now)
+        self._queue = [e for e in self._queue if not e[3].done()]
+        self._queue.sort(key=lambda e: (e[0], e[1]))
+        wake_at = None
+        i = 0
+        while i < len(self._queue) and self._granted < self.max_background:
+            priority, _, enqueued_at, fut = self._queue[i]
+            limit = self.starvation_s.get(priority, 0)
+            starved = busy and limit > 0 and now - enqueued_at >= limit
+            if not busy or starved:
+                self._queue.pop(i)
+                self._granted += 1
+                if starved:
+                    self.forced += 1
+                if not _call_soon(fut.get_loop(), self._grant, fut, starved):
+                    self._granted -= 1       # loop de quem esperava já fechou
+                continue
+            if limit > 0:
+                wake_at = min(wake_at or float("inf"), enqueued_at + limit)
+            i += 1
+        if self._queue and busy and self.interactive_active == 0:
+            wake_at = min(wake_at or float("inf"), self._last_interactive + self.idle_grace)
+        if wake_at is not None:
+            # O timer vai no loop de quem espera, não no de quem chamou: um loop transitório
+            # (asyncio.run, ask_sync) pode fechar antes do prazo e levar o reexame junto
+            gen = self._timer_gen
+            for entry in self._queue:
+                if _call_soon(entry[3].get_loop(), self._arm_timer, wake_at, gen):
+                    break
+
+    def _arm_timer(self, wake_at: float, gen: int):
+        """Roda no loop de um dos que esperam."""
+        if gen == self._timer_gen:
+            asyncio.get_running_loop().call_later(max(0.0, wake_at - time.monotonic()), self._on_timer, gen)
+
+    # ── Observabilidade ──────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        queued: Dict[str, int] = {}
+        with self._lock:
+            for priority, _, _, fut in self._queue:
+                if not fut.done():
+                    queued[priority.name.lower()] = queued.get(priority.name.lower(), 0) + 1
+            running = len(self._running)
+        return {
+            "interactive": self.interactive_active,
+            "background_running": running,
+            "queued": queued,
+            "ran": self.ran,
+            "forced": self.forced,
+            "preemptions": self.preemptions,
+            "max_wait_s": {k: round(v, 1) for k, v in self._max_wait.items()},
+        }
@@ -0,0 +1,222 @@
+"""
+MoltyClaw — Stream de Eventos de um Turno
+
+Um único mecanismo de streaming para todos os consumidores (SSE do gateway, WebUI Flask,
+Telegram, Discord): o turno vira um iterador assíncrono de eventos tipados.
+
+    async for evt in hub.stream("oi", channel="telegram", peer_id="123"):
+        if evt.type == "tokens": ...        # lote de texto narrativo
+        elif evt.type == "tool_start": ...  # {"action": ..., "param": ...}
+        elif evt.type == "tool_end": ...    # rótulo da ferramenta (o antigo tool_callback)
+        elif evt.type == "media": ...       # {"kind": "image"|"audio", "path": ..., "name": ...}
+        elif evt.type == "done": ...        # resposta final, sem os marcadores de mídia
+        elif evt.type == "error": ...
+
+Backpressure: os tokens se acumulam num buffer que vira um único evento "tokens" quando o
+consumidor pede o próximo; se o consumidor atrasar além de max_chars/max_events, o turno
+espera no próximo token. Consumidor que desiste chama aclose(): o turno continua até o fim
+(histórico salvo), só os eventos passam a ser descartados.
+"""
+
+import os
+import re
+import json
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+TOKENS = "tokens"
+TOOL_START = "tool_start"
+TOOL_END = "tool_end"
+MEDIA = "media"
+DONE = "done"
+ERROR = "error"
+
+
+@dataclass
+class StreamEvent:
+    type: str
+    content: Any = None
+
+    def as_dict(self) -> dict:
+        return {"type": self.type, "content": self.content}
+
+    def sse(self) -> str:
+        return f"data: {json.dumps(self.as_dict())}\n\n"
+
+
+class TurnStream:
+    """Fila de eventos de um turno com buffer de tokens limitado (iterador assíncrono)."""
+
+    def __init__(self, max_chars: int = 8192, max_events: int = 64):
+        self.max_chars = max_chars
+        self.max_events = max_events
+        self._events: deque = deque()
+        self._text: List[str] = []
+        self._text_len = 0
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._finished = False      # evento terminal já enfileirado
+        self._closed = False        # consumidor desistiu
+        self.task: Optional[asyncio.Task] = None
+
+    # ── Produtor ─────────────────────────────────────────────────────────────
+
+    async def _wait_writable(self):
+        while not self._closed and (self._text_len >= self.max_chars or len(self._events) >= self.max_events):
+            self._writable.clear()
+            await self._writable.wait()
+
+    def _flush_text(self):
+        if self._text:
+            self._events.append(StreamEvent(TOKENS, "".join(self._text)))
+            self._text.clear()
+            self._text_len = 0
+
+    async def put_text(self, text: str):
+        if self._closed or self._finished or not text:
+            return
+        await self._wait_writable()
+        self._text.append(text)
+        self._text_len += len(text)
+        self._readable.set()
+
+    async def put(self, event: StreamEvent):
+        if self._closed or self._finished:
+            return
+        await self._wait_writable()
+        self._flush_text()
+        self._events.append(event)
+        self._readable.set()
+
+    def finish(self, event: StreamEvent):
+        """Enfileira o evento terminal (done/error) sem esperar espaço."""
+        if self._finished:
+            return
+        self._flush_text()
+        self._events.append(event)
+        self._finished = True
+        self._readable.set()
+
+    # ── Consumidor ───────────────────────────────────────────────────────────
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> StreamEvent:
+        while True:
+            if self._events:
+                event = self._events.popleft()
+            elif self._text:
+                event = StreamEvent(TOKENS, "".join(self._text))
+                self._text.clear()
+                self._text_len = 0
+            elif self._finished or self._closed:
+                raise StopAsyncIteration
+            else:
+                self._readable.clear()
+                await self._readable.wait()
+                continue
+            self._writable.set()
+            if event.type in (DONE, ERROR):
+                self._closed = True
+            return event
+
+    async def aclose(self):
+        """O consumidor parou de ler: libera o produtor e descarta o que vier depois."""
+        self._closed = True
+        self._events.clear()
+        self._text.clear()
+        self._text_len = 0
+        self._writable.set()
+        self._readable.set()
+
+
+_MEDIA_MARKERS = (("image", re.compile(r'\[SCREENSHOT_TAKEN:\s*(.*?)\]')),
+                  ("audio", re.compile(r'\[AUDIO_REPLY:\s*(.*?)\]')))
+
+
+def extract_media(reply: str, base_dir: Optional[str] = None) -> Tuple[str, List[dict]]:
+    """Separa os marcadores de mídia da resposta: (texto limpo, [{"kind", "path", "name"}])."""
+    media = []
+    for kind, pattern in _MEDIA_MARKERS:
+        match = pattern.search(reply)
+        if not match:
+            continue
+        path = match.group(1).strip()
+        reply = reply.replace(match.group(0), "").strip()
+        if base_dir and not os.path.isabs(path) and not os.path.exists(path):
+            candidate = os.path.join(base_dir, "temp", path)
+            if os.path.exists(candidate):
+                path = candidate
+        media.append({"kind": kind, "path": path, "name": os.path.basename(path)})
+    return reply, media
+
+
+def stream_turn(
+    run: Callable[[Optional[Callable], Callable], Awaitable[str]],
+    *,
+    tokens: bool = True,
+    base_dir: Optional[str] = None,
+    on_error: Optional[Callable[[BaseException], Optional[str]]] = None,
+) -> TurnStream:
+    """
+    Roda run(stream_callback, tool_callback) numa task e devolve o TurnStream dos eventos.
+    Com tokens=False o stream_callback é None (o turno pode ser coalescido pelo hub).
+    on_error pode converter uma exceção em resposta final (ex.: TurnRejected -> mensagem).
+    """
+    stream = TurnStream()
+
+    async def tool_callback(label: str):
+        await stream.put(StreamEvent(TOOL_END, label))
+
+    async def on_tool_start(action: str, param: Any):
+        await stream.put(StreamEvent(TOOL_START, {"action": action, "param": str(param)[:200]}))
+
+    # Extensão opcional do tool_callback: o agente chama on_tool_start antes de executar a ferramenta
+    tool_callback.on_tool_start = on_tool_start
+
+    async def produce():
+        try:
+            reply = await run(stream.put_text if tokens else None, tool_callback)
+        except asyncio.CancelledError:
+            stream.finish(StreamEvent(ERROR, "cancelado"))
+            raise
+        except Exception as e:
+            handled = on_error(e) if on_error is not None else None
+            if handled is None:
+                stream.finish(StreamEvent(ERROR, str(e)))
+                return
+            reply = handled
+        media = []
+        if isinstance(reply, str):
+            reply, media = extract_media(reply, base_dir)
+        for item in media:
+            await stream.put(StreamEvent(MEDIA, item))
+        stream.finish(StreamEvent(DONE, reply))
+
+    stream.task = asyncio.ensure_future(produce())
+    return stream
+
+
+def iterate_threadsafe(make_stream: Callable[[], TurnStream], loop: asyncio.AbstractEventLoop,
+                       timeout: Optional[float] = None) -> Iterator[StreamEvent]:
+    """
+    Consome um TurnStream criado no loop `loop` a partir de outra thread (Flask): cada next()
+    busca um evento no loop, então a thread lenta segura o turno do mesmo jeito.
+    """
+    async def _create():
+        return make_stream()
+
+    stream = asyncio.run_coroutine_threadsafe(_create(), loop).result(timeout=timeout)
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(stream.__anext__(), loop).result(timeout=timeout)
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(stream.aclose(), loop)
+
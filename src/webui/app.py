@@ -146,9 +146,15 @@ def chat():
     # Intercepta Comandos Slash Universais (/learn, /delegate, /skill, /mcp, /status, etc.)
     from commands import is_slash_command, handle_slash_command
     if is_slash_command(user_msg):
+        # O Master conversa pelo hub na SessionKey do canal webui (alvo do /stop)
+        hub_session_key = None
+        if req_agent_id == "MoltyClaw":
+            from sessions import SessionKey
+            hub_session_key = SessionKey(agent_id=hub.agent.agent_id or "MoltyClaw", channel="webui", peer_id="default").key_str
+
         def generate_slash_response():
             fut = asyncio.run_coroutine_threadsafe(
-                handle_slash_command(user_msg, agent=target_agent, agent_id=req_agent_id),
+                handle_slash_command(user_msg, agent=target_agent, agent_id=req_agent_id, session_key=hub_session_key),
                 hub.loop
             )
             cmd_result = fut.result(timeout=60)
@@ -160,46 +166,20 @@ def chat():
         from flask import Response, stream_with_context
         return Response(stream_with_context(generate_slash_response()), mimetype='text/event-stream')
 
-    import queue as _queue
-    import re
-    q = _queue.Queue()
-
-    # Se for o agente Master, usa o hub com streaming nativo
+    # Se for o agente Master, usa o stream do hub; sub-agentes rodam direto no loop do hub
     if req_agent_id == "MoltyClaw":
-        hub.ask_sync_streaming(user_msg, q, channel="webui")
+        events = hub.stream_sync(user_msg, channel="webui")
     else:
-        # Sub-agentes usam o caminho legado
-        async def stream_cb(token: str):
-            q.put(("token", token))
-
-        async def tool_cb(msg: str):
-            q.put(("tool", msg))
+        from turn_stream import stream_turn, iterate_threadsafe
 
-        async def run_ask():
-            try:
-                res = await target_agent.ask(prompt=user_msg, silent=False, stream_callback=stream_cb, tool_callback=tool_cb)
-                if res and isinstance(res, str) and "[AUDIO_REPLY:" in res:
-                    match = re.search(r'\[AUDIO_REPLY:\s*([^\]]+)\]', res)
-                    if match:
-                        filename = os.path.basename(match.group(1).strip())
-                        q.put(("token", f"\n\n[AUDIO_REPLY: {filename}]\n\n"))
-                q.put(("done", None))
-            except Exception as e:
-                q.put(("error", str(e)))
+        def run(stream_cb, tool_cb):
+            return target_agent.ask(prompt=user_msg, silent=False, stream_callback=stream_cb, tool_callback=tool_cb)
 
-        asyncio.run_coroutine_threadsafe(run_ask(), hub.loop)
+        events = iterate_threadsafe(lambda: stream_turn(run, base_dir=target_agent.base_dir), hub.loop)
 
     def generate():
-        while True:
-            evt_type, data = q.get()
-            if evt_type == "done":
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
-                break
-            elif evt_type == "error":
-                yield f"data: {json.dumps({'type': 'error', 'content': data})}\n\n"
-                break
-            else:
-                yield f"data: {json.dumps({'type': evt_type, 'content': data})}\n\n"
+        for evt in events:
+            yield evt.sse()
 
     from flask import Response, stream_with_context
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -24,6 +24,8 @@ sys.path.append(BASE_DIR)
 from moltyclaw import MoltyClaw
 import skills
 from scheduler import SchedulerManager
+from queued_turns import QueuedTurnManager, TurnRejected
+from turn_stream import stream_turn
 from rich.console import Console
 from dotenv import load_dotenv
 from initializer import MOLTY_DIR
@@ -39,6 +41,9 @@ except ImportError:
 console = Console()
 load_dotenv(os.path.join(MOLTY_DIR, '.env'))
 
+# Admissão dos turnos de chat da WebUI (mesmos limites de "turns" usados pelo AgentHub)
+turn_manager = QueuedTurnManager()
+
 # --- Config & Security ---
 GATEWAY_TOKEN = None
 
@@ -242,11 +247,41 @@ async def get_status():
     return {"ready": ready, "ws": True}
 
 @app.get("/api/sessions")
-async def get_sessions(authorized: bool = Depends(verify_token)):
-    """Retorna todas as sessões registradas no SessionStore."""
-    from sessions import SessionStore
-    store = SessionStore()
-    return {"sessions": store.list_sessions()}
+async def get_sessions(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    channel: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    authorized: bool = Depends(verify_token)
+):
+    """Retorna uma página de sessões (mais recentes primeiro). Use `next_cursor` para a próxima."""
+    from agent_hub import get_session_store
+    store = get_session_store()
+    try:
+        sessions, next_cursor = store.list_sessions_page(
+            limit=max(1, min(limit, 1000)), cursor=cursor, channel=channel, agent_id=agent_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+@app.get("/api/turns/stats")
+async def get_turn_stats(authorized: bool = Depends(verify_token)):
+    """Profundidade da fila, turnos em execução e tempos de espera (gateway e AgentHub, se ativo)."""
+    import agent_hub
+    hub = agent_hub._hub_instance
+    hub_manager = getattr(hub, "turn_manager", None) if hub is not None else None
+    return {
+        "gateway": turn_manager.stats(),
+        "hub": hub_manager.stats() if hub_manager else None,
+        "priority": master_agent.turn_scheduler.stats() if master_agent else None,
+    }
+
+@app.get("/api/executors/stats")
+async def get_executor_stats(authorized: bool = Depends(verify_token)):
+    """Pools de threads das integrações: ocupação, fila e tempos de fila/execução."""
+    from executors import executor_stats
+    return {"pools": executor_stats()}
 
 @app.get("/temp/{filename}")
 async def serve_temp(filename: str):
@@ -323,42 +358,33 @@ async def chat(
         return StreamingResponse(slash_event_generator(), media_type="text/event-stream")
 
     # Streaming Response (SSE)
-    async def event_generator():
-        q = asyncio.Queue()
-
-        async def stream_cb(token: str):
-            await q.put({"type": "token", "content": token})
-
-        async def tool_cb(msg: str):
-            await q.put({"type": "tool", "content": msg})
-
-        # Task de processamento
-        async def process():
-            try:
-                res = await target_agent.ask(
-                    prompt=message,
-                    silent=False,
-                    stream_callback=stream_cb,
-                    tool_callback=tool_cb
+    def run(stream_cb, tool_cb):
+        async def _turn():
+            async with target_agent.turn_scheduler.interactive():
+                return await turn_manager.run_turn(
+                    f"{agent_id}:webui:default",
+                    lambda: target_agent.ask(
+                        prompt=message,
+                        silent=False,
+                        stream_callback=stream_cb,
+                        tool_callback=tool_cb
+                    )
                 )
-                if res and isinstance(res, str) and "[AUDIO_REPLY:" in res:
-                    match = re.search(r'\[AUDIO_REPLY:\s*([^\]]+)\]', res)
-                    if match:
-                        fname = os.path.basename(match.group(1).strip())
-                        await q.put({"type": "token", "content": f"\n\n[AUDIO_REPLY: {fname}]\n\n"})
-                
-                await q.put({"type": "done"})
-            except Exception as e:
-                console.print(f"[bold red]Erro no Chat:[/bold red] {traceback.format_exc()}")
-                await q.put({"type": "error", "content": str(e)})
+        return _turn()
 
-        asyncio.create_task(process())
+    def on_error(e):
+        if isinstance(e, TurnRejected):
+            return e.message
+        console.print(f"[bold red]Erro no Chat:[/bold red] {traceback.format_exc()}")
+        return None
 
-        while True:
-            evt = await q.get()
-            yield f"data: {json.dumps(evt)}\n\n"
-            if evt["type"] in ["done", "error"]:
-                break
+    async def event_generator():
+        stream = stream_turn(run, base_dir=target_agent.base_dir, on_error=on_error)
+        try:
+            async for evt in stream:
+                yield evt.sse()
+        finally:
+            await stream.aclose()
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -229,12 +229,17 @@ async function sendMessage() {
 
                     try {
                         const evt = JSON.parse(dataStr);
-                        if (evt.type === 'token') {
+                        if (evt.type === 'token' || evt.type === 'tokens') {
                             cumulativeText += evt.content;
                             if (!renderTimer) renderTimer = setTimeout(flushRender, 100);
-                        } else if (evt.type === 'tool') {
+                        } else if (evt.type === 'tool' || evt.type === 'tool_end') {
                             cumulativeText += `\n> ⚙️ [\`${evt.content}\`]\n\n`;
                             flushRender();
+                        } else if (evt.type === 'media') {
+                            if (evt.content && evt.content.kind === 'audio') {
+                                cumulativeText += `\n\n[AUDIO_REPLY: ${evt.content.name}]\n\n`;
+                                flushRender();
+                            }
                         } else if (evt.type === 'action') {
                             if (evt.content === 'clear_chat') {
                                 setTimeout(clearSession, 1200);
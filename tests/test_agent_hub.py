@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("rich")
+
+from agent_hub import AgentHub
+from queued_turns import QueuedTurnManager
+from turn_scheduler import PriorityTurnScheduler
+
+
+class FakeAgent:
+    agent_id = "MoltyClaw"
+
+    def __init__(self):
+        self.turn_scheduler = PriorityTurnScheduler(config={})
+        self.release = asyncio.Event()
+        self.calls = []
+
+    def new_session(self, key_str):
+        return object()
+
+    async def ask(self, prompt, **kwargs):
+        self.calls.append((prompt.split("\n\n[SISTEMA")[0], kwargs))
+        if len(self.calls) == 1:
+            await self.release.wait()
+        return f"resposta {len(self.calls)}"
+
+
+def test_batch_queued_behind_a_turn_uses_the_latest_callbacks():
+    async def run():
+        hub = AgentHub()
+        hub.agent = FakeAgent()
+        hub.turn_manager = QueuedTurnManager(config={})
+        hub.debounce_ms, hub.debounce_max_ms = 20, 1000
+        hub.ready = True
+
+        async def cb_b(msg): pass
+        async def cb_c(msg): pass
+
+        first = asyncio.create_task(hub.ask("a", channel="telegram", peer_id="1"))
+        await asyncio.sleep(0.05)               # turno de "a" rodando e segurando a sessão
+        b = asyncio.create_task(hub.ask("b", channel="telegram", peer_id="1", peer_name="Ana",
+                                        tool_callback=cb_b))
+        await asyncio.sleep(0.05)               # janela de "b" fechou: o lote está na fila da sessão
+        c = asyncio.create_task(hub.ask("c", channel="telegram", peer_id="1", peer_name="Ana B.",
+                                        tool_callback=cb_c))
+        await asyncio.sleep(0.01)
+        hub.agent.release.set()
+
+        assert await first == "resposta 1"
+        assert await b == ""                    # absorvida pela mensagem seguinte
+        assert await c == "resposta 2"
+        prompt, kwargs = hub.agent.calls[1]
+        assert prompt == "b\nc"
+        assert kwargs["tool_callback"] is cb_c
+        assert kwargs["requester"]["name"] == "Ana B."
+
+    asyncio.run(run())
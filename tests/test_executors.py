@@ -0,0 +1,40 @@
+import time
+import asyncio
+
+import pytest
+
+from executors import BoundedExecutor, ExecutorBusy
+
+
+def test_full_queue_rejects():
+    async def run():
+        pool = BoundedExecutor("search", workers=1, queue=1)
+        running = pool.submit(time.sleep, 0.2)
+        await asyncio.sleep(0.05)
+        queued = pool.submit(time.sleep, 0)
+        with pytest.raises(ExecutorBusy):
+            pool.submit(time.sleep, 0)
+        await asyncio.gather(running, queued)
+        assert pool.stats()["rejected"] == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_queued_jobs_release_their_slots():
+    async def run():
+        pool = BoundedExecutor("media", workers=2, queue=4)
+        running = [pool.submit(time.sleep, 0.3) for _ in range(2)]
+        await asyncio.sleep(0.05)  # os dois primeiros já estão nas threads
+        for _ in range(4):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.submit(time.sleep, 0.3), timeout=0.01)
+        stats = pool.stats()
+        assert stats["queued"] == 0 and stats["cancelled"] == 4
+
+        # As vagas voltaram: novas chamadas entram na fila em vez de ExecutorBusy
+        assert await pool.submit(lambda: 42) == 42
+        await asyncio.gather(*running)
+        stats = pool.stats()
+        assert stats["queued"] == 0 and stats["active"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+import pytest
+
+pytest.importorskip("rich")
+
+import hub_shards
+from hub_shards import ShardRouter
+
+# Worker falso: fala o protocolo da frente sem subir um AgentHub de verdade
+FAKE_WORKER = """
+import os, sys
+from multiprocessing.connection import Listener
+listener = Listener(sys.argv[1], authkey=bytes.fromhex(os.environ["MOLTY_HUB_AUTHKEY"]))
+conn = listener.accept()
+running = {}                                            # peer -> id do turno longo em andamento
+while True:
+    try:
+        req = conn.recv()
+    except (EOFError, OSError):
+        break
+    if req["op"] == "cancel":
+        ref = running.pop(req["peer_id"], None)
+        if ref is not None:
+            conn.send(("done", ref, ""))                # turno cancelado termina sem resposta
+        conn.send(("cancelled", req["id"], ref is not None or req["peer_id"] == "busy"))
+    elif req["op"] == "ask":
+        if req["message"].startswith("/"):
+            conn.send(("memory", None, req["message"]))    # worker escreveu num arquivo de memória
+        if req["message"] == "tarefa longa":
+            running[req["peer_id"]] = req["id"]
+            continue
+        conn.send(("done", req["id"], "pong"))
+"""
+
+
+class FakeRouter(ShardRouter):
+    def __init__(self, script, workers=1):
+        super().__init__(workers)
+        self.script = script
+
+    def _spawn(self, w):
+        self._reap(w)
+        if os.path.exists(w.address):
+            os.remove(w.address)
+        env = dict(os.environ, MOLTY_HUB_AUTHKEY=self.authkey.hex())
+        w.process = subprocess.Popen([sys.executable, str(self.script), w.address], env=env)
+
+
+@pytest.fixture
+def router(tmp_path):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    r = FakeRouter(script)
+    r.start(timeout=20)
+    yield r
+    r.close()
+
+
+def _wait_for(cond, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_cancel_reports_whether_something_was_running(router):
+    async def run():
+        busy = await router.cancel("moltyclaw:telegram:busy", channel="telegram", peer_id="busy")
+        idle = await router.cancel("moltyclaw:telegram:idle", channel="telegram", peer_id="idle")
+        return busy, idle
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_slash_stop_cancels_a_turn_running_on_a_worker(router, monkeypatch):
+    import agent_hub
+    from agent_hub import AgentHub
+    from commands import handle_slash_command
+    from turn_scheduler import PriorityTurnScheduler
+
+    class FrontAgent:
+        agent_id = "MoltyClaw"
+        turn_scheduler = PriorityTurnScheduler(config={})
+
+        def cancel_turn(self, session_key, reason="stop"):
+            return 0                    # na frente nunca há turno rodando
+
+    hub = AgentHub()
+    hub.agent, hub.shards, hub.ready = FrontAgent(), router, True
+    monkeypatch.setattr(agent_hub, "_hub_instance", hub)
+    key = hub._session_key("webui", "default").key_str
+
+    async def run():
+        turn = asyncio.create_task(hub.ask("tarefa longa", channel="webui", peer_id="default"))
+        await asyncio.sleep(0.2)
+        res = await handle_slash_command("/stop", agent=hub.agent, session_key=key)
+        return res["reply"], await asyncio.wait_for(turn, timeout=5)
+
+    reply, turn_reply = asyncio.run(run())
+    assert "interrompida" in reply
+    assert turn_reply == ""
+
+
+def test_dead_worker_is_reaped_and_restarted(router):
+    w = router.workers[0]
+    old = w.process
+    old.kill()
+    assert _wait_for(lambda: w.alive and w.process is not None and w.process is not old)
+    assert old.returncode is not None          # o processo antigo foi esperado (sem zumbi)
+    assert asyncio.run(router.ask("moltyclaw:cli:default", "ping")) == "pong"
+
+
+def test_stale_reply_routes_are_pruned():
+    r = ShardRouter(1)
+    live, closed = asyncio.new_event_loop(), asyncio.new_event_loop()
+    closed.close()
+    now = time.monotonic()
+    r._reply_routes = {
+        "a:telegram:1": (live, None, now),
+        "a:telegram:2": (live, None, now - hub_shards.REPLY_ROUTE_TTL - 1),
+        "a:discord:3": (closed, None, now),
+    }
+    r._routes_pruned_at = 0
+    r._prune_routes()
+    assert list(r._reply_routes) == ["a:telegram:1"]
+    live.close()
+
+
+def test_memory_writes_in_a_worker_are_forwarded_to_the_front(router):
+    notified = []
+    router.on_memory_write = notified.append
+    assert asyncio.run(router.ask("moltyclaw:cli:default", "/ws/MEMORY.md")) == "pong"
+    assert _wait_for(lambda: notified == ["/ws/MEMORY.md"], timeout=5)
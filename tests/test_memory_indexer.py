@@ -0,0 +1,58 @@
+import time
+
+from memory_indexer import MemoryIndexer
+
+
+class _StuckEngine:
+    """Motor cujo provedor de embeddings nunca devolve vetores."""
+
+    def __init__(self, pending=3):
+        self.pending = pending
+
+    def pending_chunks(self):
+        return self.pending
+
+
+def test_backoff_grows_while_no_progress_and_resets_after():
+    engine = _StuckEngine()
+    indexer = MemoryIndexer(engine, poll_interval=5.0, max_backoff=40.0)
+
+    waits = []
+    for _ in range(5):
+        indexer._update_backoff(0)
+        waits.append(indexer.backoff)
+    assert waits == [10.0, 20.0, 40.0, 40.0, 40.0]
+    assert indexer._retry_at > time.monotonic()
+
+    engine.pending = 0
+    indexer._update_backoff(3)
+    assert indexer.backoff == 0.0 and indexer._retry_at == 0.0
+
+
+def test_rejected_vectors_are_not_reembedded(tmp_path):
+    import asyncio
+    from memory_rag import HybridMemoryRAG
+
+    class ZeroProvider:
+        namespace = "test-zero"
+        batch_size = 16
+        calls = 0
+
+        async def embed(self, texts):
+            ZeroProvider.calls += 1
+            return [[0.0, 0.0, 0.0] for _ in texts]
+
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    (workspace / "MEMORY.md").write_text("# Notas\n\nO usuário prefere café sem açúcar.\n", encoding="utf-8")
+    engine = HybridMemoryRAG(str(tmp_path), str(workspace), ZeroProvider())
+
+    async def run():
+        await engine.index()
+        first = ZeroProvider.calls
+        assert first >= 1
+        assert engine.pending_chunks() == 0
+        await engine.index()
+        assert ZeroProvider.calls == first
+
+    asyncio.run(run())
@@ -0,0 +1,200 @@
+from memory_rag import VectorStore
+
+
+def test_prefix_namespaces_keep_their_own_data(tmp_path):
+    base = VectorStore(str(tmp_path), namespace="openai-text-embedding-3")
+    v2 = VectorStore(str(tmp_path), namespace="openai-text-embedding-3-v2")
+    base.put("a", [1.0, 0.0])
+    v2.put("b", [0.0, 1.0])
+    v2.compact()                        # gen 1 do -v2: um número que não é a gen viva da base
+
+    VectorStore(str(tmp_path), namespace="openai-text-embedding-3")   # reabrir limpa só os próprios órfãos
+    reopened = VectorStore(str(tmp_path), namespace="openai-text-embedding-3-v2")
+    assert reopened.get("b") == [0.0, 1.0]
+
+
+def test_orphan_generations_of_the_same_namespace_are_removed(tmp_path):
+    store = VectorStore(str(tmp_path), namespace="ns")
+    store.put("a", [1.0, 2.0])
+    orphan = tmp_path / "vectors.ns-7.f32"
+    orphan.write_bytes(b"\0" * 8)       # compactação interrompida antes de trocar o índice
+
+    reopened = VectorStore(str(tmp_path), namespace="ns")
+    assert not orphan.exists()
+    assert reopened.get("a") == [1.0, 2.0]
+
+
+def test_query_embeddings_stay_in_memory(tmp_path):
+    import asyncio
+    from memory_rag import HybridMemoryRAG
+
+    class CountingProvider:
+        namespace = "test-count"
+        batch_size = 16
+        calls = 0
+
+        async def embed_one(self, text):
+            CountingProvider.calls += 1
+            return [float(len(text)), 1.0]
+
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    engine = HybridMemoryRAG(str(tmp_path), str(workspace), CountingProvider())
+    engine.query_cache_size = 2
+
+    async def run():
+        for q in ("oi", "tudo bem?", "oi", "qual meu café?"):
+            await engine.get_embedding_cached(q)
+
+    asyncio.run(run())
+    assert CountingProvider.calls == 3          # "oi" repetido veio do LRU
+    assert len(engine._query_cache) == 2        # limitado
+    assert len(engine.store) == 0               # nada de consulta avulsa na store persistente
+
+
+def test_backfill_writes_and_ann_training_run_off_the_loop(tmp_path):
+    import asyncio
+    import threading
+    from memory_rag import HybridMemoryRAG
+
+    class Provider:
+        namespace = "test-offloop"
+        batch_size = 2
+
+        async def embed(self, texts):
+            return [[float(i + 1), 1.0, 0.5] for i, _ in enumerate(texts)]
+
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    (workspace / "MEMORY.md").write_text("\n\n".join(f"fato {i}" for i in range(5)), encoding="utf-8")
+    engine = HybridMemoryRAG(str(tmp_path), str(workspace), Provider())
+    threads = {}
+
+    put_many = engine.store.put_many
+    def spy_put_many(items):
+        threads.setdefault("store", threading.current_thread())
+        put_many(items)
+    engine.store.put_many = spy_put_many
+
+    if engine.ann is not None:
+        engine.ann.min_size = 1
+        train = engine.ann.train
+        def spy_train(ids, data, **kw):
+            threads["ann"] = threading.current_thread()
+            train(ids, data, **kw)
+        engine.ann.train = spy_train
+
+    async def run():
+        loop_thread = threading.current_thread()
+        assert await engine.index() == 5
+        if engine._ann_task is not None:
+            await engine._ann_task
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert threads["store"] is not loop_thread
+    if engine.ann is not None:
+        assert threads["ann"] is not loop_thread
+    assert len(engine.store) == 5 and len(engine.matrix) == 5
+
+
+READER = """
+import sys, json
+sys.path.insert(0, sys.argv[2])
+from memory_rag import VectorStore
+store = VectorStore(sys.argv[1], namespace="ns", read_only=True)
+print(json.dumps(store.get("a")), flush=True)
+sys.stdin.readline()
+changed = store.refresh()
+print(json.dumps([changed, store.gen, store.get("a"), store.get("b"), store.get("c")]), flush=True)
+"""
+
+
+def test_worker_process_reads_the_front_store_across_compaction(tmp_path):
+    import os
+    import sys
+    import json
+    import subprocess
+
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    front = VectorStore(str(tmp_path), namespace="ns")
+    front.put("a", [1.0, 2.0])
+    front.put("b", [3.0, 4.0])
+
+    worker = subprocess.Popen([sys.executable, "-c", READER, str(tmp_path), src],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert json.loads(worker.stdout.readline()) == [1.0, 2.0]
+
+        # A frente reescreve "a" várias vezes, compacta (gen nova, offsets novos) e anexa mais
+        for i in range(5):
+            front.put("a", [float(i), 1.0])
+        front.delete("b")
+        front.compact()
+        front.put("c", [5.0, 6.0])
+        files = sorted(os.listdir(tmp_path))
+
+        worker.stdin.write("\n")
+        worker.stdin.flush()
+        changed, gen, a, b, c = json.loads(worker.stdout.readline())
+        assert worker.wait(timeout=10) == 0
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+
+    assert changed and gen == front.gen == 1
+    assert (a, b, c) == ([4.0, 1.0], None, [5.0, 6.0])
+    assert sorted(os.listdir(tmp_path)) == files          # o worker não gravou nem apagou nada
+    reopened = VectorStore(str(tmp_path), namespace="ns")
+    assert reopened.get("a") == [4.0, 1.0] and reopened.get("c") == [5.0, 6.0]
+
+
+def test_read_only_store_leaves_a_compaction_in_progress_alone(tmp_path):
+    import pytest
+
+    front = VectorStore(str(tmp_path), namespace="ns")
+    front.put("a", [1.0, 2.0])
+    in_progress = tmp_path / "vectors.ns-1.f32"
+    in_progress.write_bytes(b"\0" * 8)      # a frente ainda não trocou o índice
+
+    reader = VectorStore(str(tmp_path), namespace="ns", read_only=True)
+    assert in_progress.exists()
+    assert reader.get("a") == [1.0, 2.0]
+    with pytest.raises(RuntimeError):
+        reader.put("x", [1.0, 1.0])
+
+
+def test_read_only_engine_picks_up_vectors_written_by_the_front(tmp_path):
+    import asyncio
+    from memory_rag import HybridMemoryRAG
+
+    class Provider:
+        namespace = "test-shared"
+        batch_size = 8
+
+        async def embed(self, texts):
+            return [[1.0 if "café" in t else 0.0, 1.0, 0.0] for t in texts]
+
+        async def embed_one(self, text):
+            return (await self.embed([text]))[0]
+
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    memory = workspace / "MEMORY.md"
+    memory.write_text("O usuário mora em Recife.", encoding="utf-8")
+    front = HybridMemoryRAG(str(tmp_path), str(workspace), Provider(), read_only=False)
+    worker = HybridMemoryRAG(str(tmp_path), str(workspace), Provider(), read_only=True)
+
+    async def run():
+        await front.index()
+        memory.write_text("O usuário mora em Recife.\n\nPrefere café sem açúcar.", encoding="utf-8")
+        worker.invalidate(str(memory))
+        assert await worker.backfill() == 0         # worker não embeda nem grava
+        assert len(front.store) == 1
+        front.invalidate(str(memory))
+        await front.index()
+        results = await worker.search("café", top_k=1)
+        assert results and "café" in results[0][1]["text"]
+        assert len(worker.matrix) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("rich")
+
+from queued_turns import QueuedTurnManager
+
+
+def _peak(keys, per_peer=1):
+    """Roda um turno por chave ao mesmo tempo e devolve quantos chegaram a rodar juntos."""
+    async def run():
+        turns = QueuedTurnManager(config={"max_concurrent": 0, "per_peer": per_peer, "wait_timeout": 1})
+        inside = 0
+        peak = 0
+
+        async def turn():
+            nonlocal inside, peak
+            inside += 1
+            peak = max(peak, inside)
+            await asyncio.sleep(0.05)
+            inside -= 1
+
+        await asyncio.gather(*(turns.run_turn(k, turn) for k in keys))
+        return peak
+
+    return asyncio.run(run())
+
+
+def test_one_peer_on_two_sessions_is_throttled():
+    # Mesma pessoa falando com dois agentes: sessões (e travas) diferentes, cota de peer única
+    assert _peak(["a:telegram:123", "b:telegram:123"], per_peer=1) == 1
+    assert _peak(["a:telegram:123", "b:telegram:123", "c:telegram:123"], per_peer=2) == 2
+
+
+def test_same_peer_id_on_different_channels_do_not_share_quota():
+    assert _peak(["moltyclaw:telegram:123", "moltyclaw:discord:123"], per_peer=1) == 2
+
+
+def test_different_peers_do_not_share_quota():
+    assert _peak(["a:telegram:123", "a:telegram:456"], per_peer=1) == 2
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import session_archive
+from session_archive import SessionArchive
+
+
+def _session(i):
+    meta = {"session_key": f"moltyclaw:telegram:{i}", "peer_name": f"peer {i}", "created_at": 100.0 + i}
+    return meta["session_key"], meta, [{"role": "user", "content": f"oi {i}"}, {"role": "assistant", "content": "olá"}]
+
+
+def test_segment_round_trip_survives_reopen(tmp_path):
+    archive = SessionArchive(str(tmp_path))
+    sessions = [_session(i) for i in range(3)]
+    archive.put_many(sessions)
+
+    reopened = SessionArchive(str(tmp_path))
+    for key, meta, history in sessions:
+        assert reopened.get(key) == (meta, history)
+    reopened.remove(sessions[0][0])
+    assert sessions[0][0] not in SessionArchive(str(tmp_path))
+    assert len(SessionArchive(str(tmp_path))) == 2
+
+
+def test_idle_session_is_archived_and_rehydrated(tmp_path):
+    pytest.importorskip("rich")
+    from sessions import SessionKey, SessionStore
+
+    key = SessionKey(channel="telegram", peer_id="123")
+    history = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "olá"}]
+    store = SessionStore(str(tmp_path), write_behind=False)
+    store.save_history(key, history[:1], peer_name="Ana")
+    store.save_history(key, history)                        # a última mensagem está só no journal
+    assert store.archive_idle(ttl_seconds=-1) == 1
+    assert not any(f.startswith("moltyclaw_") for f in os.listdir(tmp_path))
+
+    reopened = SessionStore(str(tmp_path), write_behind=False)
+    assert key.key_str in reopened.archive
+    assert reopened.load_history(key) == history
+    assert key.key_str not in reopened.archive
+    [meta] = reopened.list_sessions()
+    assert meta["peer_name"] == "Ana" and meta["message_count"] == 2
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_archive, "zstandard", None)
+    archive = SessionArchive(str(tmp_path), codec="zstd")
+    assert archive.codec == "gzip"
+    key, meta, history = _session(1)
+    archive.put_many([(key, meta, history)])
+    assert [f for f in os.listdir(tmp_path) if f.startswith("seg-")] == ["seg-000001.gz"]
+    assert SessionArchive(str(tmp_path)).get(key) == (meta, history)
+
+    # Segmento .zst de quando o pacote estava instalado: erro claro em vez de lixo
+    (tmp_path / "seg-000002.zst").write_bytes(b"\x28\xb5\x2f\xfd")
+    with open(tmp_path / "index.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"k": "a:b:c", "s": 2, "o": 0, "n": 4, "meta": {}}\n')
+    with pytest.raises(RuntimeError):
+        SessionArchive(str(tmp_path)).get("a:b:c")
+
+
+def test_partially_written_segment_and_index_are_recovered(tmp_path):
+    archive = SessionArchive(str(tmp_path))
+    first = _session(1)
+    archive.put_many([first])
+    segment = tmp_path / os.path.basename(archive._segment_path(1))
+
+    # Crash no meio de um put_many: frame pela metade no segmento e linha cortada no índice
+    with open(segment, "ab") as f:
+        f.write(archive._compress(b'{"meta": {}, "history": []}')[:5])
+    with open(tmp_path / "index.jsonl", "ab") as f:
+        f.write(b'{"k": "moltyclaw:telegram:2", "s": 1, "o"')
+
+    reopened = SessionArchive(str(tmp_path))
+    assert reopened.get(first[0]) == first[1:]
+    assert "moltyclaw:telegram:2" not in reopened
+    assert (tmp_path / "index.jsonl").read_bytes().endswith(b"\n")
+
+    second = _session(2)
+    reopened.put_many([second])                     # o próximo frame vai depois do lixo
+    again = SessionArchive(str(tmp_path))
+    assert again.get(first[0]) == first[1:] and again.get(second[0]) == second[1:]
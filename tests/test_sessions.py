@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+pytest.importorskip("rich")
+
+from sessions import SessionKey, SessionStore
+
+KEY = SessionKey(agent_id="MoltyClaw", channel="telegram", peer_id="123")
+
+
+def _msg(i):
+    return {"role": "user", "content": f"mensagem {i}"}
+
+
+def _store(path, snapshot_every=50):
+    return SessionStore(str(path), snapshot_every=snapshot_every, write_behind=False)
+
+
+def test_torn_last_journal_line_is_dropped_on_replay(tmp_path):
+    store = _store(tmp_path)
+    history = [_msg(0)]
+    store.save_history(KEY, list(history))          # primeira escrita: snapshot
+    history += [_msg(1), _msg(2)]
+    store.save_history(KEY, list(history))          # depois só anexa ao journal
+    journal = tmp_path / "moltyclaw_telegram_123.jsonl"
+    assert len(journal.read_bytes().splitlines()) == 2
+
+    with open(journal, "ab") as f:
+        f.write(b'{"g": 1, "m": {"role": "user", "cont')   # crash no meio da escrita
+
+    reopened = _store(tmp_path)
+    assert reopened.load_history(KEY) == history
+    assert journal.read_bytes().endswith(b"\n")     # a linha rasgada foi cortada do arquivo
+    reopened.save_history(KEY, history + [_msg(3)])
+    assert _store(tmp_path).load_history(KEY) == history + [_msg(3)]
+
+
+def test_stale_generation_lines_are_ignored_after_a_snapshot(tmp_path):
+    store = _store(tmp_path)
+    store.save_history(KEY, [_msg(0)])
+    store.save_history(KEY, [_msg(0), _msg(1)])
+    journal = tmp_path / "moltyclaw_telegram_123.jsonl"
+    stale = journal.read_bytes()                    # linhas da geração 1
+
+    store.save_history(KEY, [_msg(9)])              # histórico reescrito: snapshot na geração 2
+    store.save_history(KEY, [_msg(9), _msg(10)])
+    # Crash entre o os.replace do snapshot e o truncate: as linhas velhas continuam no journal
+    journal.write_bytes(stale + journal.read_bytes())
+
+    assert _store(tmp_path).load_history(KEY) == [_msg(9), _msg(10)]
+
+
+def test_journal_is_folded_into_the_snapshot(tmp_path):
+    store = _store(tmp_path, snapshot_every=3)
+    snapshot = tmp_path / "moltyclaw_telegram_123.json"
+    journal = tmp_path / "moltyclaw_telegram_123.jsonl"
+    history = [_msg(0)]
+    store.save_history(KEY, list(history))
+    for i in range(1, 3):
+        history.append(_msg(i))
+        store.save_history(KEY, list(history))
+    assert len(journal.read_bytes().splitlines()) == 2
+
+    history.append(_msg(3))
+    store.save_history(KEY, list(history))          # 3º registro: vira snapshot e zera o journal
+    assert journal.read_bytes() == b""
+    data = json.loads(snapshot.read_text(encoding="utf-8"))
+    assert data["history"] == history and data["metadata"]["message_count"] == 4
+
+    compacted = [{"role": "system", "content": "resumo"}, _msg(3)]
+    store.save_history(KEY, compacted)              # compactação encolhe o histórico: snapshot novo
+    assert journal.read_bytes() == b""
+    assert _store(tmp_path).load_history(KEY) == compacted
+
+
+def test_sqlite_keyset_pages_are_stable_across_inserts(tmp_path):
+    from sessions import SqliteSessionStore
+
+    store = SqliteSessionStore(str(tmp_path), write_behind=False)
+    for i in range(5):
+        store.save_history(SessionKey(channel="telegram", peer_id=str(i)), [_msg(i)])
+    with store._conn() as conn:             # empate em updated_at: desempata pela session_key
+        conn.execute("UPDATE sessions SET updated_at = 1000 WHERE peer_id IN ('1', '2')")
+
+    page, cursor = store.list_sessions_page(limit=2)
+    seen = [m["session_key"] for m in page]
+    # Sessões novas entram no topo da lista e não deslocam as páginas seguintes
+    for i in range(5, 8):
+        store.save_history(SessionKey(channel="telegram", peer_id=str(i)), [_msg(i)])
+    while cursor:
+        page, cursor = store.list_sessions_page(limit=2, cursor=cursor)
+        seen += [m["session_key"] for m in page]
+
+    assert seen == [f"moltyclaw:telegram:{i}" for i in (4, 3, 0, 2, 1)]
+
+
+def test_json_sessions_migrate_to_sqlite_with_their_metadata(tmp_path):
+    from sessions import SqliteSessionStore
+
+    key = SessionKey(agent_id="MoltyClaw", channel="Telegram", peer_id="123")
+    json_store = _store(tmp_path)
+    json_store.save_history(key, [_msg(0)], peer_name="Ana")
+    json_store.save_history(key, [_msg(0), _msg(1)])        # uma mensagem no journal
+    [before] = json_store.list_sessions()
+
+    sqlite_store = SqliteSessionStore(str(tmp_path), write_behind=False)
+    [after] = sqlite_store.list_sessions()
+    assert sqlite_store.load_history(SessionKey.parse(key.key_str)) == [_msg(0), _msg(1)]
+    for field in ("session_key", "agent_id", "channel", "peer_name", "created_at", "message_count"):
+        assert after[field] == before[field], field
+    assert after["agent_id"] == "MoltyClaw"
+    assert sqlite_store.list_sessions_page(agent_id="moltyclaw", channel="telegram")[0] == [after]
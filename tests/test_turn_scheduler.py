@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from turn_scheduler import PriorityTurnScheduler, Priority
+
+
+def _loop_thread():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def test_interactive_turn_on_another_loop_preempts_background():
+    sched = PriorityTurnScheduler(config={"max_background": 1, "idle_grace_s": 0.05, "preempt": ["heartbeat"]})
+    hub_loop, gateway_loop = _loop_thread(), _loop_thread()
+    attempts = []
+    started = threading.Event()
+
+    async def heartbeat():
+        attempts.append(threading.current_thread().name)
+        started.set()
+        await asyncio.sleep(0.3)
+        return "ok"
+
+    async def chat():
+        async with sched.interactive():
+            await asyncio.sleep(0.1)
+
+    try:
+        background = asyncio.run_coroutine_threadsafe(sched.run(Priority.HEARTBEAT, heartbeat), hub_loop)
+        assert started.wait(1)
+        # Turno interativo no loop do gateway: cancela o heartbeat no loop do hub
+        asyncio.run_coroutine_threadsafe(chat(), gateway_loop).result(timeout=2)
+        assert background.result(timeout=2) == "ok"
+        assert len(attempts) == 2 and sched.preemptions == 1
+        stats = sched.stats()
+        assert stats["background_running"] == 0 and stats["queued"] == {}
+    finally:
+        for loop in (hub_loop, gateway_loop):
+            loop.call_soon_threadsafe(loop.stop)
+
+
+def test_waiters_on_different_loops_share_the_slots():
+    sched = PriorityTurnScheduler(config={"max_background": 1, "idle_grace_s": 0})
+    loops = [_loop_thread() for _ in range(3)]
+    inside = 0
+    peak = 0
+    lock = threading.Lock()
+
+    async def job():
+        nonlocal inside, peak
+        with lock:
+            inside += 1
+            peak = max(peak, inside)
+        await asyncio.sleep(0.02)
+        with lock:
+            inside -= 1
+
+    try:
+        futs = [asyncio.run_coroutine_threadsafe(sched.run(Priority.SCHEDULED, job), loop)
+                for loop in loops for _ in range(3)]
+        for f in futs:
+            f.result(timeout=5)
+        assert peak == 1 and sched.ran == 9
+        assert sched._granted == 0
+    finally:
+        for loop in loops:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+def test_wake_timer_survives_a_transient_caller_loop():
+    sched = PriorityTurnScheduler(config={"max_background": 1, "idle_grace_s": 0.2})
+    hub_loop = _loop_thread()
+
+    async def heartbeat():
+        return "ok"
+
+    async def chat():
+        # Turno interativo num loop de vida curta (ask_sync/asyncio.run) com background na fila do hub
+        async with sched.interactive():
+            background = asyncio.run_coroutine_threadsafe(sched.run(Priority.HEARTBEAT, heartbeat), hub_loop)
+            await asyncio.sleep(0.05)
+        return background
+
+    try:
+        background = asyncio.run(chat())     # o loop fecha antes do fim do idle_grace
+        assert background.result(timeout=2) == "ok"
+    finally:
+        hub_loop.call_soon_threadsafe(hub_loop.stop)